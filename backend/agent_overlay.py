@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+"""Transparent PyQt6 overlay that draws action explanations; runs in its own process."""
+
+import sys
+from multiprocessing import Queue
+from typing import List, Tuple
+
+from PyQt6.QtCore import QPoint, QRect, Qt, QTimer
+from PyQt6.QtGui import QColor, QFont, QPainter, QPen, QScreen
+from PyQt6.QtWidgets import QApplication, QMainWindow
+
+
+class OverlayWindow(QMainWindow):
+    """Transparent overlay used to draw action explanations."""
+
+    def __init__(self):
+        super().__init__()
+        self.boxes: List[Tuple[QRect, QColor, int]] = []
+        self.texts: List[Tuple[QPoint, str, QColor, int]] = []
+        self.setWindowFlags(
+            Qt.WindowType.FramelessWindowHint
+            | Qt.WindowType.WindowStaysOnTopHint
+            | Qt.WindowType.Tool
+        )
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        screen_geometry = QScreen.availableGeometry(QApplication.primaryScreen())
+        self.setGeometry(screen_geometry)
+
+    def paintEvent(self, event):  # type: ignore[override]
+        super().paintEvent(event)
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        for rect, color, width in self.boxes:
+            painter.setPen(QPen(color, width))
+            painter.drawRect(rect)
+        for point, text, color, font_size in self.texts:
+            painter.setPen(QPen(color))
+            font = QFont("Arial", font_size)
+            painter.setFont(font)
+            painter.drawText(point, text)
+
+    def draw_box(self, x: int, y: int, width: int, height: int, color: QColor, line_width: int) -> None:
+        self.boxes.append((QRect(x, y, width, height), color, line_width))
+        self.update()
+
+    def draw_text(self, x: int, y: int, text: str, color: QColor, font_size: int) -> None:
+        self.texts.append((QPoint(x, y), text, color, font_size))
+        self.update()
+
+    def clear_visuals(self) -> None:
+        self.boxes.clear()
+        self.texts.clear()
+        self.update()
+
+
+def run_overlay(command_queue: "Queue[dict]") -> None:
+    app = QApplication(sys.argv)
+    overlay = OverlayWindow()
+    overlay.show()
+
+    def process_commands():
+        while not command_queue.empty():
+            command = command_queue.get()
+            op = command.get("op")
+            if op == "box":
+                rect = command.get("rect", [0, 0, 0, 0])
+                color = QColor(*command.get("color", (255, 0, 0, 200)))
+                overlay.draw_box(rect[0], rect[1], rect[2], rect[3], color, command.get("width", 2))
+            elif op == "text":
+                point = command.get("point", [0, 0])
+                color = QColor(*command.get("color", (0, 120, 255, 220)))
+                overlay.draw_text(point[0], point[1], command.get("text", ""), color, command.get("size", 14))
+            elif op == "clear":
+                overlay.clear_visuals()
+            elif op == "shutdown":
+                overlay.close()
+                app.quit()
+                return
+
+    timer = QTimer()
+    timer.timeout.connect(process_commands)  # type: ignore[arg-type]
+    timer.start(32)
+
+    sys.exit(app.exec())
@@ -2,7 +2,11 @@ from __future__ import annotations
 
 """Utilities for desktop automation with visual explanations."""
 
+import importlib
 import json
+import os
+import shutil
+import subprocess
 import sys
 import time
 from dataclasses import dataclass, field, asdict
@@ -11,13 +15,10 @@ from multiprocessing import Process, Queue
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-import pyautogui
 from PIL import Image
-from PyQt6.QtCore import QPoint, QRect, Qt, QTimer
-from PyQt6.QtGui import QColor, QFont, QPainter, QPen, QScreen
-from PyQt6.QtWidgets import QApplication, QMainWindow
 
-pyautogui.FAILSAFE = False
+from app.agent import tracing
+from screen_capture import ScreenGrabber
 
 Coordinate = Tuple[int, int]
 BBox = Tuple[int, int, int, int]
@@ -42,89 +43,23 @@ class ActionRecord:
         return data
 
 
-class OverlayWindow(QMainWindow):
-    """Transparent overlay used to draw action explanations."""
+def _overlay_worker(command_queue: "Queue[dict]", display: Optional[str] = None) -> None:
+    if display:
+        os.environ["DISPLAY"] = display
+    # Qt is only ever loaded in the overlay subprocess, never in API workers.
+    from agent_overlay import run_overlay
 
-    def __init__(self):
-        super().__init__()
-        self.boxes: List[Tuple[QRect, QColor, int]] = []
-        self.texts: List[Tuple[QPoint, str, QColor, int]] = []
-        self.setWindowFlags(
-            Qt.WindowType.FramelessWindowHint
-            | Qt.WindowType.WindowStaysOnTopHint
-            | Qt.WindowType.Tool
-        )
-        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
-        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
-        screen_geometry = QScreen.availableGeometry(QApplication.primaryScreen())
-        self.setGeometry(screen_geometry)
-
-    def paintEvent(self, event):  # type: ignore[override]
-        super().paintEvent(event)
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-        for rect, color, width in self.boxes:
-            painter.setPen(QPen(color, width))
-            painter.drawRect(rect)
-        for point, text, color, font_size in self.texts:
-            painter.setPen(QPen(color))
-            font = QFont("Arial", font_size)
-            painter.setFont(font)
-            painter.drawText(point, text)
-
-    def draw_box(self, x: int, y: int, width: int, height: int, color: QColor, line_width: int) -> None:
-        self.boxes.append((QRect(x, y, width, height), color, line_width))
-        self.update()
-
-    def draw_text(self, x: int, y: int, text: str, color: QColor, font_size: int) -> None:
-        self.texts.append((QPoint(x, y), text, color, font_size))
-        self.update()
-
-    def clear_visuals(self) -> None:
-        self.boxes.clear()
-        self.texts.clear()
-        self.update()
-
-
-def _overlay_worker(command_queue: "Queue[dict]") -> None:
-    app = QApplication(sys.argv)
-    overlay = OverlayWindow()
-    overlay.show()
-
-    def process_commands():
-        while not command_queue.empty():
-            command = command_queue.get()
-            op = command.get("op")
-            if op == "box":
-                rect = command.get("rect", [0, 0, 0, 0])
-                color = QColor(*command.get("color", (255, 0, 0, 200)))
-                overlay.draw_box(rect[0], rect[1], rect[2], rect[3], color, command.get("width", 2))
-            elif op == "text":
-                point = command.get("point", [0, 0])
-                color = QColor(*command.get("color", (0, 120, 255, 220)))
-                overlay.draw_text(point[0], point[1], command.get("text", ""), color, command.get("size", 14))
-            elif op == "clear":
-                overlay.clear_visuals()
-            elif op == "shutdown":
-                overlay.close()
-                app.quit()
-                return
-
-    timer = QTimer()
-    timer.timeout.connect(process_commands)  # type: ignore[arg-type]
-    timer.start(32)
-
-    sys.exit(app.exec())
+    run_overlay(command_queue)
 
 
 class OverlayController:
-    def __init__(self, enabled: bool = True):
+    def __init__(self, enabled: bool = True, display: Optional[str] = None):
         self.enabled = enabled
         self.process: Optional[Process] = None
         self.queue: Optional[Queue] = None
         if self.enabled:
             self.queue = Queue()
-            self.process = Process(target=_overlay_worker, args=(self.queue,), daemon=True)
+            self.process = Process(target=_overlay_worker, args=(self.queue, display), daemon=True)
             self.process.start()
 
     def draw_box(self, rect: Sequence[int], color: Tuple[int, int, int, int] = (255, 0, 0, 200), width: int = 2) -> None:
@@ -166,6 +101,221 @@ class ActionLogger:
     def read(self) -> str:
         return self.log_path.read_text(encoding="utf-8")
 
+class PyAutoGuiInput:
+    """Input and capture on the current desktop through ``pyautogui``."""
+
+    click_settle = 0.1
+    # How long the pasted text stays on the clipboard; apps read it asynchronously after ctrl+v.
+    paste_restore_delay = 0.5
+
+    def __init__(self) -> None:
+        # Imported here: pyautogui connects to the display on import, which fails on headless hosts.
+        import pyautogui
+
+        pyautogui.FAILSAFE = False
+        self._gui = pyautogui
+        # pyautogui shells out to a screenshot tool on Linux; mss keeps one native grabber open.
+        self.grabber = ScreenGrabber.create(os.getenv("DISPLAY"))
+
+    def click(self, x: int, y: int) -> None:
+        self._gui.click(x, y)
+
+    def write(self, text: str, interval: float = 0.0) -> None:
+        self._gui.write(text, interval=interval)
+
+    def hotkey(self, *keys: str) -> None:
+        self._gui.hotkey(*keys)
+
+    def scroll(self, amount: int) -> None:
+        self._gui.scroll(amount)
+
+    def screenshot(self) -> Image.Image:
+        if self.grabber is not None:
+            return self.grabber.grab()
+        return self._gui.screenshot()
+
+    def paste(self, text: str) -> bool:
+        """Paste through the clipboard, restoring its previous contents. Returns False when unavailable."""
+        try:
+            import pyperclip
+        except ImportError:
+            return False
+        try:
+            previous = pyperclip.paste()
+        except Exception:
+            previous = None
+        try:
+            pyperclip.copy(text)
+            self.hotkey("command" if sys.platform == "darwin" else "ctrl", "v")
+            # Give the target app time to read the clipboard before it is restored.
+            time.sleep(self.paste_restore_delay)
+        except Exception:
+            return False
+        finally:
+            if previous is not None:
+                try:
+                    pyperclip.copy(previous)
+                except Exception:
+                    pass
+        return True
+
+
+XDOTOOL_KEYS = {
+    "enter": "Return",
+    "return": "Return",
+    "esc": "Escape",
+    "escape": "Escape",
+    "tab": "Tab",
+    "backspace": "BackSpace",
+    "delete": "Delete",
+    "del": "Delete",
+    "space": "space",
+    "up": "Up",
+    "down": "Down",
+    "left": "Left",
+    "right": "Right",
+    "home": "Home",
+    "end": "End",
+    "pageup": "Prior",
+    "pagedown": "Next",
+    "win": "super",
+    "command": "super",
+    "cmd": "super",
+    "ctrl": "ctrl",
+    "control": "ctrl",
+    "alt": "alt",
+    "shift": "shift",
+}
+
+
+class XdotoolInput:
+    """Input and capture bound to one X display (e.g. an Xvfb session) via xdotool, xclip and mss."""
+
+    click_settle = 0.1
+    paste_restore_delay = 0.5
+
+    def __init__(self, display: str) -> None:
+        if not shutil.which("xdotool"):
+            raise RuntimeError("xdotool is required to drive a virtual display")
+        self.display = display
+        self.env = {**os.environ, "DISPLAY": display}
+        self.grabber = ScreenGrabber(display)
+
+    def _run(self, *args: str, stdin: Optional[str] = None) -> str:
+        result = subprocess.run(
+            args,
+            env=self.env,
+            input=stdin,
+            capture_output=True,
+            text=True,
+            timeout=30,
+            check=True,
+        )
+        return result.stdout
+
+    def _set_clipboard(self, text: str) -> None:
+        # xclip -i forks a child that keeps serving the selection; had it inherited captured
+        # stdout/stderr pipes, run() would wait on them until the timeout.
+        subprocess.run(
+            ["xclip", "-selection", "clipboard", "-i"],
+            env=self.env,
+            input=text,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            timeout=30,
+            check=True,
+        )
+
+    def click(self, x: int, y: int) -> None:
+        self._run("xdotool", "mousemove", "--sync", str(int(x)), str(int(y)), "click", "1")
+
+    def write(self, text: str, interval: float = 0.0) -> None:
+        self._run("xdotool", "type", "--delay", str(int(interval * 1000)), "--", text)
+
+    def hotkey(self, *keys: str) -> None:
+        combo = "+".join(XDOTOOL_KEYS.get(key.lower(), key) for key in keys)
+        self._run("xdotool", "key", "--clearmodifiers", combo)
+
+    def scroll(self, amount: int) -> None:
+        if amount:
+            self._run("xdotool", "click", "--repeat", str(abs(int(amount))), "--delay", "0", "4" if amount > 0 else "5")
+
+    def screenshot(self) -> Image.Image:
+        return self.grabber.grab()
+
+    def paste(self, text: str) -> bool:
+        if not shutil.which("xclip"):
+            return False
+        try:
+            previous = self._run("xclip", "-selection", "clipboard", "-o")
+        except (subprocess.SubprocessError, OSError):
+            previous = None
+        try:
+            self._set_clipboard(text)
+            self.hotkey("ctrl", "v")
+            time.sleep(self.paste_restore_delay)
+        except (subprocess.SubprocessError, OSError):
+            return False
+        finally:
+            if previous is not None:
+                try:
+                    self._set_clipboard(previous)
+                except (subprocess.SubprocessError, OSError):
+                    pass
+        return True
+
+
+class DryRunInput:
+    """Accepts every action without touching the desktop; screenshots are a grey placeholder."""
+
+    click_settle = 0.0
+
+    def click(self, x: int, y: int) -> None:
+        pass
+
+    def write(self, text: str, interval: float = 0.0) -> None:
+        pass
+
+    def hotkey(self, *keys: str) -> None:
+        pass
+
+    def scroll(self, amount: int) -> None:
+        pass
+
+    def screenshot(self) -> Image.Image:
+        return Image.new("RGB", (200, 100), "gray")
+
+    def paste(self, text: str) -> bool:
+        return True
+
+
+def desktop_input(display: Optional[str] = None) -> Any:
+    """xdotool when bound to a session display, otherwise pyautogui on the current desktop."""
+    return XdotoolInput(display) if display else PyAutoGuiInput()
+
+
+# Backend name -> "module:factory". Resolved on first use, so a backend's dependencies
+# (pyautogui, an HTTP client, the simulator) only load once something actually picks it.
+INPUT_BACKENDS: Dict[str, str] = {
+    "desktop": "agent_tools:desktop_input",
+    "dry-run": "agent_tools:DryRunInput",
+    "simulated": "app.agent.simulator:SimulatedInput",
+    "remote": "remote_input:RemoteInput",
+}
+
+
+def register_input_backend(name: str, target: str) -> None:
+    INPUT_BACKENDS[name] = target
+
+
+def create_input(backend: str, **options: Any) -> Any:
+    target = INPUT_BACKENDS.get(backend)
+    if target is None:
+        raise ValueError(f"Unknown toolbox backend '{backend}' (known: {', '.join(sorted(INPUT_BACKENDS))})")
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr)(**options)
+
 
 class AgentToolbox:
     """High-level helper used by the visual agent to act on the desktop."""
@@ -176,15 +326,41 @@ class AgentToolbox:
         screenshot_dir: str | Path = "screenshots",
         enable_overlay: bool = True,
         dry_run: bool = False,
+        typing_mode: str = "paste",
+        macro_pause: float = 0.05,
+        display: Optional[str] = None,
+        input_driver: Optional[Any] = None,
+        backend: Optional[str] = None,
+        backend_options: Optional[Dict[str, Any]] = None,
+        click_settle: Optional[float] = None,
+        blob_store: Optional[Any] = None,
     ):
         self.screenshot_dir = Path(screenshot_dir)
         self.screenshot_dir.mkdir(parents=True, exist_ok=True)
         self.logger = ActionLogger(Path(log_file))
-        self.overlay = OverlayController(enabled=enable_overlay)
-        self.dry_run = dry_run
+        self.display = display
+        self.overlay = OverlayController(enabled=enable_overlay, display=display)
+        self._input: Optional[Any] = input_driver
+        self.backend = backend or ("dry-run" if dry_run else "desktop")
+        self.backend_options = dict(backend_options or {})
+        if self.backend == "desktop":
+            self.backend_options.setdefault("display", display)
+        self.dry_run = dry_run or self.backend == "dry-run"
+        self.typing_mode = typing_mode
+        self.macro_pause = max(macro_pause, 0.0)
+        self.click_settle = click_settle
+        # Content-addressed store (app.storage.BlobStore): identical frames become links to one file.
+        self.blob_store = blob_store
         self.history: List[ActionRecord] = []
         self._active_annotations = 0
 
+    @property
+    def input(self) -> Any:
+        """Input driver for ``backend``, created on first action unless one was injected."""
+        if self._input is None:
+            self._input = create_input(self.backend, **self.backend_options)
+        return self._input
+
     # ------------------------------------------------------------------
     # Core API
     # ------------------------------------------------------------------
@@ -201,33 +377,87 @@ class AgentToolbox:
                 self.overlay.draw_box(rect)
             if explanation:
                 self.overlay.draw_text((x + 10, y + 10), explanation)
-            if not self.dry_run:
-                pyautogui.click(x, y)
+            self.input.click(x, y)
         except Exception as exc:
             record.success = False
             record.error = str(exc)
         return self.log_action(record)
 
-    def type_text(self, x: Optional[int], y: Optional[int], text: str, explanation: Optional[str] = None) -> ActionRecord:
+    def type_text(
+        self,
+        x: Optional[int],
+        y: Optional[int],
+        text: str,
+        explanation: Optional[str] = None,
+        mode: Optional[str] = None,
+    ) -> ActionRecord:
+        """Type ``text``; ``mode`` is ``paste`` (clipboard), ``keys`` (bulk key events) or ``slow``.
+
+        Text containing newlines is never pasted: it is typed as keys, so the result does not
+        depend on how the target handles a pasted line break.
+        """
         coords = (x, y) if x is not None and y is not None else None
-        record = ActionRecord(action="type", message=explanation or f"Type '{text}'", coords=coords, metadata={"text": text})
+        mode = mode or self.typing_mode
+        record = ActionRecord(
+            action="type",
+            message=explanation or f"Type '{text}'",
+            coords=coords,
+            metadata={"text": text, "mode": mode},
+        )
         try:
-            if not self.dry_run:
-                if x is not None and y is not None:
-                    pyautogui.click(x, y)
-                    time.sleep(0.1)
-                pyautogui.write(text, interval=0.05)
+            if x is not None and y is not None:
+                self.input.click(x, y)
+                settle = self.input.click_settle if self.click_settle is None else self.click_settle
+                if settle:
+                    time.sleep(settle)
+            if mode == "slow":
+                self.input.write(text, interval=0.05)
+            elif mode == "paste" and "\n" not in text and self.input.paste(text):
+                pass
+            else:
+                # Multi-line text goes through key events so each newline is a real Return, as in keys mode.
+                if mode == "paste":
+                    record.metadata["mode"] = "keys"
+                self.input.write(text, interval=0)
         except Exception as exc:
             record.success = False
             record.error = str(exc)
         return self.log_action(record)
 
+    def run_macro(self, steps: Sequence[Dict[str, Any]], pause: Optional[float] = None) -> List[ActionRecord]:
+        """Run click/type/shortcut steps back to back with only ``pause`` between them.
+
+        Each step is a dict with an ``op`` key plus the keyword arguments of the
+        matching method; every step is still logged as its own ``ActionRecord``.
+        """
+        pause = self.macro_pause if pause is None else max(pause, 0.0)
+        records: List[ActionRecord] = []
+        for idx, step in enumerate(steps):
+            op = step.get("op")
+            explanation = step.get("explanation")
+            with tracing.span(f"action.{op}", category="action", macro_step=idx):
+                if op == "click":
+                    record = self.click(step["x"], step["y"], explanation=explanation, bbox=step.get("bbox"))
+                elif op == "type":
+                    record = self.type_text(step.get("x"), step.get("y"), step["text"], explanation=explanation, mode=step.get("mode"))
+                elif op == "shortcut":
+                    record = self.shortcut(step.get("keys") or [], explanation=explanation)
+                else:
+                    record = self.log_action(
+                        ActionRecord(action=str(op), message=explanation or "Unsupported macro step", success=False, error=f"Unknown macro op: {op}")
+                    )
+            record.metadata["macro_step"] = idx
+            records.append(record)
+            if pause and not self.dry_run and idx < len(steps) - 1:
+                with tracing.span("sleep", seconds=pause):
+                    time.sleep(pause)
+        return records
+
     def scroll(self, amount: int, explanation: Optional[str] = None) -> ActionRecord:
         direction = "up" if amount > 0 else "down"
         record = ActionRecord(action="scroll", message=explanation or f"Scroll {direction} by {abs(amount)}", metadata={"amount": amount})
         try:
-            if not self.dry_run:
-                pyautogui.scroll(amount)
+            self.input.scroll(amount)
         except Exception as exc:
             record.success = False
             record.error = str(exc)
@@ -237,7 +467,8 @@ class AgentToolbox:
         record = ActionRecord(action="wait", message=explanation or f"Wait {duration:.2f}s", metadata={"duration": duration})
         try:
             if not self.dry_run:
-                time.sleep(duration)
+                with tracing.span("sleep", seconds=duration):
+                    time.sleep(duration)
         except Exception as exc:
             record.success = False
             record.error = str(exc)
@@ -248,8 +479,8 @@ class AgentToolbox:
         combo = " + ".join(normalized) if normalized else "shortcut"
         record = ActionRecord(action="shortcut", message=explanation or f"Press {combo}", metadata={"keys": normalized})
         try:
-            if not self.dry_run and normalized:
-                pyautogui.hotkey(*normalized)
+            if normalized:
+                self.input.hotkey(*normalized)
         except Exception as exc:
             record.success = False
             record.error = str(exc)
@@ -274,11 +505,14 @@ class AgentToolbox:
         filename = self.screenshot_dir / f"{label}_{timestamp}.png"
         record = ActionRecord(action="screenshot", message=f"Saved screenshot to {filename}")
         try:
-            if not self.dry_run:
-                image = pyautogui.screenshot()
-                image.save(filename)
-            else:
-                Image.new("RGB", (200, 100), "gray").save(filename)
+            with tracing.span("capture", label=label, backend=self.backend) as capture:
+                image = self.input.screenshot()
+                # Fast PNG compression: capture latency matters more than size, and retention recompresses later.
+                if self.blob_store is not None:
+                    record.metadata["digest"] = self.blob_store.put_image(image, filename, compress_level=1)
+                else:
+                    image.save(filename, compress_level=1)
+                capture.set(bytes=filename.stat().st_size, digest=record.metadata.get("digest"))
             record.metadata["path"] = str(filename)
         except Exception as exc:
             record.success = False
@@ -293,6 +527,9 @@ class AgentToolbox:
 
     def shutdown(self) -> None:
         self.overlay.shutdown()
+        grabber = getattr(self._input, "grabber", None)
+        if grabber is not None:
+            grabber.close()
 
 
 if __name__ == "__main__":
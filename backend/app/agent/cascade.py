@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+"""Planner cascade: try a small model first and escalate only when its plan is unusable."""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .deadline import Deadline
+from .elements import ElementTable
+from .models import PlannerResponse
+from .qwen_client import GPTPlanner, GPTPlannerError
+from .validation import repair_plan
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TierStats:
+    model: str
+    calls: int = 0
+    accepted: int = 0
+    escalated: int = 0
+    errors: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        return {
+            "model": self.model,
+            "calls": self.calls,
+            "accepted": self.accepted,
+            "escalated": self.escalated,
+            "errors": self.errors,
+            "escalation_rate": round(self.escalated / self.calls, 3) if self.calls else 0.0,
+            "latency_p50": round(ordered[len(ordered) // 2], 3) if ordered else None,
+            "latency_mean": round(sum(ordered) / len(ordered), 3) if ordered else None,
+        }
+
+
+def parse_tiers(spec: Optional[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """``"small,large"`` or ``"small@http://host/v1,large"`` -> [(model, base_url), ...].
+
+    An empty spec yields a single tier using the planner's default model and endpoint.
+    """
+    tiers: List[Tuple[Optional[str], Optional[str]]] = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        model, _, base = part.partition("@")
+        tiers.append((model.strip(), base.strip() or None))
+    return tiers or [(None, None)]
+
+
+class CascadePlanner:
+    """Ordered planner tiers, cheapest first.
+
+    Each tier's tool call is validated and repaired locally where possible (known tools,
+    resolvable element ids, on-screen coordinates); a planner error or a plan that is
+    still invalid moves on to the next tier. The last tier's answer is returned with its
+    ``validation`` report. ``escalate=True`` skips the first tier, which
+    the engine uses after a plan produced no visible change.
+    """
+
+    def __init__(self, tiers: Sequence[GPTPlanner]) -> None:
+        if not tiers:
+            raise GPTPlannerError("Planner cascade needs at least one tier")
+        self.tiers = list(tiers)
+        # All tiers see the same history, so they can share one incremental summary.
+        for tier in self.tiers[1:]:
+            tier.history = self.tiers[0].history
+        self.stats = [TierStats(model=tier.model) for tier in self.tiers]
+
+    @classmethod
+    def from_spec(
+        cls,
+        spec: Optional[str],
+        *,
+        api_key: Optional[str] = None,
+        api_base: Optional[str] = None,
+        model: Optional[str] = None,
+        **planner_kwargs: Any,
+    ) -> "CascadePlanner":
+        tiers = [
+            GPTPlanner(api_key=api_key, api_base=tier_base or api_base, model=tier_model or model, **planner_kwargs)
+            for tier_model, tier_base in parse_tiers(spec)
+        ]
+        return cls(tiers)
+
+    @property
+    def model(self) -> str:
+        return self.tiers[0].model
+
+    def plan_actions(
+        self,
+        instruction: str,
+        screenshot_path: str | Path,
+        elements: ElementTable,
+        action_history: List[Dict[str, Any]],
+        *,
+        screen_size: Optional[Tuple[int, int]] = None,
+        escalate: bool = False,
+        deadline: Optional[Deadline] = None,
+        **kwargs: Any,
+    ) -> PlannerResponse:
+        deadline = deadline or Deadline.unbounded()
+        start = 1 if escalate and len(self.tiers) > 1 else 0
+        escalations: List[Dict[str, Any]] = []
+        last = len(self.tiers) - 1
+        for index in range(start, len(self.tiers)):
+            tier, stats = self.tiers[index], self.stats[index]
+            stats.calls += 1
+            started = time.perf_counter()
+            try:
+                response = tier.plan_actions(
+                    instruction,
+                    screenshot_path,
+                    elements,
+                    action_history,
+                    timeout=deadline.timeout("planning"),
+                    **kwargs,
+                )
+            except GPTPlannerError as exc:
+                stats.latencies.append(time.perf_counter() - started)
+                stats.errors += 1
+                if index == last or deadline.expired:
+                    raise
+                stats.escalated += 1
+                escalations.append({"model": tier.model, "reason": str(exc)})
+                logger.info("Planner tier %s failed (%s); escalating", tier.model, exc)
+                continue
+            stats.latencies.append(time.perf_counter() - started)
+
+            report = repair_plan(response, elements, screen_size)
+            if report.issues and index < last:
+                stats.escalated += 1
+                escalations.append({"model": tier.model, "reason": "; ".join(issue.describe() for issue in report.issues)})
+                logger.info("Planner tier %s produced an invalid plan; escalating", tier.model)
+                continue
+            stats.accepted += 1
+            response.model = tier.model
+            response.escalations = escalations
+            response.validation = report
+            return response
+        raise GPTPlannerError("Planner cascade exhausted without a response")
+
+    def stats_summary(self) -> List[Dict[str, Any]]:
+        return [{**stats.summary(), "client": tier.client.summary()} for tier, stats in zip(self.tiers, self.stats)]
+
+    def cache_summary(self) -> Dict[str, Any]:
+        totals: Dict[str, Any] = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        for tier in self.tiers:
+            for key in totals:
+                totals[key] += tier.usage_totals[key]
+        prompt_tokens = totals["prompt_tokens"]
+        totals["cached_ratio"] = round(totals["cached_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0
+        return totals
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+"""End-to-end time budget shared by every stage of a run."""
+
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(RuntimeError):
+    def __init__(self, stage: str) -> None:
+        super().__init__(f"Run deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """Monotonic deadline; ``seconds=None`` (or <= 0) means unbounded.
+
+    Stages ask ``timeout(stage, default)`` for the timeout to pass to their blocking
+    call: the smaller of their usual limit and the remaining budget.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, *, min_timeout: float = 0.05) -> None:
+        self.started = time.monotonic()
+        self.seconds = seconds if seconds and seconds > 0 else None
+        self.expires_at = self.started + self.seconds if self.seconds else None
+        self.min_timeout = min_timeout
+
+    @classmethod
+    def unbounded(cls) -> "Deadline":
+        return cls(None)
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= self.min_timeout
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def check(self, stage: str) -> None:
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+    def timeout(self, stage: str, default: Optional[float] = None) -> Optional[float]:
+        """Timeout for the next blocking call in ``stage``; raises once the budget is spent."""
+        self.check(stage)
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return remaining if default is None else min(default, remaining)
+
+    def clamp(self, seconds: float) -> float:
+        """Shorten a sleep so it never outlives the budget."""
+        remaining = self.remaining()
+        return seconds if remaining is None else max(0.0, min(seconds, remaining))
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+"""Local clean-up of perceived elements: confidence floor, non-maximum suppression, containment
+merging and duplicate-label collapsing, so one widget is one element."""
+
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .elements import ElementTable
+
+
+@dataclass
+class DedupStats:
+    input: int = 0
+    degenerate: int = 0
+    low_confidence: int = 0
+    overlapping: int = 0
+    contained: int = 0
+    duplicate_text: int = 0
+
+    @property
+    def removed(self) -> int:
+        return self.degenerate + self.low_confidence + self.overlapping + self.contained + self.duplicate_text
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "removed": self.removed, "kept": self.input - self.removed}
+
+
+def deduplicate(
+    elements: ElementTable,
+    *,
+    iou_threshold: float = 0.4,
+    min_confidence: float = 0.0,
+    containment: float = 0.9,
+    max_container_ratio: float = 4.0,
+    text_radius: float = 16.0,
+) -> Tuple[ElementTable, DedupStats]:
+    """Drop redundant elements and renumber the rest 1..N.
+
+    Survivors are chosen by confidence, then by having text, then by area. A survivor without
+    text inherits the label of an element merged into it (an icon box absorbing its caption).
+
+    - overlap: greedy NMS at ``iou_threshold``;
+    - containment: a box at least ``containment`` inside one at most ``max_container_ratio``
+      times its area is the same widget with padding; larger boxes are real containers and stay;
+    - duplicate text: the same label reported twice with centers within ``text_radius`` px.
+    """
+    stats = DedupStats(input=len(elements))
+    if not len(elements):
+        return elements, stats
+    boxes = elements.boxes.astype(np.float32)
+    area = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+    texts = [text.strip().lower() for text in elements.texts()]
+    has_text = np.fromiter((bool(text) for text in texts), dtype=bool, count=len(texts))
+    text_codes = elements.text_codes.copy()
+
+    alive = area > 0
+    stats.degenerate = int((~alive).sum())
+    floor = alive & (elements.confidence < min_confidence)
+    stats.low_confidence = int(floor.sum())
+    alive &= ~floor
+
+    # Highest priority first: np.lexsort sorts by its last key first.
+    order = np.lexsort((-area, -has_text.astype(np.int8), -elements.confidence))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+
+    def absorb(keeper: int, victims: np.ndarray) -> None:
+        alive[victims] = False
+        if not has_text[keeper]:
+            labelled = victims[has_text[victims]]
+            if len(labelled):
+                text_codes[keeper] = text_codes[labelled[0]]
+                texts[keeper] = texts[labelled[0]]
+                has_text[keeper] = True
+
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    np.fill_diagonal(inter, 0.0)
+
+    overlap = inter / np.maximum(area[:, None] + area[None, :] - inter, 1e-6) > iou_threshold
+    # Only rows with any overlap need the sequential greedy pass.
+    for index in order[overlap[order].any(axis=1)]:
+        if not alive[index]:
+            continue
+        victims = np.flatnonzero(alive & overlap[index])
+        if len(victims):
+            stats.overlapping += len(victims)
+            absorb(index, victims[np.argsort(rank[victims])])
+
+    # padded[i, j]: box i lies (almost) within box j, which is at most a few times its size.
+    inside = inter / np.maximum(area[:, None], 1.0)
+    padded = (inside >= containment) & (area[None, :] <= max_container_ratio * area[:, None])
+    by_size = np.argsort(area, kind="stable")
+    for inner in by_size[padded[by_size].any(axis=1)]:
+        if not alive[inner]:
+            continue
+        outers = np.flatnonzero(alive & padded[inner])
+        for outer in outers[np.argsort(area[outers])]:
+            # Keep both when each carries its own, different label.
+            if has_text[inner] and has_text[outer] and texts[inner] != texts[outer]:
+                continue
+            stats.contained += 1
+            absorb(outer, np.asarray([inner]))
+            break
+
+    groups: Dict[str, List[int]] = {}
+    for index in order:
+        if alive[index] and texts[index]:
+            groups.setdefault(texts[index], []).append(index)
+    centers = elements.centers.astype(np.float32)
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        rows = np.asarray(members, dtype=np.int64)
+        offsets = centers[rows][:, None, :] - centers[rows][None, :, :]
+        near = np.hypot(offsets[..., 0], offsets[..., 1]) <= text_radius
+        np.fill_diagonal(near, False)
+        for position in np.flatnonzero(near.any(axis=1)):
+            if not alive[rows[position]]:
+                continue
+            close = rows[near[position] & alive[rows]]
+            stats.duplicate_text += len(close)
+            alive[close] = False
+
+    keep = np.flatnonzero(alive)
+    table = ElementTable(
+        np.arange(1, len(keep) + 1, dtype=np.int32),
+        elements.boxes[keep],
+        elements.centers[keep],
+        elements.confidence[keep],
+        text_codes[keep],
+        elements.type_codes[keep],
+        elements.strings,
+    )
+    return table, stats
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+"""Array-backed storage for parsed screen elements."""
+
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+ELEMENT_FIELDS = ("element_id", "text", "type", "bbox", "center", "confidence")
+
+
+class StringTable:
+    """Interns element text/type so tables store int32 codes instead of Python strings.
+
+    A table shared across frames (one per OmniParser client) makes codes comparable
+    between perceptions of the same run. Interning is locked: hedged remote and local
+    perception fill the same table from different threads.
+    """
+
+    # Weak-referenceable so per-table caches (e.g. relevance tokens) go away with the table.
+    __slots__ = ("_index", "_values", "_lock", "__weakref__")
+
+    def __init__(self) -> None:
+        self._index: Dict[str, int] = {}
+        self._values: List[str] = []
+        self._lock = threading.Lock()
+
+    def _intern(self, value: Any) -> int:
+        value = "" if value is None else str(value)
+        code = self._index.get(value)
+        if code is None:
+            code = len(self._values)
+            self._index[value] = code
+            self._values.append(value)
+        return code
+
+    def intern(self, value: Any) -> int:
+        with self._lock:
+            return self._intern(value)
+
+    def codes(self, values: Sequence[Any]) -> np.ndarray:
+        with self._lock:
+            return np.fromiter((self._intern(value) for value in values), dtype=np.int32, count=len(values))
+
+    def __getitem__(self, code: int) -> str:
+        return self._values[code]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class ElementRow:
+    """Read-only dict-like view of one table row; behaves like the legacy element dict."""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "ElementTable", index: int) -> None:
+        self._table = table
+        self._index = index
+
+    @property
+    def element_id(self) -> int:
+        return int(self._table.ids[self._index])
+
+    @property
+    def text(self) -> str:
+        return self._table.strings[int(self._table.text_codes[self._index])]
+
+    @property
+    def type(self) -> str:
+        return self._table.strings[int(self._table.type_codes[self._index])]
+
+    @property
+    def bbox(self) -> List[int]:
+        return self._table.boxes[self._index].tolist()
+
+    @property
+    def center(self) -> List[int]:
+        return self._table.centers[self._index].tolist()
+
+    @property
+    def confidence(self) -> float:
+        return round(float(self._table.confidence[self._index]), 4)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in ELEMENT_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in ELEMENT_FIELDS:
+            return default
+        return getattr(self, key)
+
+    def keys(self) -> Sequence[str]:
+        return ELEMENT_FIELDS
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in ELEMENT_FIELDS}
+
+    def __repr__(self) -> str:
+        return f"ElementRow({self.to_dict()!r})"
+
+
+class ElementTable:
+    """Columnar element storage: NumPy arrays for geometry, interned codes for strings.
+
+    Integer and slice indexing return views that share the underlying arrays; index
+    arrays and boolean masks return compact copies.
+    """
+
+    __slots__ = ("ids", "boxes", "centers", "confidence", "text_codes", "type_codes", "strings")
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        boxes: np.ndarray,
+        centers: np.ndarray,
+        confidence: np.ndarray,
+        text_codes: np.ndarray,
+        type_codes: np.ndarray,
+        strings: StringTable,
+    ) -> None:
+        self.ids = ids
+        self.boxes = boxes
+        self.centers = centers
+        self.confidence = confidence
+        self.text_codes = text_codes
+        self.type_codes = type_codes
+        self.strings = strings
+
+    @classmethod
+    def empty(cls, strings: Optional[StringTable] = None) -> "ElementTable":
+        return cls(
+            np.zeros(0, dtype=np.int32),
+            np.zeros((0, 4), dtype=np.int32),
+            np.zeros((0, 2), dtype=np.int32),
+            np.zeros(0, dtype=np.float32),
+            np.zeros(0, dtype=np.int32),
+            np.zeros(0, dtype=np.int32),
+            strings or StringTable(),
+        )
+
+    @classmethod
+    def from_columns(
+        cls,
+        boxes: np.ndarray,
+        texts: Sequence[Any],
+        types: Sequence[Any],
+        confidence: Sequence[float],
+        ids: Optional[np.ndarray] = None,
+        strings: Optional[StringTable] = None,
+    ) -> "ElementTable":
+        strings = strings or StringTable()
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        count = len(boxes)
+        centers = ((boxes[:, :2] + boxes[:, 2:]) / 2).astype(np.int32)
+        if ids is None:
+            ids = np.arange(1, count + 1, dtype=np.int32)
+        return cls(
+            np.asarray(ids, dtype=np.int32),
+            boxes,
+            centers,
+            np.asarray(confidence, dtype=np.float32).reshape(count),
+            strings.codes(texts),
+            strings.codes(types),
+            strings,
+        )
+
+    @classmethod
+    def from_dicts(cls, elements: Sequence[Dict[str, Any]], strings: Optional[StringTable] = None) -> "ElementTable":
+        if isinstance(elements, ElementTable):
+            return elements
+        if not elements:
+            return cls.empty(strings)
+        table = cls.from_columns(
+            [(elem.get("bbox") or [0, 0, 0, 0])[:4] for elem in elements],
+            [elem.get("text", "") for elem in elements],
+            [elem.get("type", "unknown") for elem in elements],
+            [elem.get("confidence") or 0.0 for elem in elements],
+            ids=np.asarray([elem.get("element_id", idx + 1) for idx, elem in enumerate(elements)], dtype=np.int32),
+            strings=strings,
+        )
+        if all(elem.get("center") for elem in elements):
+            table.centers = np.asarray([elem["center"][:2] for elem in elements], dtype=np.int32)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __bool__(self) -> bool:
+        return len(self.ids) > 0
+
+    def __iter__(self) -> Iterator[ElementRow]:
+        for index in range(len(self.ids)):
+            yield ElementRow(self, index)
+
+    def __getitem__(self, key: Any) -> Any:
+        if isinstance(key, (int, np.integer)):
+            index = int(key)
+            if index < 0:
+                index += len(self.ids)
+            if not 0 <= index < len(self.ids):
+                raise IndexError(key)
+            return ElementRow(self, index)
+        return ElementTable(
+            self.ids[key],
+            self.boxes[key],
+            self.centers[key],
+            self.confidence[key],
+            self.text_codes[key],
+            self.type_codes[key],
+            self.strings,
+        )
+
+    def copy(self) -> "ElementTable":
+        """Independent arrays over the same string table (callers renumber ids in place)."""
+        return ElementTable(
+            self.ids.copy(),
+            self.boxes.copy(),
+            self.centers.copy(),
+            self.confidence.copy(),
+            self.text_codes.copy(),
+            self.type_codes.copy(),
+            self.strings,
+        )
+
+    def index_of(self, element_id: Any) -> Optional[int]:
+        if element_id is None:
+            return None
+        try:
+            hits = np.flatnonzero(self.ids == int(element_id))
+        except (TypeError, ValueError):
+            return None
+        return int(hits[0]) if hits.size else None
+
+    def by_id(self, element_id: Any) -> Optional[ElementRow]:
+        index = self.index_of(element_id)
+        return None if index is None else ElementRow(self, index)
+
+    def texts(self) -> List[str]:
+        values = self.strings
+        return [values[int(code)] for code in self.text_codes]
+
+    def types(self) -> List[str]:
+        values = self.strings
+        return [values[int(code)] for code in self.type_codes]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        ids = self.ids.tolist()
+        boxes = self.boxes.tolist()
+        centers = self.centers.tolist()
+        # float32 storage; round so serialized rows don't carry float noise into prompts.
+        confidence = [round(value, 4) for value in self.confidence.tolist()]
+        texts = self.texts()
+        types = self.types()
+        return [
+            {
+                "element_id": ids[i],
+                "text": texts[i],
+                "type": types[i],
+                "bbox": boxes[i],
+                "center": centers[i],
+                "confidence": confidence[i],
+            }
+            for i in range(len(ids))
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in ("ids", "boxes", "centers", "confidence", "text_codes", "type_codes"))
+
+    def __repr__(self) -> str:
+        return f"ElementTable(rows={len(self)})"
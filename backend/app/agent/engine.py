@@ -2,14 +2,34 @@ from __future__ import annotations
 
 import time
 import json
+import re
+from collections import Counter
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 from agent_tools import ActionRecord, AgentToolbox
-from omniparser_tool import OmniParserClient, OmniParserError, draw_omniparser_boxes
+from omniparser_tool import OmniParserClient, OmniParserError, draw_omniparser_boxes, render_omniparser_boxes
 
-from app.agent.models import AgentResult, PlannedAction
-from app.agent.qwen_client import QwenPlanner, QwenPlannerError
+from app.agent.deadline import Deadline, DeadlineExceeded
+from app.agent.elements import ElementTable
+from app.agent.local_perception import HedgedPerception, LocalPerception
+from app.agent.models import AgentResult, PlannedAction, PlannerResponse
+from app.agent import tracing
+from app.agent.cascade import CascadePlanner
+from app.agent.qwen_client import QwenPlannerError
+from app.agent.relevance import Ranking, RelevanceRanker
+from app.agent.simulator import SimulatedDesktop, SimulatedPerception
+from app.agent.tracking import ElementDelta, ElementTracker
+from app.agent.validation import repair_plan, retarget_labels
+from app.agent.workflow import Workflow, WorkflowStep, anchor_for_point, find_anchor
+from app.pipeline.graph import Stage, StageGraph
+from app.pipeline.reasoning import ScreenStructure, analyze_elements
+
+
+def _element_key(elements: ElementTable) -> Tuple[bytes, bytes, Tuple[str, ...], Tuple[str, ...]]:
+    """Cache key for stages that depend only on the element set (not on which string table holds it)."""
+    return (elements.ids.tobytes(), elements.boxes.tobytes(), tuple(elements.texts()), tuple(elements.types()))
 
 
 class VisualAgentEngine:
@@ -29,6 +49,34 @@ class VisualAgentEngine:
         openai_model: str,
         openai_temperature: float,
         action_pause: float = 0.35,
+        typing_mode: str = "paste",
+        macro_pause: float = 0.05,
+        image_max_side: int = 1280,
+        image_detail: str = "auto",
+        max_crops: int = 2,
+        element_deltas: bool = True,
+        history_window: int = 10,
+        planner_cascade: Optional[str] = None,
+        display: Optional[str] = None,
+        toolbox_backend: Optional[str] = None,
+        remote_input_url: Optional[str] = None,
+        remote_input_token: Optional[str] = None,
+        click_settle: Optional[float] = None,
+        bbox_threshold: float = 0.001,
+        iou_threshold: float = 0.4,
+        dedup: bool = True,
+        min_confidence: float = 0.0,
+        simulator: Optional[SimulatedDesktop] = None,
+        planner: Optional[Any] = None,
+        hedge_after: float = 8.0,
+        local_ocr: bool = True,
+        eager_debug_overlays: bool = False,
+        debug_snapshots: bool = True,
+        element_top_k: int = 80,
+        form_structure: bool = True,
+        stage_overrides: Optional[Dict[str, str]] = None,
+        blob_store: Optional[Any] = None,
+        perception_cache: int = 8,
     ) -> None:
         self.run_id = run_id
         self.max_iterations = max_iterations
@@ -36,24 +84,68 @@ class VisualAgentEngine:
         log_dir.mkdir(parents=True, exist_ok=True)
         screenshot_dir.mkdir(parents=True, exist_ok=True)
         log_file = log_dir / "actions.log"
+        if simulator is not None:
+            toolbox_backend, backend_options = "simulated", {"desktop": simulator}
+        elif toolbox_backend == "remote":
+            backend_options = {"url": remote_input_url, "token": remote_input_token}
+        else:
+            backend_options = None
         self.toolbox = AgentToolbox(
             log_file=log_file,
             screenshot_dir=screenshot_dir,
             enable_overlay=enable_overlay,
             dry_run=dry_run,
+            typing_mode=typing_mode,
+            macro_pause=macro_pause,
+            display=display,
+            backend=toolbox_backend or None,
+            backend_options=backend_options,
+            click_settle=click_settle,
+            blob_store=blob_store,
         )
+        self.blob_store = blob_store
         self.plan_log_dir = (log_dir / "plans").resolve()
         self.plan_log_dir.mkdir(parents=True, exist_ok=True)
         self.omniparser_debug_dir = (log_dir / "omniparser").resolve()
         self.omniparser_debug_dir.mkdir(parents=True, exist_ok=True)
-        self.omniparser = OmniParserClient(api_url=omniparser_url, api_token=omniparser_token)
-        self.planner = QwenPlanner(
+        self.eager_debug_overlays = eager_debug_overlays
+        self.debug_snapshots = debug_snapshots
+        self.simulator = simulator
+        if simulator is not None:
+            self.omniparser = SimulatedPerception(simulator)
+            local = None
+        else:
+            self.omniparser = OmniParserClient(
+                api_url=omniparser_url,
+                api_token=omniparser_token,
+                bbox_threshold=bbox_threshold,
+                iou_threshold=iou_threshold,
+                dedup=dedup,
+                min_confidence=min_confidence,
+            )
+            local = LocalPerception(strings=self.omniparser.strings, ocr=local_ocr) if hedge_after > 0 else None
+        self.perception = HedgedPerception(self.omniparser, local, hedge_after=hedge_after, cache_size=perception_cache)
+        self.planner = planner or CascadePlanner.from_spec(
+            planner_cascade,
             api_key=openai_api_key,
             api_base=openai_api_base,
             model=openai_model,
             temperature=openai_temperature,
+            image_max_side=image_max_side,
+            image_detail=image_detail,
+            max_crops=max_crops,
+            history_window=history_window,
         )
+        self.tracker = ElementTracker()
+        self.ranker = RelevanceRanker(top_k=element_top_k)
+        self.form_structure = form_structure
+        self.max_crops = max_crops
+        self.stages = self._build_stages(stage_overrides)
+        self.element_deltas = element_deltas
+        self.deadline = Deadline.unbounded()
+        self.validation_stats: Counter = Counter()
         self.log_file = log_file
+        self.actions_json = log_dir / "actions.json"
 
     def run(
         self,
@@ -61,13 +153,17 @@ class VisualAgentEngine:
         *,
         file_path: Optional[str] = None,
         clarifications: Optional[List[str]] = None,
+        deadline: Optional[Deadline] = None,
     ) -> AgentResult:
         clarifications = clarifications or []
+        self.deadline = deadline or self.deadline
         screenshots: List[str] = []
         action_history: List[Dict[str, Any]] = []
-        latest_elements: List[Dict[str, Any]] = []
+        latest_elements = ElementTable.empty()
         plan_payload: Dict[str, Any] = {}
-        pending_perception: Optional[Dict[str, Any]] = None
+        pending: Optional[Tuple[Dict[str, Any], ElementDelta]] = None
+        last_executed: List[Dict[str, Any]] = []
+        escalate = False
 
         start_record = ActionRecord(
             action="info",
@@ -88,91 +184,44 @@ class VisualAgentEngine:
 
         try:
             for iteration in range(self.max_iterations):
-                # Clear overlays at the beginning of each iteration to avoid cluttering screenshots
-                self.toolbox.clear_overlay()
-                try:
-                    if pending_perception is not None:
-                        perception = pending_perception
-                        pending_perception = None
-                    else:
-                        perception = self.omniparser.analyze(screenshot_path)
-                except (OmniParserError, FileNotFoundError) as exc:
-                    raise RuntimeError(f"Perception stage failed: {exc}") from exc
-                latest_elements = perception.get("elements", [])
-                self._write_omniparser_debug(screenshot_path, latest_elements, iteration, prefix="pre")
-                before_elements = latest_elements.copy()
-
-                try:
-                    planner_response = self.planner.plan_actions(
-                        instruction,
-                        screenshot_path,
-                        latest_elements,
-                        action_history,
-                        omniparser_payload=perception,
+                with tracing.span("iteration", index=iteration):
+                    self.deadline.check("iteration start")
+                    # Clear overlays at the beginning of each iteration to avoid cluttering screenshots
+                    self.toolbox.clear_overlay()
+                    state = self.stages.run(
+                        {
+                            "iteration": iteration,
+                            "instruction": instruction,
+                            "screenshot_path": screenshot_path,
+                            "pending": pending,
+                            "action_history": action_history,
+                            "last_executed": last_executed,
+                            "escalate": escalate,
+                            "screenshots": screenshots,
+                        },
+                        halt="needs_input",
                     )
-                except QwenPlannerError as exc:
-                    raise RuntimeError(f"Planner failed: {exc}") from exc
-                plan_payload = {
-                    "thinking": planner_response.thinking,
-                    "should_continue": planner_response.should_continue,
-                    "needs_user_input": planner_response.needs_user_input,
-                    "actions": [action.__dict__ for action in planner_response.actions],
-                }
-                self._write_plan_log(iteration, plan_payload)
-
-                if planner_response.needs_user_input:
-                    return AgentResult(
-                        status="needs_input",
-                        final_message=planner_response.thinking,
-                        actions=action_history,
-                        screenshots=screenshots,
-                        elements=latest_elements,
-                        plan=plan_payload,
-                        log_path=str(self.log_file),
-                        pending_question=planner_response.user_question,
-                    )
-
-                executed = self._execute_actions(planner_response.actions, latest_elements)
-                action_history.extend(executed)
-                if self.action_pause:
-                    time.sleep(self.action_pause)
-
-                # Clear any visual annotations before capturing verification screenshots
-                self.toolbox.clear_overlay()
-                post_shot = self.toolbox.take_screenshot(f"run_{self.run_id}_{iteration}_post")
-                post_path = post_shot.metadata.get("path")
-                if not post_path:
-                    raise RuntimeError("Failed to capture verification screenshot")
-                screenshot_path = Path(post_path)
-                screenshots.append(screenshot_path.as_posix())
-
-                try:
-                    post_perception = self.omniparser.analyze(screenshot_path)
-                except (OmniParserError, FileNotFoundError) as exc:
-                    raise RuntimeError(f"Perception verification failed: {exc}") from exc
-
-                pending_perception = post_perception
-                after_elements = post_perception.get("elements", [])
-                self._write_omniparser_debug(screenshot_path, after_elements, iteration, prefix="post")
-                latest_elements = after_elements
-
-                significant_actions = any(a.tool not in {"wait", "screenshot", "annotate"} for a in planner_response.actions)
-                state_changed = self._state_changed(before_elements, after_elements)
-                if significant_actions and not state_changed:
-                    info_record = self.toolbox.log_action(
-                        ActionRecord(
-                            action="info",
-                            message="Previous plan produced no visible change; retrying with a different approach.",
+                    latest_elements = state["elements"]
+                    plan_payload = state["plan_payload"]
+                    planner_response = state["planner_response"]
+                    if state["needs_input"]:
+                        return AgentResult(
+                            status="needs_input",
+                            final_message=planner_response.thinking,
+                            actions=action_history,
+                            screenshots=screenshots,
+                            elements=latest_elements,
+                            plan=plan_payload,
+                            log_path=str(self.log_file),
+                            pending_question=planner_response.user_question,
                         )
-                    )
-                    action_history.append(info_record.to_dict())
-                    planner_response.should_continue = True
-                    plan_payload["state_change_detected"] = False
-                else:
-                    plan_payload["state_change_detected"] = True
-
-                if not planner_response.should_continue:
-                    break
+                    last_executed = state["executed"]
+                    screenshot_path = state["post_screenshot"]
+                    pending = (state["post_perception"], state["post_delta"])
+                    latest_elements = state["post_elements"]
+                    escalate = state["escalate_next"]
+                    if not planner_response.should_continue:
+                        break
 
             final_message = plan_payload.get("thinking", "Action plan completed")
             return AgentResult(
@@ -184,56 +233,474 @@ class VisualAgentEngine:
                 plan=plan_payload,
                 log_path=str(self.log_file),
             )
+        except DeadlineExceeded as exc:
+            return self._timeout_result(exc, action_history, screenshots, latest_elements, plan_payload)
         finally:
+            self._write_actions_json()
+            self.stages.shutdown()
+            self.perception.shutdown()
             self.toolbox.shutdown()
 
-    def _execute_actions(self, actions: List[PlannedAction], elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _build_stages(self, overrides: Optional[Dict[str, str]] = None) -> StageGraph:
+        """One loop iteration as a stage graph; ``rank`` and ``reason`` run side by side."""
+        graph = StageGraph(
+            [
+                Stage("perceive", self._stage_perceive, ("iteration", "screenshot_path", "pending"), ("perception", "delta", "elements")),
+                Stage("rank", self._stage_rank, ("elements", "instruction", "action_history", "last_executed"), ("ranking",)),
+                Stage("reason", self._stage_reason, ("elements",), ("structure",), cache_size=8, cache_key=_element_key),
+                Stage(
+                    "plan",
+                    self._stage_plan,
+                    ("instruction", "screenshot_path", "perception", "delta", "ranking", "structure", "action_history", "last_executed", "escalate"),
+                    ("plan_call", "draft"),
+                    concurrent=False,
+                ),
+                Stage(
+                    "validate",
+                    self._stage_validate,
+                    ("iteration", "plan_call", "draft", "perception", "ranking", "structure", "action_history"),
+                    ("planner_response", "validation", "plan_payload", "needs_input"),
+                    concurrent=False,
+                ),
+                Stage("execute", self._stage_execute, ("planner_response", "elements", "action_history"), ("executed",), concurrent=False),
+                Stage("capture", self._stage_capture, ("iteration", "executed", "screenshots"), ("post_screenshot",), concurrent=False),
+                Stage(
+                    "verify",
+                    self._stage_verify,
+                    ("iteration", "post_screenshot", "planner_response", "plan_payload", "action_history"),
+                    ("post_perception", "post_delta", "post_elements", "escalate_next"),
+                    concurrent=False,
+                ),
+            ]
+        )
+        graph.apply_overrides(overrides or {})
+        return graph
+
+    def _stage_perceive(self, iteration: int, screenshot_path: Path, pending: Optional[Tuple[Dict[str, Any], ElementDelta]]) -> Dict[str, Any]:
+        # The previous iteration's verification already perceived this screen.
+        if pending is not None:
+            perception, delta = pending
+        else:
+            try:
+                perception = self.perception.analyze(screenshot_path, deadline=self.deadline)
+            except (OmniParserError, FileNotFoundError) as exc:
+                if self.deadline.expired:
+                    raise DeadlineExceeded("perception") from exc
+                raise RuntimeError(f"Perception stage failed: {exc}") from exc
+            tracing.instant("perception", source=perception.get("source", "omniparser"), elements=len(perception["elements"]))
+            delta = self.tracker.update(perception["elements"])
+        self._write_omniparser_debug(screenshot_path, perception["elements"], iteration, prefix="pre")
+        return {"perception": perception, "delta": delta, "elements": perception["elements"]}
+
+    def _stage_rank(
+        self,
+        elements: ElementTable,
+        instruction: str,
+        action_history: List[Dict[str, Any]],
+        last_executed: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        return {"ranking": self.ranker.rank(elements, instruction, action_history, self._last_point(last_executed))}
+
+    def _stage_reason(self, elements: ElementTable) -> Dict[str, Any]:
+        if not self.form_structure:
+            return {"structure": ScreenStructure()}
+        return {"structure": analyze_elements({"elements": elements})}
+
+    def _stage_plan(
+        self,
+        instruction: str,
+        screenshot_path: Path,
+        perception: Dict[str, Any],
+        delta: Optional[ElementDelta],
+        ranking: Ranking,
+        structure: ScreenStructure,
+        action_history: List[Dict[str, Any]],
+        last_executed: List[Dict[str, Any]],
+        escalate: bool,
+    ) -> Dict[str, Any]:
+        plan_kwargs: Dict[str, Any] = {}
+        if ranking.ranked:
+            plan_kwargs["omitted_elements"] = ranking.summary()
+        described = structure.describe()
+        if described:
+            plan_kwargs["screen_structure"] = described
+        plan_call = partial(
+            self._plan,
+            instruction,
+            screenshot_path,
+            ranking.kept,
+            action_history,
+            omniparser_payload=perception,
+            focus_regions=self._focus_regions(instruction, perception["elements"], last_executed, limit=self.max_crops),
+            element_delta=ranking.restrict(delta) if self.element_deltas else None,
+            screen_size=perception.get("image_size"),
+            escalate=escalate,
+            **plan_kwargs,
+        )
+        return {"plan_call": plan_call, "draft": plan_call()}
+
+    def _stage_validate(
+        self,
+        iteration: int,
+        plan_call: Callable[..., PlannerResponse],
+        draft: PlannerResponse,
+        perception: Dict[str, Any],
+        ranking: Ranking,
+        structure: ScreenStructure,
+        action_history: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        elements = perception["elements"]
+        planner_response, validation = self._validated_plan(
+            plan_call, elements, perception.get("image_size"), action_history, structure.label_targets, response=draft
+        )
+        plan_payload = {
+            "thinking": planner_response.thinking,
+            "should_continue": planner_response.should_continue,
+            "needs_user_input": planner_response.needs_user_input,
+            "actions": [action.__dict__ for action in planner_response.actions],
+            "perception_source": perception.get("source", "omniparser"),
+            "perception_cached": bool(perception.get("cached")),
+            "dedup": perception.get("dedup"),
+            "usage": planner_response.usage,
+            "usage_totals": self.planner.cache_summary(),
+            "model": planner_response.model,
+            "escalations": planner_response.escalations,
+            "planner_tiers": self.planner.stats_summary(),
+            "validation": validation,
+            "validation_totals": dict(self.validation_stats),
+            "elements_sent": len(ranking.kept),
+            "elements_total": len(elements),
+            "form_structure": structure.to_dict() if self.form_structure else None,
+            "stages": self.stages.stats_summary(),
+        }
+        self._write_plan_log(iteration, plan_payload)
+        return {
+            "planner_response": planner_response,
+            "validation": validation,
+            "plan_payload": plan_payload,
+            "needs_input": planner_response.needs_user_input,
+        }
+
+    def _stage_execute(self, planner_response: PlannerResponse, elements: ElementTable, action_history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        executed = self._execute_actions(planner_response.actions, elements)
+        action_history.extend(executed)
+        self.deadline.check("verification")
+        return {"executed": executed}
+
+    def _stage_capture(self, iteration: int, executed: List[Dict[str, Any]], screenshots: List[str]) -> Dict[str, Any]:
+        # Clear any visual annotations before capturing verification screenshots
+        self.toolbox.clear_overlay()
+        post_shot = self.toolbox.take_screenshot(f"run_{self.run_id}_{iteration}_post")
+        post_path = post_shot.metadata.get("path")
+        if not post_path:
+            raise RuntimeError("Failed to capture verification screenshot")
+        screenshots.append(Path(post_path).as_posix())
+        return {"post_screenshot": Path(post_path)}
+
+    def _stage_verify(
+        self,
+        iteration: int,
+        post_screenshot: Path,
+        planner_response: PlannerResponse,
+        plan_payload: Dict[str, Any],
+        action_history: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        try:
+            post_perception = self.perception.analyze(post_screenshot, deadline=self.deadline)
+        except (OmniParserError, FileNotFoundError) as exc:
+            if self.deadline.expired:
+                raise DeadlineExceeded("verification") from exc
+            raise RuntimeError(f"Perception verification failed: {exc}") from exc
+        after_elements = post_perception["elements"]
+        tracing.instant("perception", source=post_perception.get("source", "omniparser"), elements=len(after_elements))
+        post_delta = self.tracker.update(after_elements)
+        self._write_omniparser_debug(post_screenshot, after_elements, iteration, prefix="post")
+
+        significant_actions = any(a.tool not in {"wait", "screenshot", "annotate"} for a in planner_response.actions)
+        # A plan that changed nothing goes straight to the stronger planner tier next time.
+        escalate = significant_actions and post_delta.is_empty
+        if escalate:
+            info_record = self.toolbox.log_action(
+                ActionRecord(
+                    action="info",
+                    message="Previous plan produced no visible change; retrying with a different approach.",
+                )
+            )
+            action_history.append(info_record.to_dict())
+            planner_response.should_continue = True
+        plan_payload["state_change_detected"] = not escalate
+        return {"post_perception": post_perception, "post_delta": post_delta, "post_elements": after_elements, "escalate_next": escalate}
+
+    def _plan(self, *args: Any, **kwargs: Any) -> PlannerResponse:
+        try:
+            return self.planner.plan_actions(*args, deadline=self.deadline, **kwargs)
+        except QwenPlannerError as exc:
+            if self.deadline.expired:
+                raise DeadlineExceeded("planning") from exc
+            raise RuntimeError(f"Planner failed: {exc}") from exc
+
+    def _validated_plan(
+        self,
+        plan_call: Callable[..., PlannerResponse],
+        elements: ElementTable,
+        screen_size: Optional[Sequence[int]],
+        action_history: List[Dict[str, Any]],
+        label_targets: Optional[Dict[int, int]] = None,
+        *,
+        response: Optional[PlannerResponse] = None,
+    ) -> Tuple[PlannerResponse, Dict[str, Any]]:
+        """Plan, repair locally, and re-prompt once with every remaining problem.
+
+        Actions that are still invalid after the corrective call are dropped so they do not
+        burn an iteration failing at execution time; clicks and typing aimed at a form label
+        are moved onto the field it names (``label_targets``).
+        """
+        response = response or plan_call()
+        report = response.validation or repair_plan(response, elements, screen_size)
+        stats = self.validation_stats
+        stats["plans"] += 1
+        stats["repairs"] += len(report.repairs)
+        repairs = list(report.repairs)
+        reprompted = False
+        if report.issues and not response.needs_user_input:
+            stats["reprompts"] += 1
+            reprompted = True
+            problems = "\n".join(f"- {issue.describe()}" for issue in report.issues)
+            previous = json.dumps([action.__dict__ for action in response.actions], ensure_ascii=False)
+            correction = (
+                "Your previous plan for this screen cannot be executed as written:\n"
+                f"{problems}\nPrevious actions: {previous}\n"
+                "Return a corrected plan that only references listed element ids and on-screen coordinates."
+            )
+            try:
+                corrected = plan_call(correction=correction)
+            except DeadlineExceeded:
+                raise
+            except RuntimeError:
+                # Keep the original plan; its invalid actions are dropped below.
+                corrected = None
+            if corrected is not None:
+                corrected_report = corrected.validation or repair_plan(corrected, elements, screen_size)
+                stats["repairs"] += len(corrected_report.repairs)
+                if len(corrected_report.issues) <= len(report.issues):
+                    response, report = corrected, corrected_report
+                    repairs.extend(corrected_report.repairs)
+        if label_targets:
+            retargeted = retarget_labels(response, elements, label_targets)
+            stats["retargeted"] += len(retargeted)
+            repairs.extend(retargeted)
+        invalid = {issue.index for issue in report.issues if issue.index >= 0}
+        if invalid:
+            response.actions = [action for index, action in enumerate(response.actions) if index not in invalid]
+            stats["dropped"] += len(invalid)
+            skipped = self.toolbox.log_action(
+                ActionRecord(
+                    action="info",
+                    message=f"Skipped {len(invalid)} planned action(s) that failed validation: "
+                    + "; ".join(issue.describe() for issue in report.issues),
+                    success=False,
+                )
+            )
+            action_history.append(skipped.to_dict())
+        return response, {
+            "repairs": repairs,
+            "issues": [issue.describe() for issue in report.issues],
+            "reprompted": reprompted,
+            "dropped": len(invalid),
+        }
+
+    def _timeout_result(
+        self,
+        exc: DeadlineExceeded,
+        action_history: List[Dict[str, Any]],
+        screenshots: List[str],
+        elements: ElementTable,
+        plan_payload: Dict[str, Any],
+    ) -> AgentResult:
+        message = f"{exc} after {self.deadline.elapsed():.1f}s; returning partial results."
+        record = self.toolbox.log_action(ActionRecord(action="info", message=message, success=False))
+        action_history.append(record.to_dict())
+        return AgentResult(
+            status="timeout",
+            final_message=message,
+            actions=action_history,
+            screenshots=screenshots,
+            elements=elements,
+            plan={**plan_payload, "timed_out_during": exc.stage},
+            log_path=str(self.log_file),
+        )
+
+    def _pause(self, seconds: float) -> None:
+        if seconds:
+            seconds = self.deadline.clamp(seconds)
+            with tracing.span("sleep", seconds=seconds):
+                time.sleep(seconds)
+
+    def replay(
+        self,
+        workflow: Workflow,
+        *,
+        variables: Optional[Dict[str, str]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> AgentResult:
+        """Execute a compiled workflow using only local perception; hand over to the planner when an anchor is missing."""
+        screenshots: List[str] = []
+        action_history: List[Dict[str, Any]] = []
+        elements = ElementTable.empty()
+        stale = True
+        self.deadline = deadline or self.deadline
+
+        start_record = self.toolbox.log_action(
+            ActionRecord(
+                action="info",
+                message=f"Replaying workflow '{workflow.name}' ({len(workflow.steps)} steps) without the planner.",
+            )
+        )
+        action_history.append(start_record.to_dict())
+
+        try:
+            for index, step in enumerate(workflow.steps):
+                self.deadline.check("replay")
+                self.toolbox.clear_overlay()
+                planned = PlannedAction(
+                    tool=step.tool,
+                    explanation=step.explanation,
+                    keys=step.keys,
+                    amount=step.amount,
+                    wait_seconds=step.wait_seconds,
+                )
+                if step.tool == "type":
+                    planned.value = workflow.render_value(step, variables)
+
+                if step.anchor and (step.tool == "click" or step.coordinates):
+                    if stale:
+                        shot = self.toolbox.take_screenshot(f"run_{self.run_id}_replay_{index}")
+                        shot_path = shot.metadata.get("path")
+                        if not shot_path:
+                            raise RuntimeError("Failed to capture replay screenshot")
+                        screenshots.append(Path(shot_path).as_posix())
+                        try:
+                            elements = self.perception.analyze(shot_path, deadline=self.deadline)["elements"]
+                        except (OmniParserError, FileNotFoundError) as exc:
+                            if self.deadline.expired:
+                                raise DeadlineExceeded("replay perception") from exc
+                            raise RuntimeError(f"Perception stage failed: {exc}") from exc
+                        stale = False
+                    match = find_anchor(step.anchor, elements)
+                    if match is None:
+                        return self._replay_fallback(workflow, index, variables, action_history, screenshots)
+                    if step.tool == "click":
+                        planned.element_id = match.get("element_id")
+                    else:
+                        planned.coordinates = list(match.get("center") or [])
+                elif step.coordinates:
+                    planned.coordinates = list(step.coordinates)
+
+                executed = self._execute_actions([planned], elements)
+                action_history.extend(executed)
+                if not all(item.get("success", True) for item in executed):
+                    return self._replay_fallback(workflow, index, variables, action_history, screenshots)
+                if step.tool != "wait":
+                    stale = True
+
+            final_shot = self.toolbox.take_screenshot(f"run_{self.run_id}_replay_done")
+            if final_shot.metadata.get("path"):
+                screenshots.append(Path(final_shot.metadata["path"]).as_posix())
+            return AgentResult(
+                status="success",
+                final_message=f"Replayed workflow '{workflow.name}' without planner calls.",
+                actions=action_history,
+                screenshots=screenshots,
+                elements=elements,
+                plan={"mode": "replay", "workflow": workflow.name, "steps_replayed": len(workflow.steps), "fallback": False},
+                log_path=str(self.log_file),
+            )
+        except DeadlineExceeded as exc:
+            return self._timeout_result(exc, action_history, screenshots, elements, {"mode": "replay", "workflow": workflow.name})
+        finally:
+            self._write_actions_json()
+            self.perception.shutdown()
+            self.toolbox.shutdown()
+
+    def _replay_fallback(
+        self,
+        workflow: Workflow,
+        index: int,
+        variables: Optional[Dict[str, str]],
+        action_history: List[Dict[str, Any]],
+        screenshots: List[str],
+    ) -> AgentResult:
+        step = workflow.steps[index]
+        anchor = step.anchor or {}
+        record = self.toolbox.log_action(
+            ActionRecord(
+                action="info",
+                message=f"Replay stopped at step {index + 1}: '{anchor.get('text', '')}' ({anchor.get('type', 'unknown')}) "
+                "was not found. Handing over to the planner.",
+            )
+        )
+        action_history.append(record.to_dict())
+        remaining = "\n".join(f"- {self._describe_step(workflow, item, variables)}" for item in workflow.steps[index:])
+        instruction = (
+            f"{workflow.prompt}\n\nA recorded workflow already completed the first {index} steps. "
+            f"Finish the task; the remaining recorded steps were:\n{remaining}"
+        )
+        result = self.run(instruction, clarifications=workflow.clarifications)
+        result.actions = action_history + result.actions
+        result.screenshots = screenshots + result.screenshots
+        result.plan = {**result.plan, "mode": "replay", "workflow": workflow.name, "steps_replayed": index, "fallback": True}
+        return result
+
+    @staticmethod
+    def _describe_step(workflow: Workflow, step: WorkflowStep, variables: Optional[Dict[str, str]]) -> str:
+        target = f" on '{step.anchor.get('text', '')}' ({step.anchor.get('type', 'unknown')})" if step.anchor else ""
+        if step.tool == "type":
+            return f"type '{workflow.render_value(step, variables)}'{target}"
+        if step.tool == "shortcut":
+            return f"press {' + '.join(step.keys or [])}"
+        return f"{step.tool}{target}"
+
+    def _write_actions_json(self) -> None:
+        try:
+            self.actions_json.write_text(self.toolbox.to_json(), encoding="utf-8")
+        except Exception:
+            pass
+
+    def _execute_actions(self, actions: List[PlannedAction], elements: ElementTable) -> List[Dict[str, Any]]:
         executed: List[Dict[str, Any]] = []
-        element_lookup = {elem.get("element_id"): elem for elem in elements}
+        batch: List[Dict[str, Any]] = []
+
+        def flush() -> None:
+            # Consecutive click/type/shortcut steps run as one macro with only the short macro pause between them.
+            if not batch:
+                return
+            records = self.toolbox.run_macro(batch)
+            for step, record in zip(batch, records):
+                if step.get("anchor"):
+                    record.metadata["anchor"] = step["anchor"]
+            executed.extend(record.to_dict() for record in records)
+            batch.clear()
+            self._pause(self.action_pause)
+
         for action in actions:
+            if self.deadline.expired:
+                flush()
+                skipped = self.toolbox.log_action(
+                    ActionRecord(action="info", message="Run deadline reached; skipping remaining planned actions.", success=False)
+                )
+                executed.append(skipped.to_dict())
+                break
             record: Optional[ActionRecord] = None
             try:
-                if action.tool == "click":
-                    x = y = None
-                    if action.coordinates:
-                        x, y = action.coordinates[0], action.coordinates[1]
-                    elif action.element_id and action.element_id in element_lookup:
-                        bbox = element_lookup[action.element_id].get("bbox") or []
-                        if len(bbox) == 4:
-                            x = int((bbox[0] + bbox[2]) / 2)
-                            y = int((bbox[1] + bbox[3]) / 2)
-                    if x is None or y is None:
-                        raise ValueError("Click action missing coordinates and resolvable element_id")
-                    record = self.toolbox.click(
-                        x,
-                        y,
-                        explanation=action.explanation,
-                        bbox=tuple(action.bbox) if action.bbox else None,
-                    )
-                elif action.tool == "type" and action.value is not None:
-                    x = action.coordinates[0] if action.coordinates else None
-                    y = action.coordinates[1] if action.coordinates else None
-                    record = self.toolbox.type_text(
-                        x,
-                        y,
-                        text=str(action.value),
-                        explanation=action.explanation,
-                    )
-                elif action.tool == "scroll" and action.amount:
-                    record = self.toolbox.scroll(action.amount, explanation=action.explanation)
-                elif action.tool == "wait" and action.wait_seconds:
-                    record = self.toolbox.wait(action.wait_seconds, explanation=action.explanation)
-                elif action.tool == "annotate" and action.bbox and action.explanation:
-                    record = self.toolbox.annotate(tuple(action.bbox), action.explanation)
-                elif action.tool in {"shortcut", "hotkey"}:
-                    key_sequence: List[str] = action.keys or ([] if action.value is None else [part.strip() for part in str(action.value).split("+")])
-                    record = self.toolbox.shortcut(key_sequence, explanation=action.explanation)
-                elif action.tool == "screenshot":
-                    record = self.toolbox.take_screenshot(f"run_{self.run_id}_step")
-                else:
-                    record = ActionRecord(action=action.tool, message=action.explanation or "No-op requested", success=True)
-                    self.toolbox.log_action(record)
+                step = self._macro_step(action, elements)
+                if step is not None:
+                    batch.append(step)
+                    continue
+                flush()
+                with tracing.span(f"action.{action.tool}", category="action"):
+                    record = self._run_single(action)
             except Exception as exc:
+                flush()
                 record = ActionRecord(
                     action=action.tool,
                     message=action.explanation or "Action failed",
@@ -242,10 +709,108 @@ class VisualAgentEngine:
                 )
                 self.toolbox.log_action(record)
             executed.append(record.to_dict())
-            if self.action_pause:
-                time.sleep(self.action_pause)
+            self._pause(self.action_pause)
+        flush()
         return executed
 
+    def _run_single(self, action: PlannedAction) -> ActionRecord:
+        if action.tool == "scroll" and action.amount:
+            return self.toolbox.scroll(action.amount, explanation=action.explanation)
+        if action.tool == "wait" and action.wait_seconds:
+            return self.toolbox.wait(self.deadline.clamp(action.wait_seconds), explanation=action.explanation)
+        if action.tool == "annotate" and action.bbox and action.explanation:
+            return self.toolbox.annotate(tuple(action.bbox), action.explanation)
+        if action.tool == "screenshot":
+            return self.toolbox.take_screenshot(f"run_{self.run_id}_step")
+        record = ActionRecord(action=action.tool, message=action.explanation or "No-op requested", success=True)
+        self.toolbox.log_action(record)
+        return record
+
+    def _macro_step(
+        self,
+        action: PlannedAction,
+        elements: ElementTable,
+    ) -> Optional[Dict[str, Any]]:
+        """Translate a click/type/shortcut action into a toolbox macro step, or None for other tools.
+
+        Click and positioned type steps carry the element they target as ``anchor`` so the run
+        can later be compiled into a workflow.
+        """
+        if action.tool == "click":
+            x = y = None
+            if action.coordinates:
+                x, y = action.coordinates[0], action.coordinates[1]
+            elif action.element_id and elements.index_of(action.element_id) is not None:
+                bbox = elements.boxes[elements.index_of(action.element_id)]
+                x = int((bbox[0] + bbox[2]) / 2)
+                y = int((bbox[1] + bbox[3]) / 2)
+            if x is None or y is None:
+                raise ValueError("Click action missing coordinates and resolvable element_id")
+            return {
+                "op": "click",
+                "x": x,
+                "y": y,
+                "explanation": action.explanation,
+                "bbox": tuple(action.bbox) if action.bbox else None,
+                "anchor": anchor_for_point(elements, x, y),
+            }
+        if action.tool == "type" and action.value is not None:
+            x = action.coordinates[0] if action.coordinates else None
+            y = action.coordinates[1] if action.coordinates else None
+            return {
+                "op": "type",
+                "x": x,
+                "y": y,
+                "text": str(action.value),
+                "explanation": action.explanation,
+                "anchor": anchor_for_point(elements, x, y) if x is not None and y is not None else None,
+            }
+        if action.tool in {"shortcut", "hotkey"}:
+            key_sequence: List[str] = action.keys or ([] if action.value is None else [part.strip() for part in str(action.value).split("+")])
+            return {"op": "shortcut", "keys": key_sequence, "explanation": action.explanation}
+        return None
+
+    @staticmethod
+    def _last_point(last_executed: List[Dict[str, Any]]) -> Optional[Sequence[float]]:
+        for record in reversed(last_executed):
+            coords = record.get("coords")
+            if coords and len(coords) == 2 and coords[0] is not None:
+                return coords
+        return None
+
+    def _focus_regions(
+        self,
+        instruction: str,
+        elements: ElementTable,
+        last_executed: List[Dict[str, Any]],
+        limit: int = 2,
+    ) -> List[Sequence[float]]:
+        """Screen regions worth a high-detail crop: what the last plan touched, then instruction matches."""
+        regions: List[Sequence[float]] = []
+        if limit <= 0:
+            return regions
+        for record in reversed(last_executed):
+            bbox = (record.get("metadata") or {}).get("bbox")
+            coords = record.get("coords")
+            if bbox and len(bbox) == 4:
+                regions.append(bbox)
+            elif coords and len(coords) == 2 and coords[0] is not None:
+                regions.append((coords[0], coords[1], coords[0], coords[1]))
+            if len(regions) >= limit:
+                return regions
+
+        terms = {word for word in re.findall(r"[a-z0-9]+", instruction.lower()) if len(word) > 2}
+        if not terms:
+            return regions
+        scored = []
+        for index, text in enumerate(elements.texts()):
+            overlap = len(set(re.findall(r"[a-z0-9]+", text.lower())) & terms)
+            if overlap:
+                scored.append((overlap, elements.boxes[index].tolist()))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        regions.extend(bbox for _, bbox in scored[: max(0, limit - len(regions))])
+        return regions
+
     def _compose_instruction(self, prompt: str, clarifications: List[str]) -> str:
         prompt = prompt.strip()
         if not clarifications:
@@ -261,23 +826,20 @@ class VisualAgentEngine:
         except Exception:
             pass
 
-    def _state_changed(self, before: List[Dict[str, Any]], after: List[Dict[str, Any]]) -> bool:
-        def summarize(elements: List[Dict[str, Any]]) -> set[tuple[str, tuple[int, ...]]]:
-            summary = set()
-            for elem in elements[:80]:
-                text = (elem.get("text") or "").strip()
-                bbox = elem.get("bbox") or []
-                bbox_tuple = tuple(int(x) for x in bbox[:4])
-                summary.add((text, bbox_tuple))
-            return summary
-
-        before_summary = summarize(before)
-        after_summary = summarize(after)
-        return before_summary != after_summary
-
-    def _write_omniparser_debug(self, screenshot_path: Path, elements: List[Dict[str, Any]], iteration: int, prefix: str) -> None:
+    def _write_omniparser_debug(self, screenshot_path: Path, elements: ElementTable, iteration: int, prefix: str) -> None:
+        """Store the element snapshot next to its frame; the overlay is rendered on request unless eager mode is on."""
+        if not self.debug_snapshots:
+            return
+        name = f"{prefix}_iter_{iteration + 1}"
         try:
-            out_path = self.omniparser_debug_dir / f"{prefix}_iter_{iteration + 1}.png"
-            draw_omniparser_boxes(screenshot_path, elements, out_path)
+            snapshot = {"frame": Path(screenshot_path).resolve().as_posix(), "elements": elements.to_dicts()}
+            with (self.omniparser_debug_dir / f"{name}.json").open("w", encoding="utf-8") as handle:
+                json.dump(snapshot, handle)
+            if self.eager_debug_overlays:
+                overlay_path = self.omniparser_debug_dir / f"{name}.png"
+                if self.blob_store is not None:
+                    self.blob_store.put_image(render_omniparser_boxes(screenshot_path, elements), overlay_path)
+                else:
+                    draw_omniparser_boxes(screenshot_path, elements, overlay_path)
         except Exception:
             pass
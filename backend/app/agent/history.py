@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+"""Rolling action-history summary for planner prompts."""
+
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List, Sequence, Tuple
+
+
+def _history_line(item: Dict[str, Any]) -> str:
+    success = item.get("success", True)
+    return f"- {item.get('action')}: {item.get('message')} ({'ok' if success else 'failed'})"
+
+
+class HistorySummary:
+    """Keep the last ``recent`` history items verbatim and fold older ones into a summary.
+
+    Folding is incremental: each ``render`` call only processes the items that slid out
+    of the recent window since the previous call, so the cost per iteration stays flat
+    however long the run gets. Failures, info messages and typed values are kept as
+    short notes because they are what the planner needs to avoid repeating itself.
+    """
+
+    def __init__(self, recent: int = 10, max_notes: int = 8, max_note_chars: int = 120) -> None:
+        self.recent = max(1, recent)
+        self.max_note_chars = max_note_chars
+        self._folded = 0
+        self._counts: Counter = Counter()
+        self._failures = 0
+        self._notes: Deque[str] = deque(maxlen=max_notes)
+
+    def reset(self) -> None:
+        self._folded = 0
+        self._counts.clear()
+        self._failures = 0
+        self._notes.clear()
+
+    def render(self, history: Sequence[Dict[str, Any]]) -> Tuple[str, str]:
+        """Return ``(summary, recent)`` text blocks; either may be empty."""
+        if len(history) < self._folded:
+            # A different (shorter) history than the one folded so far: start over.
+            self.reset()
+        cutoff = max(0, len(history) - self.recent)
+        for item in history[self._folded : cutoff]:
+            self._fold(item)
+        self._folded = max(self._folded, cutoff)
+        recent = "\n".join(_history_line(item) for item in history[cutoff:])
+        return self._summary_text(), recent
+
+    def _fold(self, item: Dict[str, Any]) -> None:
+        action = str(item.get("action") or "unknown")
+        self._counts[action] += 1
+        success = item.get("success", True)
+        if not success:
+            self._failures += 1
+        note = None
+        if not success or action == "info":
+            note = f"{action}: {item.get('message')}"
+        elif action == "type":
+            text = (item.get("metadata") or {}).get("text")
+            note = f"typed {text!r}" if text is not None else f"type: {item.get('message')}"
+        if note:
+            if len(note) > self.max_note_chars:
+                note = note[: self.max_note_chars - 3] + "..."
+            self._notes.append(("FAILED " if not success else "") + note)
+
+    def _summary_text(self) -> str:
+        if not self._folded:
+            return ""
+        counts = ", ".join(f"{action} x{count}" for action, count in sorted(self._counts.items()))
+        lines: List[str] = [f"{self._folded} earlier actions ({counts}); {self._failures} failed."]
+        if self._notes:
+            lines.append("Notable earlier events (oldest first):")
+            lines.extend(f"- {note}" for note in self._notes)
+        return "\n".join(lines)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+"""Multi-resolution screenshot encoding for the planner."""
+
+import base64
+import io
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from . import tracing
+
+Region = Tuple[int, int, int, int]
+
+
+@dataclass
+class ImageView:
+    """An encoded image plus the transform that maps it back to screen pixels."""
+
+    label: str
+    data_url: str
+    detail: str
+    origin: Tuple[int, int]
+    scale: float
+    size: Tuple[int, int]
+
+    @property
+    def region(self) -> Region:
+        x, y = self.origin
+        return (
+            x,
+            y,
+            x + int(round(self.size[0] * self.scale)),
+            y + int(round(self.size[1] * self.scale)),
+        )
+
+    def describe(self) -> str:
+        x1, y1, x2, y2 = self.region
+        if self.origin == (0, 0) and self.label == "overview":
+            return (
+                f"{self.label}: full screen {x2}x{y2} shown at {self.size[0]}x{self.size[1]} "
+                f"(1 image px = {self.scale:.2f} screen px)"
+            )
+        return (
+            f"{self.label}: screen region [{x1}, {y1}, {x2}, {y2}] shown at {self.size[0]}x{self.size[1]} "
+            f"(1 image px = {self.scale:.2f} screen px)"
+        )
+
+    def to_content(self) -> dict:
+        return {"type": "image_url", "image_url": {"url": self.data_url, "detail": self.detail}}
+
+
+def _encode(img: Image.Image) -> str:
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", optimize=False)
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def _fit(img: Image.Image, max_side: int) -> Tuple[Image.Image, float]:
+    width, height = img.size
+    longest = max(width, height)
+    if max_side <= 0 or longest <= max_side:
+        return img, 1.0
+    factor = max_side / float(longest)
+    resized = img.resize((max(1, int(width * factor)), max(1, int(height * factor))), Image.Resampling.LANCZOS)
+    return resized, width / float(resized.size[0])
+
+
+def clamp_region(region: Sequence[float], width: int, height: int) -> Optional[Region]:
+    x1, y1, x2, y2 = (int(round(v)) for v in region[:4])
+    x1, x2 = sorted((x1, x2))
+    y1, y2 = sorted((y1, y2))
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(width, x2), min(height, y2)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return (x1, y1, x2, y2)
+
+
+def expand_region(region: Sequence[float], padding: int, min_size: int = 0) -> Region:
+    x1, y1, x2, y2 = (int(round(v)) for v in region[:4])
+    x1, y1, x2, y2 = x1 - padding, y1 - padding, x2 + padding, y2 + padding
+    if min_size:
+        cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+        half = min_size // 2
+        x1, x2 = min(x1, cx - half), max(x2, cx + half)
+        y1, y2 = min(y1, cy - half), max(y2, cy + half)
+    return (x1, y1, x2, y2)
+
+
+def merge_regions(regions: Iterable[Region]) -> List[Region]:
+    """Union overlapping regions so nearby targets share one crop."""
+    merged: List[Region] = []
+    for region in regions:
+        current = region
+        changed = True
+        while changed:
+            changed = False
+            for idx, other in enumerate(merged):
+                if current[0] <= other[2] and other[0] <= current[2] and current[1] <= other[3] and other[1] <= current[3]:
+                    current = (
+                        min(current[0], other[0]),
+                        min(current[1], other[1]),
+                        max(current[2], other[2]),
+                        max(current[3], other[3]),
+                    )
+                    merged.pop(idx)
+                    changed = True
+                    break
+        merged.append(current)
+    return merged
+
+
+def build_image_views(
+    screenshot_path: str | Path,
+    focus_regions: Optional[Sequence[Sequence[float]]] = None,
+    *,
+    overview_max_side: int = 1280,
+    overview_detail: str = "auto",
+    crop_max_side: int = 768,
+    crop_detail: str = "high",
+    crop_padding: int = 96,
+    crop_min_size: int = 256,
+    max_crops: int = 2,
+) -> List[ImageView]:
+    """Encode a downscaled overview plus high-detail crops around ``focus_regions``.
+
+    Regions are given in screen pixels. Every returned view records its origin and
+    scale so coordinates read off any image can be mapped back to the screen.
+    """
+    with tracing.span("encode") as encode:
+        views = _build_views(
+            screenshot_path,
+            focus_regions,
+            overview_max_side=overview_max_side,
+            overview_detail=overview_detail,
+            crop_max_side=crop_max_side,
+            crop_detail=crop_detail,
+            crop_padding=crop_padding,
+            crop_min_size=crop_min_size,
+            max_crops=max_crops,
+        )
+        encode.set(views=len(views), bytes=sum(len(view.data_url) for view in views))
+    return views
+
+
+def _build_views(
+    screenshot_path: str | Path,
+    focus_regions: Optional[Sequence[Sequence[float]]],
+    *,
+    overview_max_side: int,
+    overview_detail: str,
+    crop_max_side: int,
+    crop_detail: str,
+    crop_padding: int,
+    crop_min_size: int,
+    max_crops: int,
+) -> List[ImageView]:
+    with Image.open(screenshot_path) as src:
+        img = src.convert("RGB")
+    width, height = img.size
+
+    overview, scale = _fit(img, overview_max_side)
+    views = [
+        ImageView(
+            label="overview",
+            data_url=_encode(overview),
+            detail=overview_detail,
+            origin=(0, 0),
+            scale=scale,
+            size=overview.size,
+        )
+    ]
+
+    if not focus_regions or max_crops <= 0:
+        return views
+
+    candidates: List[Region] = []
+    for region in focus_regions:
+        if not region or len(region) < 4:
+            continue
+        clamped = clamp_region(expand_region(region, crop_padding, crop_min_size), width, height)
+        if clamped:
+            candidates.append(clamped)
+
+    for idx, region in enumerate(merge_regions(candidates)[:max_crops], start=1):
+        # A crop covering most of the screen adds nothing over the overview.
+        if (region[2] - region[0]) * (region[3] - region[1]) >= 0.6 * width * height:
+            continue
+        crop, crop_scale = _fit(img.crop(region), crop_max_side)
+        views.append(
+            ImageView(
+                label=f"crop {idx}",
+                data_url=_encode(crop),
+                detail=crop_detail,
+                origin=(region[0], region[1]),
+                scale=crop_scale,
+                size=crop.size,
+            )
+        )
+    return views
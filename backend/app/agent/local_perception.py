@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+"""CPU-only perception fallback and hedged requests against the hosted OmniParser."""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from . import tracing
+from .deadline import Deadline, DeadlineExceeded
+from .elements import ElementTable, StringTable
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]
+
+
+def frame_key(image_path: str | Path) -> Hashable:
+    """File identity of a frame. Frames saved through the blob store are hard links to one file
+    per distinct image, so an unchanged screen keeps the same key from one iteration to the next."""
+    info = os.stat(image_path)
+    return (info.st_dev, info.st_ino, info.st_size, info.st_mtime_ns)
+
+
+def _dilate(mask: np.ndarray, rx: int, ry: int) -> np.ndarray:
+    """Binary dilation by a (2*ry+1, 2*rx+1) rectangle using shifted ORs."""
+    out = mask.copy()
+    for dx in range(1, rx + 1):
+        out[:, dx:] |= mask[:, :-dx]
+        out[:, :-dx] |= mask[:, dx:]
+    grown = out.copy()
+    for dy in range(1, ry + 1):
+        grown[dy:, :] |= out[:-dy, :]
+        grown[:-dy, :] |= out[dy:, :]
+    return grown
+
+
+def _runs(occupied: np.ndarray, min_gap: int) -> List[Tuple[int, int]]:
+    """Start/stop indices of occupied spans separated by at least ``min_gap`` empty cells."""
+    idx = np.flatnonzero(occupied)
+    if not idx.size:
+        return []
+    breaks = np.flatnonzero(np.diff(idx) > min_gap)
+    starts = np.concatenate(([idx[0]], idx[breaks + 1]))
+    stops = np.concatenate((idx[breaks], [idx[-1]])) + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def _xy_cut(mask: np.ndarray, x0: int, y0: int, min_gap: int, depth: int, out: List[Box]) -> None:
+    """Recursive XY-cut: split on empty row/column gaps until a region no longer divides."""
+    rows = _runs(mask.any(axis=1), min_gap)
+    if not rows:
+        return
+    for top, bottom in rows:
+        band = mask[top:bottom]
+        cols = _runs(band.any(axis=0), min_gap)
+        for left, right in cols:
+            cell = band[:, left:right]
+            if depth > 0 and (len(rows) > 1 or len(cols) > 1):
+                _xy_cut(cell, x0 + left, y0 + top, min_gap, depth - 1, out)
+            else:
+                ys = np.flatnonzero(cell.any(axis=1))
+                out.append((x0 + left, y0 + top + int(ys[0]), x0 + right, y0 + top + int(ys[-1]) + 1))
+
+
+class LocalPerception:
+    """Edge/contour widget detection on the CPU, returning the OmniParser result schema.
+
+    Boxes come from a gradient mask that is dilated to merge glyphs into words and then
+    segmented with recursive XY-cuts. Text is filled in with ``pytesseract`` when it is
+    installed and ``ocr`` is enabled.
+    """
+
+    def __init__(
+        self,
+        strings: Optional[StringTable] = None,
+        *,
+        ocr: bool = True,
+        scale: int = 2,
+        edge_threshold: int = 28,
+        min_size: int = 6,
+        max_elements: int = 400,
+    ) -> None:
+        self.strings = strings or StringTable()
+        self.ocr = ocr
+        self.scale = max(1, scale)
+        self.edge_threshold = edge_threshold
+        self.min_size = min_size
+        self.max_elements = max_elements
+
+    def analyze(self, image_path: str | Path) -> Dict[str, Any]:
+        path = Path(image_path)
+        if not path.exists():
+            raise FileNotFoundError(f"Screenshot not found: {path}")
+        with Image.open(path) as img:
+            rgb = img.convert("RGB")
+        width, height = rgb.size
+        with tracing.span("local_perception", ocr=bool(self.ocr)) as detect:
+            boxes = self._detect(rgb)
+            texts = self._read_text(rgb, boxes) if self.ocr else [""] * len(boxes)
+            detect.set(elements=len(boxes))
+        types = [
+            "text" if text or ((x2 - x1) > 2 * (y2 - y1) and (y2 - y1) < 40) else "icon"
+            for (x1, y1, x2, y2), text in zip(boxes, texts)
+        ]
+        table = ElementTable.from_columns(
+            np.asarray(boxes, dtype=np.int32).reshape(-1, 4),
+            texts,
+            types,
+            np.full(len(boxes), 0.3, dtype=np.float32),
+            strings=self.strings,
+        )
+        return {"elements": table, "raw": {"source": "local", "count": len(boxes)}, "image_size": (width, height)}
+
+    def _detect(self, rgb: Image.Image) -> List[Box]:
+        s = self.scale
+        small = rgb.convert("L").resize((max(1, rgb.width // s), max(1, rgb.height // s)), Image.Resampling.BILINEAR)
+        gray = np.asarray(small, dtype=np.int16)
+        edges = np.zeros(gray.shape, dtype=bool)
+        edges[:, 1:] |= np.abs(np.diff(gray, axis=1)) > self.edge_threshold
+        edges[1:, :] |= np.abs(np.diff(gray, axis=0)) > self.edge_threshold
+        mask = _dilate(edges, rx=3, ry=1)
+
+        found: List[Box] = []
+        _xy_cut(mask, 0, 0, min_gap=2, depth=12, out=found)
+
+        boxes: List[Box] = []
+        full_area = rgb.width * rgb.height
+        for x1, y1, x2, y2 in found:
+            box = (x1 * s, y1 * s, min(x2 * s, rgb.width), min(y2 * s, rgb.height))
+            w, h = box[2] - box[0], box[3] - box[1]
+            if w < self.min_size or h < self.min_size or w * h > 0.5 * full_area:
+                continue
+            boxes.append(box)
+        boxes.sort(key=lambda b: (b[1], b[0]))
+        return boxes[: self.max_elements]
+
+    def _read_text(self, rgb: Image.Image, boxes: List[Box]) -> List[str]:
+        texts = [""] * len(boxes)
+        if not boxes:
+            return texts
+        try:
+            import pytesseract
+        except ImportError:
+            return texts
+        try:
+            data = pytesseract.image_to_data(rgb, output_type=pytesseract.Output.DICT)
+        except Exception as exc:
+            logger.debug("Local OCR unavailable: %s", exc)
+            return texts
+        arr = np.asarray(boxes, dtype=np.int32)
+        words: Dict[int, List[str]] = {}
+        for word, left, top, w, h in zip(data["text"], data["left"], data["top"], data["width"], data["height"]):
+            word = (word or "").strip()
+            if not word:
+                continue
+            cx, cy = left + w / 2, top + h / 2
+            hits = np.flatnonzero((arr[:, 0] <= cx) & (cx <= arr[:, 2]) & (arr[:, 1] <= cy) & (cy <= arr[:, 3]))
+            if hits.size:
+                areas = (arr[hits, 2] - arr[hits, 0]) * (arr[hits, 3] - arr[hits, 1])
+                words.setdefault(int(hits[np.argmin(areas)]), []).append(word)
+        for index, parts in words.items():
+            texts[index] = " ".join(parts)
+        return texts
+
+
+class HedgedPerception:
+    """Race the remote OmniParser client against local perception once it runs slow.
+
+    The remote call always starts first. If it has not answered within ``hedge_after``
+    seconds (or fails), the local backend starts and whichever result arrives first
+    wins. Results carry ``source`` (``omniparser`` or ``local``) and ``latency``.
+
+    The last ``cache_size`` results are kept by :func:`frame_key`; a repeat of a stored frame
+    is answered from memory with ``cached`` set. The cache belongs to this instance, so with
+    one per engine it only spans the iterations of a single run.
+    """
+
+    def __init__(self, remote: Any, local: Optional[LocalPerception], hedge_after: float = 8.0, cache_size: int = 0) -> None:
+        self.remote = remote
+        self.local = local
+        self.hedge_after = hedge_after
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self._cache: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="perception")
+
+    def analyze(self, image_path: str | Path, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        if self.cache_size <= 0:
+            return self._analyze(image_path, deadline)
+        key = frame_key(image_path)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+        if cached is not None:
+            tracing.instant("perception.cache_hit", source=cached.get("source"))
+            return self._copy(cached, cached=True, latency=0.0)
+        result = self._analyze(image_path, deadline)
+        with self._cache_lock:
+            self._cache[key] = self._copy(result)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _copy(result: Dict[str, Any], **changes: Any) -> Dict[str, Any]:
+        copied = {**result, **changes}
+        if isinstance(copied.get("elements"), ElementTable):
+            copied["elements"] = copied["elements"].copy()
+        return copied
+
+    def _analyze(self, image_path: str | Path, deadline: Optional[Deadline]) -> Dict[str, Any]:
+        deadline = deadline or Deadline.unbounded()
+        started = time.perf_counter()
+        remote_timeout = deadline.timeout("perception", getattr(self.remote, "timeout", None))
+        if self.local is None or self.hedge_after <= 0:
+            result = self.remote.analyze(image_path, timeout=remote_timeout)
+            return self._label(result, "omniparser", started, hedged=False)
+
+        remote_future = self._executor.submit(tracing.bind(self.remote.analyze), image_path, timeout=remote_timeout)
+        done, _ = wait([remote_future], timeout=deadline.clamp(self.hedge_after))
+        if done and remote_future.exception() is None:
+            return self._label(remote_future.result(), "omniparser", started, hedged=False)
+
+        local_future = self._executor.submit(tracing.bind(self.local.analyze), image_path)
+        pending = {remote_future, local_future}
+        errors: Dict[Future, BaseException] = {}
+        while pending:
+            finished, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not finished:
+                raise DeadlineExceeded("perception")
+            for future in finished:
+                exc = future.exception()
+                if exc is not None:
+                    errors[future] = exc
+                    continue
+                source = "omniparser" if future is remote_future else "local"
+                result = future.result()
+                if source == "local":
+                    logger.info("Local perception answered before OmniParser (%.2fs)", time.perf_counter() - started)
+                    # Same clean-up as the remote path; local boxes carry a flat placeholder confidence.
+                    clean = getattr(self.remote, "clean", None)
+                    if clean is not None:
+                        result = clean(result, min_confidence=0.0)
+                return self._label(result, source, started, hedged=True)
+        # Both failed: surface the remote error so callers see the usual OmniParser failure.
+        raise errors.get(remote_future) or errors[local_future]
+
+    @staticmethod
+    def _label(result: Dict[str, Any], source: str, started: float, hedged: bool) -> Dict[str, Any]:
+        result["source"] = source
+        result["hedged"] = hedged
+        result["latency"] = round(time.perf_counter() - started, 3)
+        return result
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -3,15 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
 
-
-@dataclass
-class ScreenElement:
-    element_id: int
-    text: str
-    type: str
-    bbox: List[int]
-    center: List[int]
-    confidence: float
+from .elements import ElementTable
 
 
 @dataclass
@@ -34,6 +26,10 @@ class PlannerResponse:
     should_continue: bool = False
     needs_user_input: bool = False
     user_question: Optional[str] = None
+    usage: Dict[str, Any] = field(default_factory=dict)
+    model: Optional[str] = None
+    escalations: List[Dict[str, Any]] = field(default_factory=list)
+    validation: Optional[Any] = None
 
 
 @dataclass
@@ -42,7 +38,7 @@ class AgentResult:
     final_message: str
     actions: List[Dict[str, Any]]
     screenshots: List[str]
-    elements: List[Dict[str, Any]]
+    elements: ElementTable
     plan: Dict[str, Any]
     log_path: str
     pending_question: Optional[str] = None
@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+"""Process-wide OpenAI client shared by every run that uses the same key and endpoint.
+
+Concurrent runs would otherwise each hammer the API until it answers 429, and the first
+rejected call would fail its run. Requests through :class:`SharedOpenAIClient` instead:
+
+- wait for a request/token bucket synced from the ``x-ratelimit-*`` response headers, and
+  for any ``retry-after`` pause a 429 imposed on the whole key;
+- hold one of an adaptive number of concurrency slots (AIMD: +1 per limit's worth of
+  successes, halved on a 429);
+- are retried with jittered exponential backoff on 429, 5xx, timeouts and connection
+  errors, within the caller's timeout.
+
+Tuning comes from ``OPENAI_MAX_CONCURRENCY``, ``OPENAI_MAX_RETRIES``, ``OPENAI_RETRY_BASE``
+and ``OPENAI_RETRY_MAX``.
+"""
+
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    OpenAI,
+    OpenAIError,
+    RateLimitError,
+)
+
+from . import tracing
+from .deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+# Status codes worth another attempt besides 429 and 5xx.
+RETRY_STATUS = {408, 409}
+
+
+class ClientQueueTimeout(RuntimeError):
+    """The caller's timeout ran out while waiting for rate-limit capacity."""
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """OpenAI reset headers: ``"20ms"``, ``"1s"``, ``"6m0s"``, ``"1h2m3.5s"``."""
+    if not value:
+        return None
+    parts = _DURATION.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * _UNITS[unit] for number, unit in parts)
+
+
+def retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds from ``retry-after-ms`` / ``retry-after`` (delta seconds or an HTTP date)."""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class TokenBucket:
+    """Capacity and refill rate learnt from the API; unlimited until the first headers arrive."""
+
+    def __init__(self) -> None:
+        self.capacity: Optional[float] = None
+        self.level = 0.0
+        self.rate = 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take ``amount`` if available and return 0, else the seconds until it would be."""
+        self._refill(now)
+        if self.capacity is None:
+            return 0.0
+        # Never wait for more than a full bucket, or an oversized request would block forever.
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            self.level -= amount
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate > 0 else 1.0
+
+    def sync(self, limit: Optional[str], remaining: Optional[str], reset: Optional[str], now: float) -> None:
+        try:
+            capacity = float(limit) if limit else None
+            left = float(remaining) if remaining else None
+        except ValueError:
+            return
+        if capacity is None or left is None or capacity <= 0:
+            return
+        self._refill(now)
+        reset_seconds = parse_duration(reset)
+        # Limits are per minute; the reset header says when the spent part is back.
+        per_minute = capacity / 60.0
+        self.rate = max(per_minute, (capacity - left) / reset_seconds) if reset_seconds else per_minute
+        first = self.capacity is None
+        self.capacity = capacity
+        # The server also counts other processes on this key, so it can only lower our estimate.
+        self.level = left if first else min(self.level, left)
+
+    def snapshot(self) -> Dict[str, Any]:
+        if self.capacity is None:
+            return {"limit": None}
+        return {"limit": self.capacity, "available": round(self.level, 1), "per_second": round(self.rate, 3)}
+
+
+class RateLimiter:
+    """Request and token buckets plus a key-wide pause after a 429."""
+
+    def __init__(self) -> None:
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: float, deadline: Deadline) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0:
+                    wait = self.requests.reserve(1, now)
+                    if wait <= 0:
+                        wait = self.tokens.reserve(cost, now)
+                        if wait > 0:
+                            # Give the request back; both are taken together or not at all.
+                            self.requests.level += 1
+                if wait <= 0:
+                    return
+            remaining = deadline.remaining()
+            if remaining is not None and wait >= remaining:
+                raise ClientQueueTimeout(f"OpenAI rate limit needs {wait:.1f}s, only {remaining:.1f}s left")
+            time.sleep(min(wait, 1.0))
+
+    def observe(self, headers: Optional[Mapping[str, str]]) -> None:
+        if not headers:
+            return
+        with self._lock:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                bucket.sync(
+                    headers.get(f"x-ratelimit-limit-{kind}"),
+                    headers.get(f"x-ratelimit-remaining-{kind}"),
+                    headers.get(f"x-ratelimit-reset-{kind}"),
+                    now,
+                )
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests.snapshot(),
+                "tokens": self.tokens.snapshot(),
+                "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 3),
+            }
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on requests in flight."""
+
+    def __init__(self, initial: int = 4, maximum: int = 8, minimum: int = 1, cooldown: float = 1.0) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        # One burst of 429s is one congestion signal, not one halving per rejected request.
+        self.cooldown = cooldown
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, deadline: Deadline) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline.remaining()
+                if remaining is not None and remaining <= 0:
+                    raise ClientQueueTimeout("Timed out waiting for an OpenAI concurrency slot")
+                self._cond.wait(timeout=remaining if remaining is not None else None)
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(float(self.minimum), self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class SharedOpenAIClient:
+    """One OpenAI client with rate limiting, retries and adaptive concurrency."""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        *,
+        max_concurrency: int = 8,
+        max_retries: int = 4,
+        retry_base: float = 0.5,
+        retry_max: float = 30.0,
+    ) -> None:
+        # Retries are ours, so the SDK's own must not stack on top of them.
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.base_url = base_url
+        self.limiter = RateLimiter()
+        self.concurrency = AdaptiveConcurrency(initial=max(1, max_concurrency // 2), maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.counters = {"requests": 0, "succeeded": 0, "failed": 0, "retries": 0, "throttled": 0}
+        self._waits: deque = deque(maxlen=512)
+        self._lock = threading.Lock()
+
+    def chat_completion(self, *, timeout: Optional[float] = None, cost: float = 1.0, **request: Any) -> Tuple[Any, Dict[str, Any]]:
+        """``chat.completions.create(**request)``; returns the completion and this call's
+        ``attempts``/``queue_wait``/``throttled``. ``timeout`` bounds the whole call, retries
+        included, and ``cost`` is the estimated token count drawn from the token bucket."""
+        deadline = Deadline(timeout)
+        call = {"attempts": 0, "queue_wait": 0.0, "throttled": 0}
+        self._count("requests")
+        while True:
+            queued = time.monotonic()
+            with tracing.span("openai.queue", category="network") as queue:
+                try:
+                    self.concurrency.acquire(deadline)
+                except ClientQueueTimeout:
+                    self._count("failed")
+                    raise
+                try:
+                    self.limiter.acquire(cost, deadline)
+                except ClientQueueTimeout:
+                    self.concurrency.release()
+                    self._count("failed")
+                    raise
+                waited = time.monotonic() - queued
+                queue.set(seconds=round(waited, 4), limit=int(self.concurrency.limit))
+            call["queue_wait"] = round(call["queue_wait"] + waited, 4)
+            call["attempts"] += 1
+            with self._lock:
+                self._waits.append(waited)
+
+            error: Optional[OpenAIError] = None
+            try:
+                options = {"timeout": deadline.remaining()} if deadline.remaining() is not None else {}
+                raw = self.client.chat.completions.with_raw_response.create(**request, **options)
+                self.limiter.observe(raw.headers)
+                completion = raw.parse()
+            except OpenAIError as exc:
+                error = exc
+            finally:
+                self.concurrency.release(throttled=isinstance(error, RateLimitError))
+            if error is None:
+                self._count("succeeded")
+                return completion, call
+
+            headers = getattr(getattr(error, "response", None), "headers", None)
+            self.limiter.observe(headers)
+            delay = self._retry_delay(error, call["attempts"], headers)
+            if isinstance(error, RateLimitError):
+                call["throttled"] += 1
+                self._count("throttled")
+                # Everyone on this key backs off, not just the caller that was rejected.
+                self.limiter.pause(retry_after(headers) or delay or self.retry_base)
+            remaining = deadline.remaining()
+            if delay is None or (remaining is not None and delay >= remaining):
+                self._count("failed")
+                raise error
+            self._count("retries")
+            logger.info("OpenAI call failed (%s); retry %d in %.2fs", error, call["attempts"], delay)
+            time.sleep(delay)
+
+    def _retry_delay(self, exc: OpenAIError, attempt: int, headers: Optional[Mapping[str, str]]) -> Optional[float]:
+        """Seconds before the next attempt, or None when the error is final."""
+        if attempt > self.max_retries:
+            return None
+        if isinstance(exc, APIStatusError):
+            if isinstance(exc, RateLimitError) and getattr(exc, "code", None) == "insufficient_quota":
+                return None
+            if exc.status_code < 500 and exc.status_code != 429 and exc.status_code not in RETRY_STATUS:
+                return None
+        elif not isinstance(exc, (APITimeoutError, APIConnectionError)):
+            return None
+        # Full jitter, so callers rejected together do not come back together.
+        backoff = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (attempt - 1)))
+        hinted = retry_after(headers)
+        return min(self.retry_max, hinted + backoff * 0.25) if hinted is not None else backoff
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            waits = sorted(self._waits)
+        return {
+            **counters,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "queue_wait_p50": round(waits[len(waits) // 2], 4) if waits else None,
+            "queue_wait_p95": round(waits[int(len(waits) * 0.95)], 4) if waits else None,
+            "queue_wait_max": round(waits[-1], 4) if waits else None,
+            "rate_limits": self.limiter.snapshot(),
+        }
+
+
+_clients: Dict[Tuple[str, Optional[str]], SharedOpenAIClient] = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(api_key: str, base_url: Optional[str] = None) -> SharedOpenAIClient:
+    """The process-wide client for this key and endpoint, created on first use."""
+    key = (api_key, (base_url or "").rstrip("/") or None)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = SharedOpenAIClient(
+                api_key,
+                base_url,
+                max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "8")),
+                max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "4")),
+                retry_base=float(os.getenv("OPENAI_RETRY_BASE", "0.5")),
+                retry_max=float(os.getenv("OPENAI_RETRY_MAX", "30")),
+            )
+        return client
@@ -1,14 +1,19 @@
 from __future__ import annotations
 
-import base64
 import json
 import os
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence
 
-from openai import OpenAI, OpenAIError
+from openai import OpenAIError
 
+from . import tracing
+from .elements import ElementTable
+from .history import HistorySummary
+from .imaging import ImageView, build_image_views
 from .models import PlannedAction, PlannerResponse
+from .openai_client import ClientQueueTimeout, shared_client
+from .tracking import ElementDelta, summarize_unchanged
 
 RUN_ACTIONS_TOOL = {
     "type": "function",
@@ -77,6 +82,39 @@ RUN_ACTIONS_TOOL = {
 }
 
 
+# The system prompt and tool schema are sent unchanged on every call so the provider's
+# prompt cache can reuse them; keep anything run- or step-specific out of them.
+SYSTEM_PROMPT = (
+    "You are Vision Form Agent, a careful desktop task planner.\n"
+    "1. Inputs: a downscaled overview of the latest screenshot, optional high-detail crops of relevant regions, "
+    "parsed OmniParser elements array, user request, a summary of earlier actions, and the most recent action logs.\n"
+    "2. Goal: finish the user’s task exactly (form filling, text entry, navigation). "
+    "Only propose actions that can be executed by the available toolbox.\n\n"
+    "Tool usage:\n"
+    "- Always call the run_desktop_actions tool. Every response must include at least one executable action. "
+    "Insert a wait action if you need to pause.\n"
+    "- All coordinates and bboxes you return are full-resolution screen pixels, the same space as the OmniParser "
+    "element bboxes. Images may be scaled or cropped; use the listed origin and scale to convert image positions.\n"
+    "- Element ids are stable across steps. After the first step you receive only added/changed/removed elements plus "
+    "a compact id:text list of unchanged ones; target unchanged elements with element_id instead of coordinates.\n"
+    "- Use keyboard shortcuts when faster (Ctrl+T, Ctrl+L, Ctrl+C/V, Alt+Tab, etc.).\n"
+    "- Treat prior log entries like \"User clicked Go\" as confirmation that the Visual Agent panel has already been launched.\n"
+    "- Always open a new browser tab (Ctrl+T) before navigating to a site or performing a request; do not reuse tabs containing the Visual Agent UI.\n"
+    "- After every critical action (navigation, submit, open document), inspect the updated OmniParser context. "
+    "If the screen still looks the same or the expected element is missing, try an alternative approach instead of declaring success.\n"
+    "- Handle broad user requests independently—choose an appropriate search result or workflow without asking for preferences "
+    "unless the user explicitly required a choice.\n"
+    "- Prefer interacting with actual buttons/inputs rather than surrounding text labels; if text isn’t clickable, locate the nearest actionable element.\n"
+    "- When a required form field (username, DOB, etc.) needs information the user has not provided, do not invent data—set needs_user_input=true and ask for it explicitly.\n"
+    "- Ask for clarification only when the user’s request truly cannot be completed from the current UI.\n"
+    "- Only set should_continue=false when the latest screenshot/analysis clearly shows the user’s goal is complete "
+    "(e.g., logged-in dashboard visible, blank document loaded, item added to cart). If unsure, keep should_continue=true.\n"
+    "- The Visual Agent launcher panel or modal in the screenshot is not part of the task. "
+    "It simply shows status; never type into it, wait for it, or ask it for instructions. "
+    "Ignore it completely and focus on the desktop/browser content behind it.\n"
+)
+
+
 class GPTPlannerError(RuntimeError):
     pass
 
@@ -88,6 +126,12 @@ class GPTPlanner:
         api_base: Optional[str] = None,
         model: Optional[str] = None,
         temperature: float = 0.0,
+        image_max_side: int = 1280,
+        image_detail: str = "auto",
+        crop_detail: str = "high",
+        crop_padding: int = 96,
+        max_crops: int = 2,
+        history_window: int = 10,
     ) -> None:
         self.api_key = api_key or os.getenv("OPENAI_API_KEY") or os.getenv("QWEN_API_KEY")
         self.api_base = api_base or os.getenv("OPENAI_BASE_URL") or os.getenv("QWEN_API_BASE", "https://api.openai.com/v1")
@@ -95,96 +139,119 @@ class GPTPlanner:
         if not self.api_key:
             raise GPTPlannerError("OPENAI_API_KEY is not configured")
         self.temperature = temperature
-        self.client = OpenAI(api_key=self.api_key, base_url=self.api_base)
+        self.image_max_side = image_max_side
+        self.image_detail = image_detail
+        self.crop_detail = crop_detail
+        self.crop_padding = crop_padding
+        self.max_crops = max_crops
+        self.history = HistorySummary(recent=history_window)
+        self.usage_totals: Dict[str, int] = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        # Shared by every planner on this key, so concurrent runs are rate-limited together.
+        self.client = shared_client(self.api_key, self.api_base)
 
     def plan_actions(
         self,
         instruction: str,
         screenshot_path: str | Path,
-        elements: List[Dict[str, Any]],
+        elements: ElementTable,
         action_history: List[Dict[str, Any]],
         omniparser_payload: Optional[Dict[str, Any]] = None,
+        focus_regions: Optional[Sequence[Sequence[float]]] = None,
+        element_delta: Optional[ElementDelta] = None,
+        timeout: Optional[float] = None,
+        correction: Optional[str] = None,
+        omitted_elements: Optional[str] = None,
+        screen_structure: Optional[str] = None,
     ) -> PlannerResponse:
-        image_b64 = self._encode_image(screenshot_path)
-        history_text = self._history_to_text(action_history)
-        elements_json = json.dumps(elements, ensure_ascii=False)
+        image_views = self._encode_image(screenshot_path, focus_regions)
+        summary_text, history_text = self.history.render(action_history)
+        unchanged_text = None
+        if element_delta is not None and not element_delta.initial:
+            elements_json = json.dumps(
+                {
+                    "added": element_delta.added.to_dicts(),
+                    "changed": element_delta.changed.to_dicts(),
+                    "removed_ids": element_delta.removed,
+                },
+                ensure_ascii=False,
+            )
+            unchanged_text = summarize_unchanged(element_delta.unchanged)
+            element_label = "OmniParser element changes since the previous step"
+        else:
+            elements_json = json.dumps(elements.to_dicts(), ensure_ascii=False)
+            element_label = "OmniParser elements"
 
-        element_chunks = self._chunk_text(elements_json)
-        user_segments: List[Dict[str, Any]] = [
-            {
-                "type": "text",
-                "text": "User request (include follow-up clarifications if provided):\n"
-                f"{instruction}\n",
-            },
+        # Ordered from least to most volatile so consecutive calls share the longest prefix.
+        user_segments: List[Dict[str, Any]] = []
+        if summary_text:
+            user_segments.append({"type": "text", "text": f"Summary of earlier actions:\n{summary_text}\n"})
+        user_segments.append(
             {
                 "type": "text",
                 "text": f"Recent action history (most recent last):\n{history_text or 'None yet.'}\n",
-            },
-            {
-                "type": "text",
-                "text": "Reminder: The Visual Agent launcher panel or modal in the screenshot is not part of the task. "
-                "It simply shows status; never type into it, wait for it, or ask it for instructions. "
-                "Ignore it completely and focus on the desktop/browser content behind it.",
-            },
-        ]
+            }
+        )
 
+        element_chunks = self._chunk_text(elements_json)
         for idx, chunk in enumerate(element_chunks, start=1):
             user_segments.append(
                 {
                     "type": "text",
-                    "text": f"OmniParser elements chunk {idx}/{len(element_chunks)}:\n{chunk}",
+                    "text": f"{element_label} chunk {idx}/{len(element_chunks)}:\n{chunk}",
+                }
+            )
+        if unchanged_text:
+            user_segments.append(
+                {
+                    "type": "text",
+                    "text": "Unchanged elements (same position as before; reference them by element_id):\n" + unchanged_text,
+                }
+            )
+        if omitted_elements:
+            user_segments.append({"type": "text", "text": "Other elements on screen:\n" + omitted_elements})
+        if screen_structure:
+            user_segments.append(
+                {
+                    "type": "text",
+                    "text": "Form structure (type into the input ids, not their labels):\n" + screen_structure,
                 }
             )
 
-        system_prompt = (
-            "You are Vision Form Agent, a careful desktop task planner.\n"
-            "1. Inputs: latest screenshot (base64 image), parsed OmniParser elements array, "
-            "user request, and up to 10 recent action logs.\n"
-            "2. Goal: finish the user’s task exactly (form filling, text entry, navigation). "
-            "Only propose actions that can be executed by the available toolbox.\n\n"
-            "Tool usage:\n"
-            "- Always call the run_desktop_actions tool. Every response must include at least one executable action. "
-            "Insert a wait action if you need to pause.\n"
-            "- Use keyboard shortcuts when faster (Ctrl+T, Ctrl+L, Ctrl+C/V, Alt+Tab, etc.).\n"
-            "- Treat prior log entries like \"User clicked Go\" as confirmation that the Visual Agent panel has already been launched.\n"
-            "- Always open a new browser tab (Ctrl+T) before navigating to a site or performing a request; do not reuse tabs containing the Visual Agent UI.\n"
-            "- After every critical action (navigation, submit, open document), inspect the updated OmniParser context. "
-            "If the screen still looks the same or the expected element is missing, try an alternative approach instead of declaring success.\n"
-            "- Handle broad user requests independently—choose an appropriate search result or workflow without asking for preferences "
-            "unless the user explicitly required a choice.\n"
-            "- Prefer interacting with actual buttons/inputs rather than surrounding text labels; if text isn’t clickable, locate the nearest actionable element.\n"
-            "- When a required form field (username, DOB, etc.) needs information the user has not provided, do not invent data—set needs_user_input=true and ask for it explicitly.\n"
-            "- Ask for clarification only when the user’s request truly cannot be completed from the current UI.\n"
-            "- Only set should_continue=false when the latest screenshot/analysis clearly shows the user’s goal is complete "
-            "(e.g., logged-in dashboard visible, blank document loaded, item added to cart). If unsure, keep should_continue=true.\n"
+        user_segments.append(
+            {
+                "type": "text",
+                "text": "Images (in order):\n" + "\n".join(f"- {view.describe()}" for view in image_views),
+            }
         )
-
-        user_message = {
-            "role": "user",
-            "content": [
-                *user_segments,
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/png;base64,{image_b64}"},
-                },
-            ],
-        }
+        user_segments.extend(view.to_content() for view in image_views)
+        if correction:
+            user_segments.append({"type": "text", "text": correction})
 
         messages = [
-            {"role": "system", "content": system_prompt},
-            user_message,
+            {"role": "system", "content": SYSTEM_PROMPT},
+            # The request is fixed for the whole run, so it extends the cached prefix.
+            {
+                "role": "user",
+                "content": "User request (include follow-up clarifications if provided):\n" f"{instruction}\n",
+            },
+            {"role": "user", "content": user_segments},
         ]
 
-        try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                temperature=self.temperature,
-                messages=messages,
-                tools=[RUN_ACTIONS_TOOL],
-                tool_choice={"type": "function", "function": {"name": "run_desktop_actions"}},
-            )
-        except OpenAIError as exc:
-            raise GPTPlannerError(f"OpenAI call failed: {exc}") from exc
+        with tracing.span("planner.request", category="network", model=self.model, images=len(image_views)) as request:
+            try:
+                completion, call = self.client.chat_completion(
+                    timeout=timeout,
+                    cost=self._estimate_tokens(messages, len(image_views)),
+                    model=self.model,
+                    temperature=self.temperature,
+                    messages=messages,
+                    tools=[RUN_ACTIONS_TOOL],
+                    tool_choice={"type": "function", "function": {"name": "run_desktop_actions"}},
+                )
+            except (OpenAIError, ClientQueueTimeout) as exc:
+                raise GPTPlannerError(f"OpenAI call failed: {exc}") from exc
+            usage = {**self._record_usage(completion), **call}
+            request.set(**usage)
 
         choice = completion.choices[0].message
         tool_calls = choice.tool_calls or []
@@ -225,22 +292,61 @@ class GPTPlanner:
             should_continue=bool(function_args.get("should_continue")),
             needs_user_input=bool(function_args.get("needs_user_input")),
             user_question=function_args.get("user_question"),
+            usage=usage,
         )
 
-    def _encode_image(self, path: str | Path) -> str:
-        with open(path, "rb") as handle:
-            return base64.b64encode(handle.read()).decode("utf-8")
-
-    def _history_to_text(self, history: List[Dict[str, Any]]) -> str:
-        if not history:
-            return ""
-        lines = []
-        for item in history[-10:]:
-            action = item.get("action")
-            message = item.get("message")
-            success = item.get("success", True)
-            lines.append(f"- {action}: {message} ({'ok' if success else 'failed'})")
-        return "\n".join(lines)
+    def _encode_image(
+        self,
+        path: str | Path,
+        focus_regions: Optional[Sequence[Sequence[float]]] = None,
+    ) -> List[ImageView]:
+        return build_image_views(
+            path,
+            focus_regions,
+            overview_max_side=self.image_max_side,
+            overview_detail=self.image_detail,
+            crop_detail=self.crop_detail,
+            crop_padding=self.crop_padding,
+            max_crops=self.max_crops,
+        )
+
+    @staticmethod
+    def _estimate_tokens(messages: List[Dict[str, Any]], images: int) -> int:
+        """Rough prompt size for the token bucket: ~4 characters per token, ~765 tokens per image."""
+        chars = 0
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                chars += len(content)
+            else:
+                chars += sum(len(part.get("text", "")) for part in content)
+        return chars // 4 + 765 * images + len(json.dumps(RUN_ACTIONS_TOOL)) // 4
+
+    def _record_usage(self, completion: Any) -> Dict[str, Any]:
+        """Token usage for one call, including how much of the prompt was served from cache."""
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return {}
+        prompt_tokens = usage.prompt_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+        totals = self.usage_totals
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["cached_tokens"] += cached_tokens
+        totals["completion_tokens"] += usage.completion_tokens or 0
+        return {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": usage.completion_tokens or 0,
+            "cached_ratio": round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0,
+        }
+
+    def cache_summary(self) -> Dict[str, Any]:
+        totals = dict(self.usage_totals)
+        prompt_tokens = totals["prompt_tokens"]
+        totals["cached_ratio"] = round(totals["cached_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0
+        return totals
 
     @staticmethod
     def _chunk_text(text: str, chunk_size: int = 3500) -> List[str]:
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+"""Instruction-aware ranking of perceived elements so the planner only sees the relevant ones."""
+
+import math
+import re
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .elements import ElementTable, StringTable
+from .tracking import ElementDelta
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Interactive elements first; OmniParser itself only reports "text" and "icon".
+TYPE_PRIORS: Dict[str, float] = {"input": 1.0, "button": 1.0, "checkbox": 0.9, "link": 0.8, "icon": 0.4, "text": 0.2}
+CONTROL_WORDS = frozenset(
+    "ok cancel submit save send search next back continue login sign close open apply confirm done yes no "
+    "add new delete remove edit upload download menu settings".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+@dataclass
+class Ranking:
+    kept: ElementTable
+    omitted: ElementTable
+    scores: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32))
+
+    @property
+    def ranked(self) -> bool:
+        return len(self.omitted) > 0
+
+    def restrict(self, delta: Optional[ElementDelta]) -> Optional[ElementDelta]:
+        """The delta limited to kept elements; omitted ones are covered by :meth:`summary`."""
+        if delta is None or not self.ranked:
+            return delta
+        keep = self.kept.ids
+
+        def only(table: ElementTable) -> ElementTable:
+            return table[np.isin(table.ids, keep)] if len(table) else table
+
+        return ElementDelta(
+            added=only(delta.added),
+            changed=only(delta.changed),
+            removed=delta.removed,
+            unchanged=only(delta.unchanged),
+            initial=delta.initial,
+        )
+
+    def summary(self, max_labels: int = 30, max_text: int = 24) -> Optional[str]:
+        """Short stand-in for the omitted elements: their count and the first few labels."""
+        if not self.ranked:
+            return None
+        omitted = self.omitted
+        labelled = [
+            f"{element_id}:{text.strip()[:max_text]}"
+            for element_id, text in zip(omitted.ids.tolist(), omitted.texts())
+            if text.strip()
+        ]
+        lines = [f"{len(omitted)} lower-relevance elements are not listed above; they can still be referenced by element_id."]
+        if labelled:
+            more = f" (+{len(labelled) - max_labels} more)" if len(labelled) > max_labels else ""
+            lines.append("; ".join(labelled[:max_labels]) + more)
+        return "\n".join(lines)
+
+
+class RelevanceRanker:
+    """Scores elements by BM25 match with the instruction and recent history, type priors and
+    proximity to the last acted-on point, and keeps the ``top_k`` best.
+
+    Tokenization is cached per interned text code of each string table (dropped with the
+    table), so steady screens cost a few array operations per iteration.
+    """
+
+    def __init__(
+        self,
+        top_k: int = 80,
+        *,
+        k1: float = 1.2,
+        b: float = 0.75,
+        history_records: int = 5,
+        history_weight: float = 0.5,
+        lexical_weight: float = 3.0,
+        proximity_weight: float = 1.0,
+        proximity_radius: float = 300.0,
+    ) -> None:
+        self.top_k = top_k
+        self.k1 = k1
+        self.b = b
+        self.history_records = history_records
+        self.history_weight = history_weight
+        self.lexical_weight = lexical_weight
+        self.proximity_weight = proximity_weight
+        self.proximity_radius = proximity_radius
+        self._tokens: "weakref.WeakKeyDictionary[StringTable, Dict[int, Tuple[str, ...]]]" = weakref.WeakKeyDictionary()
+
+    def _element_tokens(self, elements: ElementTable) -> List[Tuple[str, ...]]:
+        strings = elements.strings
+        cache = self._tokens.get(strings)
+        if cache is None:
+            cache = self._tokens[strings] = {}
+        out: List[Tuple[str, ...]] = []
+        for code in elements.text_codes.tolist():
+            tokens = cache.get(code)
+            if tokens is None:
+                tokens = cache[code] = tuple(tokenize(strings[code]))
+            out.append(tokens)
+        return out
+
+    def _query(self, instruction: str, history: Sequence[Dict[str, Any]]) -> Dict[str, float]:
+        weights: Dict[str, float] = {}
+        for record in list(history)[-self.history_records :]:
+            metadata = record.get("metadata") or {}
+            text = f"{record.get('message') or ''} {metadata.get('text') or ''}"
+            for token in tokenize(text):
+                if len(token) > 2:
+                    weights[token] = max(weights.get(token, 0.0), self.history_weight)
+        for token in tokenize(instruction):
+            if len(token) > 2:
+                weights[token] = 1.0
+        return weights
+
+    def score(
+        self,
+        elements: ElementTable,
+        instruction: str,
+        history: Sequence[Dict[str, Any]] = (),
+        focus_point: Optional[Sequence[float]] = None,
+    ) -> np.ndarray:
+        count = len(elements)
+        if not count:
+            return np.zeros(0, dtype=np.float32)
+        docs = self._element_tokens(elements)
+        query = self._query(instruction, history)
+
+        lexical = np.zeros(count, dtype=np.float32)
+        if query:
+            lengths = np.fromiter((len(doc) for doc in docs), dtype=np.float32, count=count)
+            avg_length = float(lengths.mean()) or 1.0
+            doc_freq: Dict[str, int] = {}
+            for doc in docs:
+                for token in set(doc):
+                    if token in query:
+                        doc_freq[token] = doc_freq.get(token, 0) + 1
+            # Cheap fuzzy matching: a query term with no exact hit matches on its 4-char prefix.
+            prefixes = {term[:4]: term for term in query if term not in doc_freq and len(term) >= 5}
+            for index, doc in enumerate(docs):
+                if not doc:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * lengths[index] / avg_length)
+                total = 0.0
+                counts: Dict[str, int] = {}
+                for token in doc:
+                    if token in query:
+                        counts[token] = counts.get(token, 0) + 1
+                    elif prefixes and token[:4] in prefixes:
+                        term = prefixes[token[:4]]
+                        counts[term] = counts.get(term, 0) + 1
+                        doc_freq.setdefault(term, 1)
+                for term, tf in counts.items():
+                    idf = math.log(1 + (count - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                    total += query[term] * idf * tf * (self.k1 + 1) / (tf + norm)
+                lexical[index] = total
+            peak = float(lexical.max())
+            if peak > 0:
+                lexical /= peak
+
+        priors = np.fromiter(
+            (TYPE_PRIORS.get(kind, 0.2) for kind in elements.types()), dtype=np.float32, count=count
+        )
+        controls = np.fromiter((bool(CONTROL_WORDS.intersection(doc)) for doc in docs), dtype=bool, count=count)
+        priors = np.where(controls, np.maximum(priors, 0.8), priors)
+        unlabelled = np.fromiter((not doc for doc in docs), dtype=bool, count=count)
+        priors[unlabelled] *= 0.5
+
+        scores = self.lexical_weight * lexical + priors
+        if focus_point is not None:
+            distance = np.hypot(elements.centers[:, 0] - focus_point[0], elements.centers[:, 1] - focus_point[1])
+            scores += self.proximity_weight * np.exp(-distance / self.proximity_radius).astype(np.float32)
+        return scores
+
+    def rank(
+        self,
+        elements: ElementTable,
+        instruction: str,
+        history: Sequence[Dict[str, Any]] = (),
+        focus_point: Optional[Sequence[float]] = None,
+    ) -> Ranking:
+        """Top ``top_k`` elements (kept in id order) plus the rest; a no-op under the limit."""
+        if self.top_k <= 0 or len(elements) <= self.top_k:
+            return Ranking(kept=elements, omitted=elements[:0])
+        scores = self.score(elements, instruction, history, focus_point)
+        top = np.argpartition(-scores, self.top_k - 1)[: self.top_k]
+        mask = np.zeros(len(elements), dtype=bool)
+        mask[top] = True
+        return Ranking(kept=elements[mask], omitted=elements[~mask], scores=scores)
@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+"""Scriptable simulated desktop for deterministic engine runs without a real screen.
+
+A scenario is a small state machine of screens. Each screen lists elements (text, type,
+bbox) and what clicks and shortcuts do; input fields keep what is typed into them. The
+simulator renders each state to an image, so the toolbox, perception and planner all see
+consistent frames::
+
+    {
+      "name": "login",
+      "size": [960, 600],
+      "start": "login",
+      "goal": "dashboard",
+      "screens": {
+        "login": {
+          "elements": [
+            {"id": "user", "text": "Username", "type": "input", "bbox": [80, 100, 400, 130], "field": "username"},
+            {"id": "go", "text": "Sign in", "type": "button", "bbox": [80, 160, 200, 190],
+             "click": {"goto": "dashboard", "require": ["username"], "else": "login_error"}}
+          ],
+          "shortcuts": {"enter": {"click": "go"}}
+        },
+        "dashboard": {"elements": [{"id": "hello", "text": "Welcome", "type": "text", "bbox": [80, 80, 300, 110]}]}
+      },
+      "script": [{"type": "alice", "into": "Username"}, {"click": "Sign in"}]
+    }
+"""
+
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .elements import ElementTable, StringTable
+from .models import PlannedAction, PlannerResponse
+
+COLORS = {
+    "button": (52, 120, 246),
+    "input": (255, 255, 255),
+    "link": (240, 240, 240),
+    "icon": (200, 200, 200),
+    "text": (245, 245, 245),
+}
+
+
+class ScenarioError(RuntimeError):
+    pass
+
+
+@dataclass
+class SimElement:
+    id: str
+    text: str
+    type: str
+    bbox: List[int]
+    field: Optional[str] = None
+    click: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SimElement":
+        return cls(
+            id=str(data["id"]),
+            text=str(data.get("text", "")),
+            type=str(data.get("type", "text")),
+            bbox=[int(v) for v in data["bbox"]],
+            field=data.get("field"),
+            click=data.get("click"),
+        )
+
+
+@dataclass
+class SimScreen:
+    name: str
+    elements: List[SimElement] = field(default_factory=list)
+    shortcuts: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    scrollable: bool = False
+
+
+@dataclass
+class Scenario:
+    name: str
+    size: Tuple[int, int]
+    start: str
+    screens: Dict[str, SimScreen]
+    goal: Optional[str] = None
+    script: List[Dict[str, Any]] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Scenario":
+        screens = {
+            name: SimScreen(
+                name=name,
+                elements=[SimElement.from_dict(elem) for elem in spec.get("elements", [])],
+                shortcuts={_normalize_combo(combo): effect for combo, effect in (spec.get("shortcuts") or {}).items()},
+                scrollable=bool(spec.get("scrollable")),
+            )
+            for name, spec in (data.get("screens") or {}).items()
+        }
+        start = data.get("start") or next(iter(screens), None)
+        if start not in screens:
+            raise ScenarioError(f"Scenario start screen '{start}' is not defined")
+        width, height = data.get("size") or (960, 600)
+        return cls(
+            name=data.get("name", "scenario"),
+            size=(int(width), int(height)),
+            start=start,
+            screens=screens,
+            goal=data.get("goal"),
+            script=list(data.get("script") or []),
+        )
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Scenario":
+        with Path(path).open("r", encoding="utf-8") as handle:
+            return cls.from_dict(json.load(handle))
+
+
+def _normalize_combo(combo: Any) -> str:
+    parts = combo if isinstance(combo, (list, tuple)) else str(combo).split("+")
+    return "+".join(str(part).strip().lower() for part in parts if str(part).strip())
+
+
+class SimulatedDesktop:
+    """Runtime state of a scenario: current screen, field values, focus and scroll offset."""
+
+    def __init__(self, scenario: Scenario) -> None:
+        self.scenario = scenario
+        self.strings = StringTable()
+        self.reset()
+
+    def reset(self) -> None:
+        self.screen = self.scenario.start
+        self.values: Dict[str, str] = {}
+        self.focus: Optional[str] = None
+        self.scroll_offset = 0
+        self.events: List[Dict[str, Any]] = []
+        self._frames: Dict[str, ElementTable] = {}
+        self._latest: Optional[ElementTable] = None
+        self._latest_at = 0
+
+    @property
+    def goal_reached(self) -> bool:
+        return self.scenario.goal is not None and self.screen == self.scenario.goal
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+    def visible(self) -> List[Tuple[SimElement, List[int]]]:
+        width, height = self.scenario.size
+        shown = []
+        for element in self.scenario.screens[self.screen].elements:
+            x1, y1, x2, y2 = element.bbox
+            y1, y2 = y1 - self.scroll_offset, y2 - self.scroll_offset
+            if y2 <= 0 or y1 >= height or x2 <= 0 or x1 >= width:
+                continue
+            shown.append((element, [x1, y1, x2, y2]))
+        return shown
+
+    def label(self, element: SimElement) -> str:
+        if element.field and self.values.get(element.field):
+            return self.values[element.field]
+        return element.text
+
+    def elements(self) -> ElementTable:
+        shown = self.visible()
+        return ElementTable.from_columns(
+            np.asarray([bbox for _, bbox in shown], dtype=np.int32).reshape(-1, 4),
+            [self.label(element) for element, _ in shown],
+            [element.type for element, _ in shown],
+            np.ones(len(shown), dtype=np.float32),
+            strings=self.strings,
+        )
+
+    def render(self) -> Image.Image:
+        image = Image.new("RGB", self.scenario.size, (230, 233, 238))
+        draw = ImageDraw.Draw(image)
+        font = ImageFont.load_default()
+        draw.text((8, 4), f"{self.scenario.name} / {self.screen}", fill=(90, 90, 90), font=font)
+        for element, (x1, y1, x2, y2) in self.visible():
+            fill = COLORS.get(element.type, (235, 235, 235))
+            outline = (255, 140, 0) if element.field and element.field == self.focus else (120, 120, 120)
+            draw.rectangle((x1, y1, x2, y2), fill=fill, outline=outline, width=2)
+            ink = (255, 255, 255) if element.type == "button" else (20, 20, 20)
+            draw.text((x1 + 6, y1 + max(2, (y2 - y1 - 10) // 2)), self.label(element), fill=ink, font=font)
+        return image
+
+    def capture(self) -> Image.Image:
+        """Render the current state and remember its elements under the frame's pixel hash."""
+        image = self.render()
+        table = self.elements()
+        self._frames[hashlib.sha1(image.tobytes()).hexdigest()] = table
+        self._latest = table
+        self._latest_at = time.time_ns()
+        return image
+
+    def elements_for(self, image_path: str | Path) -> ElementTable:
+        """Elements of a previously captured frame; unknown frames fall back to the latest capture."""
+        table = None
+        if self._latest is not None and Path(image_path).stat().st_mtime_ns >= self._latest_at:
+            # Written after the latest capture, so it is that capture: skip decoding the PNG.
+            table = self._latest
+        if table is None:
+            with Image.open(image_path) as img:
+                key = hashlib.sha1(img.convert("RGB").tobytes()).hexdigest()
+            table = self._frames.get(key) or self._latest
+        if table is None:
+            self.capture()
+            table = self._latest
+        # Callers (the tracker) rewrite ids in place, so hand out a copy.
+        return table[np.arange(len(table))]
+
+    # ------------------------------------------------------------------
+    # Input
+    # ------------------------------------------------------------------
+    def _record(self, kind: str, **data: Any) -> None:
+        self.events.append({"event": kind, "screen": self.screen, **data})
+
+    def _goto(self, screen: str) -> None:
+        if screen not in self.scenario.screens:
+            raise ScenarioError(f"Scenario screen '{screen}' is not defined")
+        self.screen = screen
+        self.focus = None
+        self.scroll_offset = 0
+
+    def _apply(self, effect: Dict[str, Any]) -> None:
+        if "click" in effect:
+            target = next((e for e in self.scenario.screens[self.screen].elements if e.id == effect["click"]), None)
+            if target is not None:
+                self._activate(target)
+            return
+        for name in effect.get("clear") or []:
+            self.values.pop(name, None)
+        for name, value in (effect.get("set") or {}).items():
+            self.values[name] = str(value)
+        goto = effect.get("goto")
+        required = effect.get("require") or []
+        if goto and all(self.values.get(name) for name in required):
+            self._goto(goto)
+        elif effect.get("else"):
+            self._goto(effect["else"])
+
+    def _activate(self, element: SimElement) -> None:
+        if element.field:
+            self.focus = element.field
+        if element.click:
+            self._apply(element.click)
+
+    def click(self, x: int, y: int) -> None:
+        hit = None
+        for element, (x1, y1, x2, y2) in self.visible():
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                hit = element
+        self._record("click", x=x, y=y, element=hit.id if hit else None)
+        if hit is None:
+            self.focus = None
+            return
+        self._activate(hit)
+
+    def write(self, text: str) -> None:
+        self._record("type", text=text, field=self.focus)
+        if self.focus:
+            self.values[self.focus] = self.values.get(self.focus, "") + text
+
+    def hotkey(self, *keys: str) -> None:
+        combo = _normalize_combo(keys)
+        self._record("shortcut", keys=combo)
+        effect = self.scenario.screens[self.screen].shortcuts.get(combo)
+        if effect:
+            self._apply(effect)
+        elif combo in {"ctrl+a+backspace", "backspace", "delete"} and self.focus:
+            self.values[self.focus] = ""
+
+    def scroll(self, amount: int) -> None:
+        self._record("scroll", amount=amount)
+        if not self.scenario.screens[self.screen].scrollable:
+            return
+        bottom = max((element.bbox[3] for element in self.scenario.screens[self.screen].elements), default=0)
+        limit = max(0, bottom - self.scenario.size[1])
+        # Positive amounts scroll up, like pyautogui; one unit is one 40px wheel step.
+        self.scroll_offset = min(limit, max(0, self.scroll_offset - int(amount) * 40))
+
+
+class SimulatedInput:
+    """Toolbox input driver that acts on a :class:`SimulatedDesktop` instead of the real screen."""
+
+    click_settle = 0.0
+
+    def __init__(self, desktop: SimulatedDesktop) -> None:
+        self.desktop = desktop
+
+    def click(self, x: int, y: int) -> None:
+        self.desktop.click(x, y)
+
+    def write(self, text: str, interval: float = 0.0) -> None:
+        self.desktop.write(text)
+
+    def hotkey(self, *keys: str) -> None:
+        self.desktop.hotkey(*keys)
+
+    def scroll(self, amount: int) -> None:
+        self.desktop.scroll(amount)
+
+    def screenshot(self) -> Image.Image:
+        return self.desktop.capture()
+
+    def paste(self, text: str) -> bool:
+        self.desktop.write(text)
+        return True
+
+
+class SimulatedPerception:
+    """Stand-in for the OmniParser client that reports the simulator's exact elements."""
+
+    def __init__(self, desktop: SimulatedDesktop, latency: float = 0.0) -> None:
+        self.desktop = desktop
+        self.strings = desktop.strings
+        self.latency = latency
+        self.timeout = None
+
+    def analyze(self, image_path: str | Path, timeout: Optional[float] = None) -> Dict[str, Any]:
+        if self.latency:
+            time.sleep(self.latency)
+        table = self.desktop.elements_for(image_path)
+        return {"elements": table, "raw": {"source": "simulator", "screen": self.desktop.screen}, "image_size": self.desktop.scenario.size}
+
+
+class ScriptedPlanner:
+    """Planner stand-in that follows a scenario script by element text.
+
+    Steps are ``{"click": text}``, ``{"type": value, "into": text}``, ``{"shortcut": [keys]}``
+    or ``{"scroll": amount}``. A step whose target is not on screen yields a wait (and a
+    scroll on scrollable screens) so the run exercises the engine's retry path.
+    """
+
+    def __init__(self, script: List[Dict[str, Any]]) -> None:
+        self.script = list(script)
+        self.position = 0
+        self.calls = 0
+
+    def _find(self, elements: ElementTable, text: str) -> Optional[int]:
+        target = text.strip().lower()
+        for index, label in enumerate(elements.texts()):
+            if label.strip().lower() == target:
+                return int(elements.ids[index])
+        return None
+
+    def plan_actions(self, instruction: str, screenshot_path: Any, elements: ElementTable, action_history: List[Dict[str, Any]], **kwargs: Any) -> PlannerResponse:
+        self.calls += 1
+        if self.position >= len(self.script):
+            return PlannerResponse(thinking="Script complete", actions=[PlannedAction("wait", wait_seconds=0.0, explanation="done")])
+        step = self.script[self.position]
+        action: Optional[PlannedAction] = None
+        if "click" in step:
+            element_id = self._find(elements, str(step["click"]))
+            if element_id is not None:
+                action = PlannedAction("click", element_id=element_id, explanation=f"Click {step['click']}")
+        elif "type" in step:
+            element_id = self._find(elements, str(step.get("into", ""))) if step.get("into") else None
+            if element_id is not None or not step.get("into"):
+                action = PlannedAction("type", element_id=element_id, value=str(step["type"]), explanation=f"Type {step['type']}")
+        elif "shortcut" in step:
+            action = PlannedAction("shortcut", keys=list(step["shortcut"]), explanation="Shortcut")
+        elif "scroll" in step:
+            action = PlannedAction("scroll", amount=int(step["scroll"]), explanation="Scroll")
+        if action is None:
+            return PlannerResponse(
+                thinking=f"Waiting for step {self.position + 1}",
+                actions=[PlannedAction("scroll", amount=-3, explanation="Look further down"), PlannedAction("wait", wait_seconds=0.0, explanation="retry")],
+                should_continue=True,
+            )
+        self.position += 1
+        return PlannerResponse(thinking=f"Step {self.position}", actions=[action], should_continue=self.position < len(self.script))
+
+    def stats_summary(self) -> List[Dict[str, Any]]:
+        return [{"model": "scripted", "calls": self.calls}]
+
+    def cache_summary(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "cached_ratio": 0.0}
+
+
+if __name__ == "__main__":
+    import argparse
+    import shutil
+    import tempfile
+
+    from app.agent.engine import VisualAgentEngine
+
+    parser = argparse.ArgumentParser(description="Run the engine against a simulated desktop scenario")
+    parser.add_argument("scenario", help="Scenario JSON file")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--prompt", default="Complete the scenario")
+    parser.add_argument("--keep", help="Directory to keep run artifacts in (default: temporary)")
+    args = parser.parse_args()
+
+    scenario = Scenario.load(args.scenario)
+    root = Path(args.keep) if args.keep else Path(tempfile.mkdtemp(prefix="sim-runs-"))
+    outcomes: Dict[str, int] = {}
+    iterations = 0
+    started = time.perf_counter()
+    for index in range(args.runs):
+        desktop = SimulatedDesktop(scenario)
+        planner = ScriptedPlanner(scenario.script)
+        run_dir = root / f"run_{index}"
+        engine = VisualAgentEngine(
+            f"sim_{index}",
+            screenshot_dir=run_dir / "screenshots",
+            log_dir=run_dir / "logs",
+            max_iterations=len(scenario.script) * 2 + 2,
+            enable_overlay=False,
+            dry_run=False,
+            omniparser_url="",
+            omniparser_token="",
+            openai_api_key="",
+            openai_api_base="",
+            openai_model="",
+            openai_temperature=0.0,
+            action_pause=0.0,
+            macro_pause=0.0,
+            hedge_after=0.0,
+            simulator=desktop,
+            planner=planner,
+        )
+        result = engine.run(args.prompt)
+        outcome = "goal" if desktop.goal_reached else result.status
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        iterations += planner.calls
+    elapsed = time.perf_counter() - started
+    if not args.keep:
+        shutil.rmtree(root, ignore_errors=True)
+    print(
+        json.dumps(
+            {
+                "scenario": scenario.name,
+                "runs": args.runs,
+                "outcomes": outcomes,
+                "iterations": iterations,
+                "seconds": round(elapsed, 3),
+                "iterations_per_second": round(iterations / elapsed, 1) if elapsed else None,
+            },
+            indent=2,
+        )
+    )
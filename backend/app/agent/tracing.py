@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+"""Per-run span recording, exported in the Chrome trace event format.
+
+The active tracer lives in a context variable, so instrumented code anywhere in a run
+just calls ``span(...)``; outside a traced run it is a no-op. Open the written
+``trace.json`` in ``chrome://tracing`` or https://ui.perfetto.dev.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+_current: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar("agent_tracer", default=None)
+
+
+class Span:
+    __slots__ = ("name", "args")
+
+    def __init__(self, name: str, args: Dict[str, Any]) -> None:
+        self.name = name
+        self.args = args
+
+    def set(self, **args: Any) -> None:
+        """Attach values known only once the work is done (payload sizes, cache hits)."""
+        self.args.update(args)
+
+
+class _NullSpan(Span):
+    def set(self, **args: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan("", {})
+
+
+class Tracer:
+    """Collects complete ("X") events with microsecond timestamps relative to the run start."""
+
+    def __init__(self, name: str = "run") -> None:
+        self.name = name
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def _tid(self) -> int:
+        thread = threading.current_thread()
+        tid = thread.ident or 0
+        if tid not in self._threads:
+            self._threads[tid] = thread.name
+        return tid
+
+    @contextmanager
+    def span(self, name: str, category: str = "agent", **args: Any) -> Iterator[Span]:
+        record = Span(name, dict(args))
+        start = self._now()
+        try:
+            yield record
+        except BaseException as exc:
+            record.args["error"] = type(exc).__name__
+            raise
+        finally:
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round(start, 1),
+                "dur": round(self._now() - start, 1),
+                "pid": self.pid,
+                "tid": self._tid(),
+                "args": record.args,
+            }
+            with self._lock:
+                self._events.append(event)
+
+    def instant(self, name: str, category: str = "agent", **args: Any) -> None:
+        event = {"name": name, "cat": category, "ph": "i", "s": "t", "ts": round(self._now(), 1), "pid": self.pid, "tid": self._tid(), "args": args}
+        with self._lock:
+            self._events.append(event)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        meta = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": self.name}}]
+        meta.extend({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}} for tid, name in threads.items())
+        return {"traceEvents": meta + sorted(events, key=lambda event: event["ts"]), "displayTimeUnit": "ms"}
+
+    def save(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as handle:
+            json.dump(self.to_dict(), handle, default=str)
+        return path
+
+
+def current() -> Optional[Tracer]:
+    return _current.get()
+
+
+@contextmanager
+def activate(tracer: Optional[Tracer]) -> Iterator[Optional[Tracer]]:
+    token = _current.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, category: str = "agent", **args: Any) -> Iterator[Span]:
+    tracer = _current.get()
+    if tracer is None:
+        yield _NULL_SPAN
+        return
+    with tracer.span(name, category, **args) as record:
+        yield record
+
+
+def instant(name: str, category: str = "agent", **args: Any) -> None:
+    tracer = _current.get()
+    if tracer is not None:
+        tracer.instant(name, category, **args)
+
+
+def bind(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Carry the active tracer into work submitted to another thread."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+"""Cross-frame element tracking so element ids stay stable between perceptions."""
+
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .elements import ElementTable
+
+
+@dataclass
+class ElementDelta:
+    """What changed between two consecutive frames, keyed by persistent element ids."""
+
+    added: ElementTable = field(default_factory=ElementTable.empty)
+    changed: ElementTable = field(default_factory=ElementTable.empty)
+    removed: List[int] = field(default_factory=list)
+    unchanged: ElementTable = field(default_factory=ElementTable.empty)
+    initial: bool = False
+
+    @property
+    def is_empty(self) -> bool:
+        return not (len(self.added) or len(self.changed) or self.removed)
+
+
+def pairwise_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU matrix between two (N, 4) and (M, 4) arrays of x1, y1, x2, y2 boxes."""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    a = a.astype(np.float32)
+    b = b.astype(np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]).clip(0) * (a[:, 3] - a[:, 1]).clip(0)
+    area_b = (b[:, 2] - b[:, 0]).clip(0) * (b[:, 3] - b[:, 1]).clip(0)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class ElementTracker:
+    """Match elements across frames by IoU + text similarity and keep their ids.
+
+    ``update`` rewrites ``ids`` on the incoming table in place and returns the delta
+    against the previous frame.
+    """
+
+    def __init__(
+        self,
+        iou_weight: float = 0.6,
+        text_weight: float = 0.4,
+        match_threshold: float = 0.5,
+        move_tolerance: int = 4,
+    ) -> None:
+        self.iou_weight = iou_weight
+        self.text_weight = text_weight
+        self.match_threshold = match_threshold
+        self.move_tolerance = move_tolerance
+        self._previous: Optional[ElementTable] = None
+        self._next_id = 1
+
+    def reset(self) -> None:
+        self._previous = None
+        self._next_id = 1
+
+    def update(self, elements: ElementTable) -> ElementDelta:
+        count = len(elements)
+        if self._previous is None:
+            elements.ids[:] = np.arange(self._next_id, self._next_id + count, dtype=np.int32)
+            self._next_id += count
+            self._previous = elements
+            return ElementDelta(added=elements, initial=True)
+
+        previous = self._previous
+        scores = self._score(previous, elements)
+        prev_idx, cur_idx = np.nonzero(scores >= self.match_threshold)
+        order = np.argsort(-scores[prev_idx, cur_idx], kind="stable")
+
+        match_for_cur = np.full(count, -1, dtype=np.int64)
+        prev_taken = np.zeros(len(previous), dtype=bool)
+        for k in order:
+            p, c = prev_idx[k], cur_idx[k]
+            if prev_taken[p] or match_for_cur[c] >= 0:
+                continue
+            prev_taken[p] = True
+            match_for_cur[c] = p
+
+        matched = match_for_cur >= 0
+        new_ids = np.empty(count, dtype=np.int32)
+        new_ids[matched] = previous.ids[match_for_cur[matched]]
+        fresh = int((~matched).sum())
+        new_ids[~matched] = np.arange(self._next_id, self._next_id + fresh, dtype=np.int32)
+        self._next_id += fresh
+        elements.ids[:] = new_ids
+
+        differs = np.zeros(count, dtype=bool)
+        if matched.any():
+            src = match_for_cur[matched]
+            moved = np.abs(previous.boxes[src] - elements.boxes[matched]).max(axis=1) > self.move_tolerance
+            dst = np.flatnonzero(matched)
+            retexted = self._column_differs(previous, src, elements, dst, "text")
+            retyped = self._column_differs(previous, src, elements, dst, "type")
+            differs[matched] = moved | retexted | retyped
+
+        delta = ElementDelta(
+            added=elements[np.flatnonzero(~matched)],
+            changed=elements[np.flatnonzero(matched & differs)],
+            removed=previous.ids[~prev_taken].tolist(),
+            unchanged=elements[np.flatnonzero(matched & ~differs)],
+        )
+        self._previous = elements
+        return delta
+
+    @staticmethod
+    def _column_differs(previous: ElementTable, src: np.ndarray, current: ElementTable, dst: np.ndarray, column: str) -> np.ndarray:
+        if previous.strings is current.strings:
+            return getattr(previous, f"{column}_codes")[src] != getattr(current, f"{column}_codes")[dst]
+        prev_values = np.asarray(previous.texts() if column == "text" else previous.types(), dtype=object)
+        cur_values = np.asarray(current.texts() if column == "text" else current.types(), dtype=object)
+        return prev_values[src] != cur_values[dst]
+
+    def _score(self, previous: ElementTable, current: ElementTable) -> np.ndarray:
+        iou = pairwise_iou(previous.boxes, current.boxes)
+        if not iou.size:
+            return iou
+        if previous.strings is current.strings:
+            # Codes come from one interned table, so equality checks stay in NumPy.
+            same_text = previous.text_codes[:, None] == current.text_codes[None, :]
+            same_type = previous.type_codes[:, None] == current.type_codes[None, :]
+        else:
+            same_text = np.asarray(previous.texts(), dtype=object)[:, None] == np.asarray(current.texts(), dtype=object)[None, :]
+            same_type = np.asarray(previous.types(), dtype=object)[:, None] == np.asarray(current.types(), dtype=object)[None, :]
+
+        text_sim = same_text.astype(np.float32)
+        # Fuzzy text similarity is only worth computing where the boxes overlap.
+        fuzzy = np.nonzero((iou > 0) & ~same_text)
+        if fuzzy[0].size:
+            strings_prev, strings_cur = previous.strings, current.strings
+            for p, c in zip(*fuzzy):
+                text_sim[p, c] = SequenceMatcher(
+                    None,
+                    strings_prev[int(previous.text_codes[p])],
+                    strings_cur[int(current.text_codes[c])],
+                ).ratio()
+
+        scores = self.iou_weight * iou + self.text_weight * text_sim
+        return np.where(same_type, scores, scores * 0.5)
+
+
+def compact_ids(ids: Sequence[int]) -> str:
+    """Render ids as ranges, e.g. ``1-4, 7, 9-12``."""
+    values = sorted(set(int(i) for i in ids))
+    if not values:
+        return ""
+    parts: List[str] = []
+    start = prev = values[0]
+    for value in values[1:]:
+        if value == prev + 1:
+            prev = value
+            continue
+        parts.append(f"{start}-{prev}" if prev != start else str(start))
+        start = prev = value
+    parts.append(f"{start}-{prev}" if prev != start else str(start))
+    return ", ".join(parts)
+
+
+def summarize_unchanged(elements: ElementTable, max_text: int = 40) -> Optional[str]:
+    """One ``id:text`` token per labelled element; unlabelled ones collapse into id ranges."""
+    if not len(elements):
+        return None
+    labelled = []
+    bare = []
+    for element_id, text in zip(elements.ids.tolist(), elements.texts()):
+        text = text.strip().replace("\n", " ")
+        if text:
+            labelled.append(f"{element_id}:{text[:max_text]}")
+        else:
+            bare.append(element_id)
+    lines = []
+    if labelled:
+        lines.append("; ".join(labelled))
+    if bare:
+        lines.append(f"unlabelled ids: {compact_ids(bare)}")
+    return "\n".join(lines)
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+"""Static checks and local repairs on planner output before any action touches the desktop."""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .elements import ElementTable
+from .models import PlannedAction, PlannerResponse
+
+KNOWN_TOOLS = {"click", "type", "scroll", "wait", "annotate", "screenshot", "shortcut", "hotkey"}
+
+
+@dataclass
+class PlanIssue:
+    index: int
+    code: str
+    message: str
+
+    def describe(self) -> str:
+        where = f"action {self.index + 1}" if self.index >= 0 else "plan"
+        return f"{where}: {self.message}"
+
+
+def _point(coordinates: Optional[Sequence[float]]) -> Optional[Tuple[float, float]]:
+    if not isinstance(coordinates, (list, tuple)) or len(coordinates) < 2:
+        return None
+    try:
+        return float(coordinates[0]), float(coordinates[1])
+    except (TypeError, ValueError):
+        return None
+
+
+def _on_screen(point: Tuple[float, float], screen_size: Optional[Tuple[int, int]]) -> bool:
+    if not screen_size:
+        return True
+    width, height = screen_size
+    return 0 <= point[0] < width and 0 <= point[1] < height
+
+
+def validate_action(
+    index: int,
+    action: PlannedAction,
+    elements: ElementTable,
+    screen_size: Optional[Tuple[int, int]] = None,
+) -> List[PlanIssue]:
+    issues: List[PlanIssue] = []
+    tool = action.tool
+    if tool not in KNOWN_TOOLS:
+        return [PlanIssue(index, "unknown_tool", f"unknown tool '{tool}'")]
+
+    point = None
+    if action.coordinates is not None:
+        point = _point(action.coordinates)
+        if point is None:
+            issues.append(PlanIssue(index, "bad_coordinates", f"coordinates {action.coordinates!r} are not [x, y]"))
+        elif not _on_screen(point, screen_size):
+            issues.append(PlanIssue(index, "off_screen", f"coordinates {action.coordinates!r} are outside the {screen_size} screen"))
+    resolvable = action.element_id is not None and elements.index_of(action.element_id) is not None
+    if action.element_id is not None and not resolvable:
+        issues.append(PlanIssue(index, "unknown_element", f"element_id {action.element_id} is not on screen"))
+
+    if tool == "click" and point is None and not resolvable and not issues:
+        issues.append(PlanIssue(index, "missing_target", "click has neither coordinates nor an element_id"))
+    elif tool == "type" and action.value is None:
+        issues.append(PlanIssue(index, "missing_value", "type action has no value"))
+    elif tool in {"shortcut", "hotkey"} and not action.keys and not action.value:
+        issues.append(PlanIssue(index, "missing_keys", "shortcut action has no keys"))
+    elif tool == "scroll" and not isinstance(action.amount, int):
+        issues.append(PlanIssue(index, "missing_amount", "scroll action needs an integer amount"))
+    elif tool == "wait" and not isinstance(action.wait_seconds, (int, float)):
+        issues.append(PlanIssue(index, "missing_duration", "wait action needs wait_seconds"))
+    elif tool == "annotate":
+        bbox = action.bbox
+        if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+            issues.append(PlanIssue(index, "bad_bbox", "annotate action needs a [x1, y1, x2, y2] bbox"))
+        elif bbox[2] <= bbox[0] or bbox[3] <= bbox[1]:
+            issues.append(PlanIssue(index, "inverted_bbox", f"bbox {list(bbox)} has inverted corners"))
+    return issues
+
+
+def validate_plan(
+    response: PlannerResponse,
+    elements: ElementTable,
+    screen_size: Optional[Tuple[int, int]] = None,
+) -> List[PlanIssue]:
+    """Every problem that would make an action fail or silently do nothing at execution time."""
+    if response.needs_user_input:
+        return []
+    if not response.actions:
+        return [PlanIssue(-1, "empty", "plan has no actions")]
+    issues: List[PlanIssue] = []
+    for index, action in enumerate(response.actions):
+        issues.extend(validate_action(index, action, elements, screen_size))
+    return issues
+
+
+@dataclass
+class ValidationReport:
+    repairs: List[str] = field(default_factory=list)
+    issues: List[PlanIssue] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"repairs": list(self.repairs), "issues": [issue.describe() for issue in self.issues]}
+
+
+def _nearest_element(elements: ElementTable, x: float, y: float, radius: float) -> Optional[int]:
+    """Index of the element whose bbox is closest to the point, if within ``radius`` pixels."""
+    if not len(elements):
+        return None
+    boxes = elements.boxes
+    dx = np.maximum(np.maximum(boxes[:, 0] - x, 0), x - boxes[:, 2])
+    dy = np.maximum(np.maximum(boxes[:, 1] - y, 0), y - boxes[:, 3])
+    distance = np.hypot(dx, dy)
+    index = int(np.argmin(distance))
+    return index if distance[index] <= radius else None
+
+
+def _repair_action(
+    index: int,
+    action: PlannedAction,
+    issue: PlanIssue,
+    elements: ElementTable,
+    screen_size: Optional[Tuple[int, int]],
+    snap_radius: float,
+) -> Optional[str]:
+    """Fix one issue in place; returns a note describing the repair, or None if it needs the planner."""
+    code = issue.code
+    if code == "off_screen" and screen_size:
+        x, y = _point(action.coordinates)
+        x = min(max(x, 0), screen_size[0] - 1)
+        y = min(max(y, 0), screen_size[1] - 1)
+        nearest = _nearest_element(elements, x, y, snap_radius)
+        if nearest is not None:
+            x, y = elements.centers[nearest].tolist()
+        action.coordinates = [int(x), int(y)]
+        return f"action {index + 1}: moved off-screen point to {action.coordinates}"
+    if code == "bad_coordinates" and action.element_id is not None and elements.index_of(action.element_id) is not None:
+        action.coordinates = None
+        return f"action {index + 1}: dropped malformed coordinates in favour of element {action.element_id}"
+    if code == "unknown_element" and _point(action.coordinates) is not None:
+        action.element_id = None
+        return f"action {index + 1}: dropped stale element_id, kept coordinates"
+    if code == "inverted_bbox":
+        x1, y1, x2, y2 = action.bbox
+        action.bbox = [min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)]
+        if action.bbox[2] > action.bbox[0] and action.bbox[3] > action.bbox[1]:
+            return f"action {index + 1}: normalized bbox corners"
+        return None
+    if code == "missing_duration":
+        action.wait_seconds = 1.0
+        return f"action {index + 1}: wait defaulted to 1s"
+    if code == "missing_amount" and action.value is not None:
+        try:
+            action.amount = int(float(action.value))
+        except (TypeError, ValueError):
+            return None
+        return f"action {index + 1}: scroll amount taken from value"
+    if code == "missing_keys" and action.value:
+        action.keys = [part.strip() for part in str(action.value).split("+") if part.strip()]
+        return f"action {index + 1}: shortcut keys taken from value" if action.keys else None
+    return None
+
+
+def repair_plan(
+    response: PlannerResponse,
+    elements: ElementTable,
+    screen_size: Optional[Tuple[int, int]] = None,
+    snap_radius: float = 32.0,
+) -> ValidationReport:
+    """Validate the plan and fix what can be fixed locally, mutating its actions in place.
+
+    Besides clearing issues, a ``type`` that names an element but no point gets the
+    element's center so the text lands in that field rather than wherever focus is.
+    Whatever cannot be fixed is returned in ``issues`` for a corrective re-prompt.
+    """
+    report = ValidationReport()
+    for issue in validate_plan(response, elements, screen_size):
+        action = response.actions[issue.index] if issue.index >= 0 else None
+        note = _repair_action(issue.index, action, issue, elements, screen_size, snap_radius) if action else None
+        if note is None:
+            report.issues.append(issue)
+        else:
+            report.repairs.append(note)
+
+    for index, action in enumerate(response.actions):
+        if action.tool == "type" and action.coordinates is None and action.element_id is not None:
+            row = elements.index_of(action.element_id)
+            if row is not None:
+                action.coordinates = elements.centers[row].tolist()
+                report.repairs.append(f"action {index + 1}: typing into element {action.element_id} at {action.coordinates}")
+
+    # A repair can introduce a new problem (e.g. clearing a bad point leaves no target); re-check.
+    if report.repairs:
+        already_reported = {(issue.index, issue.code) for issue in report.issues}
+        for issue in validate_plan(response, elements, screen_size):
+            if (issue.index, issue.code) not in already_reported:
+                report.issues.append(issue)
+    return report
+
+
+def retarget_labels(
+    response: PlannerResponse,
+    elements: ElementTable,
+    label_targets: Dict[int, int],
+) -> List[str]:
+    """Point click/type actions aimed at a form label at the input field that label names.
+
+    Only actions whose point is unset or inside the label itself are moved, so a deliberate
+    coordinate elsewhere is left alone. Returns a note per retargeted action.
+    """
+    notes: List[str] = []
+    if not label_targets:
+        return notes
+    for index, action in enumerate(response.actions):
+        if action.tool not in {"click", "type"} or action.element_id not in label_targets:
+            continue
+        label_row = elements.index_of(action.element_id)
+        field_id = label_targets[action.element_id]
+        field_row = elements.index_of(field_id)
+        if label_row is None or field_row is None:
+            continue
+        point = _point(action.coordinates)
+        if point is not None:
+            x1, y1, x2, y2 = elements.boxes[label_row].tolist()
+            if not (x1 <= point[0] <= x2 and y1 <= point[1] <= y2):
+                continue
+        notes.append(f"action {index + 1}: moved from label {action.element_id} to its field {field_id}")
+        action.element_id = field_id
+        action.coordinates = [int(value) for value in elements.centers[field_row].tolist()]
+    return notes
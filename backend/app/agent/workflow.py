@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+"""Compile finished runs into parameterized workflows that replay without the planner."""
+
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .elements import ElementRow, ElementTable
+
+REPLAYABLE_ACTIONS = {"click", "type", "shortcut", "scroll", "wait"}
+
+
+class WorkflowError(RuntimeError):
+    pass
+
+
+@dataclass
+class WorkflowStep:
+    tool: str
+    explanation: Optional[str] = None
+    anchor: Optional[Dict[str, Any]] = None
+    coordinates: Optional[List[int]] = None
+    variable: Optional[str] = None
+    value: Optional[str] = None
+    keys: Optional[List[str]] = None
+    amount: Optional[int] = None
+    wait_seconds: Optional[float] = None
+
+
+@dataclass
+class Workflow:
+    name: str
+    prompt: str
+    source_run: Optional[str] = None
+    clarifications: List[str] = field(default_factory=list)
+    variables: Dict[str, str] = field(default_factory=dict)
+    steps: List[WorkflowStep] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Workflow":
+        steps = [WorkflowStep(**step) for step in data.get("steps", [])]
+        return cls(
+            name=data.get("name", "workflow"),
+            prompt=data.get("prompt", ""),
+            source_run=data.get("source_run"),
+            clarifications=list(data.get("clarifications") or []),
+            variables=dict(data.get("variables") or {}),
+            steps=steps,
+        )
+
+    def save(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as handle:
+            json.dump(self.to_dict(), handle, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Workflow":
+        with Path(path).open("r", encoding="utf-8") as handle:
+            return cls.from_dict(json.load(handle))
+
+    def render_value(self, step: WorkflowStep, overrides: Optional[Dict[str, str]] = None) -> Optional[str]:
+        if step.variable is None:
+            return step.value
+        values = {**self.variables, **(overrides or {})}
+        if step.variable not in values:
+            raise WorkflowError(f"Missing value for workflow variable '{step.variable}'")
+        return values[step.variable]
+
+
+def _variable_name(anchor: Optional[Dict[str, Any]], taken: Dict[str, str]) -> str:
+    base = re.sub(r"[^a-z0-9]+", "_", str((anchor or {}).get("text") or "").lower()).strip("_")[:32] or "text"
+    name = base
+    counter = 2
+    while name in taken:
+        name = f"{base}_{counter}"
+        counter += 1
+    return name
+
+
+def compile_actions(actions: List[Dict[str, Any]], *, name: str, prompt: str, source_run: Optional[str] = None) -> Workflow:
+    """Turn executed ``ActionRecord`` dicts into workflow steps.
+
+    Typed text becomes a variable (defaulting to the recorded value) and clicks keep the
+    element anchor captured at execution time so replay does not depend on raw pixels.
+    Typing without coordinates goes to the focused field, so its variable is named after
+    the element the preceding click focused.
+    """
+    workflow = Workflow(name=name, prompt=prompt, source_run=source_run)
+    focus_anchor: Optional[Dict[str, Any]] = None
+    for record in actions:
+        action = record.get("action")
+        if action not in REPLAYABLE_ACTIONS or not record.get("success", True):
+            continue
+        metadata = record.get("metadata") or {}
+        coords = record.get("coords")
+        step = WorkflowStep(
+            tool=action,
+            explanation=record.get("message"),
+            anchor=metadata.get("anchor"),
+            coordinates=list(coords) if coords else None,
+        )
+        if action == "click":
+            focus_anchor = step.anchor
+        elif action == "type":
+            variable = _variable_name(step.anchor or focus_anchor, workflow.variables)
+            workflow.variables[variable] = str(metadata.get("text", ""))
+            step.variable = variable
+        elif action == "shortcut":
+            step.keys = list(metadata.get("keys") or [])
+        elif action == "scroll":
+            step.amount = metadata.get("amount")
+        elif action == "wait":
+            step.wait_seconds = metadata.get("duration")
+        workflow.steps.append(step)
+    return workflow
+
+
+def compile_run(run_dir: str | Path) -> Workflow:
+    """Compile a finished run directory (``run.json`` + ``logs/actions.json``) into a workflow."""
+    run_dir = Path(run_dir)
+    summary_path = run_dir / "run.json"
+    actions_path = run_dir / "logs" / "actions.json"
+    if not summary_path.exists() or not actions_path.exists():
+        raise WorkflowError(f"{run_dir} does not contain a finished run")
+    summary = json.loads(summary_path.read_text(encoding="utf-8"))
+    if summary.get("status") != "success":
+        raise WorkflowError(f"Only successful runs can be exported (status: {summary.get('status')})")
+    actions = json.loads(actions_path.read_text(encoding="utf-8"))
+    workflow = compile_actions(
+        actions,
+        name=run_dir.name,
+        prompt=summary.get("prompt", ""),
+        source_run=summary.get("run_id"),
+    )
+    workflow.clarifications = list(summary.get("clarifications") or [])
+    if not workflow.steps:
+        raise WorkflowError("Run has no replayable actions")
+    return workflow
+
+
+def anchor_for_point(elements: ElementTable, x: float, y: float) -> Optional[Dict[str, Any]]:
+    """Smallest element whose bbox contains the point."""
+    boxes = elements.boxes
+    inside = (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+    candidates = np.flatnonzero(inside)
+    if not candidates.size:
+        return None
+    areas = (boxes[candidates, 2] - boxes[candidates, 0]) * (boxes[candidates, 3] - boxes[candidates, 1])
+    row = elements[int(candidates[int(np.argmin(areas))])]
+    return {"text": row.text, "type": row.type, "bbox": row.bbox}
+
+
+def find_anchor(anchor: Dict[str, Any], elements: ElementTable, min_similarity: float = 0.8) -> Optional[ElementRow]:
+    """Locate the element matching a recorded anchor by type and text, nearest to the recorded position."""
+    target_text = str(anchor.get("text") or "").strip().lower()
+    target_type = anchor.get("type")
+    ref = anchor.get("bbox") or []
+    candidates = np.arange(len(elements))
+    if target_type:
+        types = elements.types()
+        candidates = np.asarray([i for i in candidates if types[i] == target_type], dtype=np.int64)
+    if not candidates.size:
+        return None
+
+    texts = elements.texts()
+    similarity = np.empty(len(candidates), dtype=np.float32)
+    for k, index in enumerate(candidates):
+        text = texts[index].strip().lower()
+        similarity[k] = SequenceMatcher(None, target_text, text).ratio() if (target_text or text) else 1.0
+    keep = similarity >= min_similarity
+    candidates, similarity = candidates[keep], similarity[keep]
+    if not candidates.size:
+        return None
+
+    distance = np.zeros(len(candidates), dtype=np.float32)
+    if len(ref) == 4:
+        centers = (elements.boxes[candidates, :2] + elements.boxes[candidates, 2:]) / 2
+        distance = np.abs(centers - [(ref[0] + ref[2]) / 2, (ref[1] + ref[3]) / 2]).sum(axis=1)
+    best = np.lexsort((distance, -similarity))[0]
+    return elements[int(candidates[best])]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile a finished run into a replayable workflow")
+    parser.add_argument("run_dir", help="Run directory under AGENT_RUNS_DIR")
+    parser.add_argument("-o", "--output", help="Where to write the workflow JSON (default: <run_dir>/workflow.json)")
+    args = parser.parse_args()
+
+    compiled = compile_run(args.run_dir)
+    out = compiled.save(args.output or Path(args.run_dir) / "workflow.json")
+    print(json.dumps({"workflow": str(out), "steps": len(compiled.steps), "variables": compiled.variables}, indent=2))
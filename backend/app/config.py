@@ -14,22 +14,69 @@ RUNTIME_DIR = BASE_DIR / "runtime"
 
 class Settings(BaseModel):
     APP_NAME: str = os.getenv("APP_NAME", "visual-agent-backend")
+    API_GZIP_MIN_SIZE: int = int(os.getenv("API_GZIP_MIN_SIZE", "1024"))
     ENV: str = os.getenv("ENV", "dev")
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS", "*")
 
     HF_OMNIPARSER_URL: str = os.getenv("HF_OMNIPARSER_URL", "")
     HF_API_TOKEN: str = os.getenv("HF_API_TOKEN", "")
+    OMNIPARSER_BBOX_THRESHOLD: float = float(os.getenv("OMNIPARSER_BBOX_THRESHOLD", "0.001"))
+    OMNIPARSER_IOU_THRESHOLD: float = float(os.getenv("OMNIPARSER_IOU_THRESHOLD", "0.4"))
+    OMNIPARSER_DEDUP: bool = os.getenv("OMNIPARSER_DEDUP", "true").lower() == "true"
+    OMNIPARSER_MIN_CONFIDENCE: float = float(os.getenv("OMNIPARSER_MIN_CONFIDENCE", "0"))
+    PERCEPTION_HEDGE_AFTER: float = float(os.getenv("PERCEPTION_HEDGE_AFTER", "8.0"))
+    PERCEPTION_LOCAL_OCR: bool = os.getenv("PERCEPTION_LOCAL_OCR", "true").lower() == "true"
+    PERCEPTION_CACHE_SIZE: int = int(os.getenv("PERCEPTION_CACHE_SIZE", "8"))
 
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", os.getenv("QWEN_API_KEY", ""))
     OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", os.getenv("QWEN_API_BASE", "https://api.openai.com/v1"))
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", os.getenv("QWEN_MODEL", "gpt-4o-mini"))
     OPENAI_TEMPERATURE: float = float(os.getenv("OPENAI_TEMPERATURE", os.getenv("QWEN_TEMPERATURE", "0.0")))
+    PLANNER_IMAGE_MAX_SIDE: int = int(os.getenv("PLANNER_IMAGE_MAX_SIDE", "1280"))
+    PLANNER_IMAGE_DETAIL: str = os.getenv("PLANNER_IMAGE_DETAIL", "auto")
+    PLANNER_MAX_CROPS: int = int(os.getenv("PLANNER_MAX_CROPS", "2"))
+    PLANNER_ELEMENT_DELTAS: bool = os.getenv("PLANNER_ELEMENT_DELTAS", "true").lower() == "true"
+    PLANNER_ELEMENT_TOP_K: int = int(os.getenv("PLANNER_ELEMENT_TOP_K", "80"))
+    PLANNER_FORM_STRUCTURE: bool = os.getenv("PLANNER_FORM_STRUCTURE", "true").lower() == "true"
+    PLANNER_HISTORY_WINDOW: int = int(os.getenv("PLANNER_HISTORY_WINDOW", "10"))
+    PLANNER_CASCADE: str = os.getenv("PLANNER_CASCADE", "")
 
     AGENT_MAX_ITERATIONS: int = int(os.getenv("AGENT_MAX_ITERATIONS", "3"))
     AGENT_RUNS_DIR: Path = Path(os.getenv("AGENT_RUNS_DIR", str((RUNTIME_DIR / "runs").resolve())))
+    AGENT_RUNS_INDEX: Path = Path(os.getenv("AGENT_RUNS_INDEX", str((RUNTIME_DIR / "runs_index.sqlite3").resolve())))
+    AGENT_RETENTION_MAX_AGE_DAYS: float = float(os.getenv("AGENT_RETENTION_MAX_AGE_DAYS", "0"))
+    AGENT_RETENTION_MAX_BYTES: int = int(os.getenv("AGENT_RETENTION_MAX_BYTES", "0"))
+    AGENT_RETENTION_INTERVAL: float = float(os.getenv("AGENT_RETENTION_INTERVAL", "600"))
+    AGENT_RECOMPRESS_FORMAT: str = os.getenv("AGENT_RECOMPRESS_FORMAT", "webp")
+    AGENT_RECOMPRESS_QUALITY: int = int(os.getenv("AGENT_RECOMPRESS_QUALITY", "80"))
+    AGENT_BLOB_STORE: bool = os.getenv("AGENT_BLOB_STORE", "true").lower() == "true"
+    AGENT_BLOB_DIR: Path = Path(os.getenv("AGENT_BLOB_DIR", str((RUNTIME_DIR / "blobs").resolve())))
+    AGENT_EAGER_DEBUG_OVERLAYS: bool = os.getenv("AGENT_EAGER_DEBUG_OVERLAYS", "false").lower() == "true"
+    AGENT_OVERLAY_CACHE_SIZE: int = int(os.getenv("AGENT_OVERLAY_CACHE_SIZE", "64"))
     AGENT_ENABLE_OVERLAY: bool = os.getenv("AGENT_ENABLE_OVERLAY", "true").lower() == "true"
     AGENT_DRY_RUN: bool = os.getenv("AGENT_DRY_RUN", "false").lower() == "true"
+    AGENT_TOOLBOX_BACKEND: str = os.getenv("AGENT_TOOLBOX_BACKEND", "")
+    AGENT_REMOTE_INPUT_URL: str = os.getenv("AGENT_REMOTE_INPUT_URL", "")
+    AGENT_REMOTE_INPUT_TOKEN: str = os.getenv("AGENT_REMOTE_INPUT_TOKEN", "")
+    AGENT_RUN_DEADLINE: float = float(os.getenv("AGENT_RUN_DEADLINE", "0"))
     AGENT_ACTION_PAUSE: float = float(os.getenv("AGENT_ACTION_PAUSE", "0.35"))
+    AGENT_TYPING_MODE: str = os.getenv("AGENT_TYPING_MODE", "paste")
+    AGENT_MACRO_PAUSE: float = float(os.getenv("AGENT_MACRO_PAUSE", "0.05"))
+    AGENT_SESSIONS: int = int(os.getenv("AGENT_SESSIONS", "0"))
+    AGENT_SESSION_WARM: int = int(os.getenv("AGENT_SESSION_WARM", "1"))
+    AGENT_SESSION_SCREEN: str = os.getenv("AGENT_SESSION_SCREEN", "1920x1080x24")
+    AGENT_SESSION_WM: str = os.getenv("AGENT_SESSION_WM", "openbox")
+    AGENT_SESSION_BROWSER: str = os.getenv(
+        "AGENT_SESSION_BROWSER",
+        "chromium --no-first-run --no-default-browser-check --user-data-dir={profile} --window-size={width},{height}",
+    )
+    AGENT_SESSION_WAIT: float = float(os.getenv("AGENT_SESSION_WAIT", "300"))
+    AGENT_SIMULATOR_SCENARIO: str = os.getenv("AGENT_SIMULATOR_SCENARIO", "")
+    AGENT_TRACE: bool = os.getenv("AGENT_TRACE", "true").lower() == "true"
+    AGENT_PROFILE: bool = os.getenv("AGENT_PROFILE", "false").lower() == "true"
+    AGENT_RUN_PROFILE: str = os.getenv("AGENT_RUN_PROFILE", "balanced")
+    AGENT_RUN_PROFILES: str = os.getenv("AGENT_RUN_PROFILES", "")
+    AGENT_STAGE_OVERRIDES: str = os.getenv("AGENT_STAGE_OVERRIDES", "")
 
 
 settings = Settings()
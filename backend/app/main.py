@@ -1,8 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from app.config import settings
 from app.logging_config import configure_logging
-from app.routers import health, pipeline
+from app.pipeline import desktop_sessions
+from app.routers import health, pipeline, runs
+from app.storage import retention
 
 def create_app() -> FastAPI:
     configure_logging()
@@ -15,12 +18,21 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["ETag"],
     )
+    # Status/element payloads are repetitive JSON; small poll responses are left uncompressed.
+    app.add_middleware(GZipMiddleware, minimum_size=settings.API_GZIP_MIN_SIZE)
 
     # Routers
     
     app.include_router(health.router)
     app.include_router(pipeline.router)
+    app.include_router(runs.router)
+
+    app.add_event_handler("startup", retention.start)
+    app.add_event_handler("shutdown", retention.stop)
+    app.add_event_handler("startup", desktop_sessions.start)
+    app.add_event_handler("shutdown", desktop_sessions.stop)
 
     return app
 
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+"""Pipeline orchestration and the virtual desktop session pool."""
+
+from app.config import settings
+
+from .sessions import DesktopSession, SessionError, SessionManager
+
+desktop_sessions = SessionManager(
+    settings.AGENT_SESSIONS,
+    warm=settings.AGENT_SESSION_WARM,
+    screen=settings.AGENT_SESSION_SCREEN,
+    window_manager=settings.AGENT_SESSION_WM,
+    browser=settings.AGENT_SESSION_BROWSER,
+)
+
+__all__ = ["DesktopSession", "SessionError", "SessionManager", "desktop_sessions"]
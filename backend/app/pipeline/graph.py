@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+"""A small stage-graph executor: stages declare the state keys they read and write, and the graph
+runs them in dependency order, side by side where nothing connects them.
+
+Each stage can memoize its outputs (``cache_size`` with a ``cache_key`` over its inputs), is
+traced as one span, and keeps call/latency/cache counters. Any stage can be swapped for another
+callable with the same inputs, e.g. from ``AGENT_STAGE_OVERRIDES``::
+
+    AGENT_STAGE_OVERRIDES='{"reason": "my_package.forms:analyze"}'
+"""
+
+import importlib
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.agent import tracing
+
+
+class StageError(RuntimeError):
+    pass
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    cache_hits: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "seconds": round(self.seconds, 4),
+            "mean_ms": round(self.seconds / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 2),
+        }
+
+
+@dataclass
+class Stage:
+    """``run`` is called with the declared ``inputs`` as keyword arguments and returns a dict of
+    (a subset of) its ``outputs``; outputs it leaves out are set to None."""
+
+    name: str
+    run: Callable[..., Optional[Dict[str, Any]]]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    cache_size: int = 0
+    cache_key: Optional[Callable[..., Hashable]] = None
+    # Allowed to share a thread pool with independent stages at the same depth.
+    concurrent: bool = True
+    _cache: "OrderedDict[Hashable, Dict[str, Any]]" = field(default_factory=OrderedDict, init=False, repr=False)
+
+    def call(self, state: Dict[str, Any], stats: StageStats) -> Dict[str, Any]:
+        try:
+            kwargs = {name: state[name] for name in self.inputs}
+        except KeyError as exc:
+            raise StageError(f"Stage '{self.name}' needs '{exc.args[0]}', which nothing provided") from exc
+        key = None
+        if self.cache_size > 0:
+            key = self.cache_key(**kwargs) if self.cache_key else tuple(kwargs.get(name) for name in self.inputs)
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                stats.cache_hits += 1
+                return cached
+        started = time.perf_counter()
+        with tracing.span(self.name, category="stage"):
+            result = self.run(**kwargs) or {}
+        elapsed = time.perf_counter() - started
+        stats.calls += 1
+        stats.seconds += elapsed
+        stats.max_seconds = max(stats.max_seconds, elapsed)
+        unknown = set(result) - set(self.outputs)
+        if unknown:
+            raise StageError(f"Stage '{self.name}' returned undeclared outputs: {', '.join(sorted(unknown))}")
+        outputs = {name: result.get(name) for name in self.outputs}
+        if key is not None:
+            self._cache[key] = outputs
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return outputs
+
+
+class StageGraph:
+    """Runs a set of stages as a DAG over one shared state dict per :meth:`run`."""
+
+    def __init__(self, stages: Iterable[Stage], *, max_workers: int = 4) -> None:
+        self.stages: Dict[str, Stage] = {}
+        producers: Dict[str, str] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise StageError(f"Duplicate stage '{stage.name}'")
+            for output in stage.outputs:
+                if output in producers:
+                    raise StageError(f"'{output}' is produced by both '{producers[output]}' and '{stage.name}'")
+                producers[output] = stage.name
+            self.stages[stage.name] = stage
+        self.producers = producers
+        self.levels = self._levels()
+        self.stats: Dict[str, StageStats] = {name: StageStats() for name in self.stages}
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _levels(self) -> List[List[str]]:
+        """Stages grouped by depth; every stage runs after all producers of its inputs."""
+        depth: Dict[str, int] = {}
+        visiting: set = set()
+
+        def visit(name: str) -> int:
+            if name in depth:
+                return depth[name]
+            if name in visiting:
+                raise StageError(f"Stage graph has a cycle through '{name}'")
+            visiting.add(name)
+            upstream = [self.producers[key] for key in self.stages[name].inputs if key in self.producers]
+            depth[name] = 1 + max((visit(parent) for parent in upstream), default=-1)
+            visiting.discard(name)
+            return depth[name]
+
+        levels: List[List[str]] = []
+        for name in self.stages:
+            level = visit(name)
+            while len(levels) <= level:
+                levels.append([])
+        for name in self.stages:
+            levels[depth[name]].append(name)
+        return levels
+
+    @property
+    def seeds(self) -> List[str]:
+        """State keys a run must provide because no stage produces them."""
+        needed = {key for stage in self.stages.values() for key in stage.inputs}
+        return sorted(needed - set(self.producers))
+
+    def replace(self, name: str, run: Callable[..., Optional[Dict[str, Any]]], **changes: Any) -> None:
+        """Swap a stage's implementation (and optionally its policies) in place."""
+        if name not in self.stages:
+            raise StageError(f"Unknown stage '{name}' (known: {', '.join(self.stages)})")
+        self.stages[name] = replace(self.stages[name], run=run, **changes)
+
+    def apply_overrides(self, overrides: Dict[str, str]) -> None:
+        """Replace stages by ``{"stage": "module:callable"}`` import paths."""
+        for name, target in overrides.items():
+            self.replace(name, load_callable(target))
+
+    def run(self, state: Dict[str, Any], *, halt: Optional[str] = None) -> Dict[str, Any]:
+        """Run every stage once, updating ``state`` in place.
+
+        Stops after the level at which ``state[halt]`` becomes truthy, so later stages do not
+        run (e.g. nothing executes once the planner asks the user a question).
+        """
+        missing = [key for key in self.seeds if key not in state]
+        if missing:
+            raise StageError(f"Stage graph run is missing inputs: {', '.join(missing)}")
+        for level in self.levels:
+            parallel = [name for name in level if self.stages[name].concurrent]
+            serial = [name for name in level if not self.stages[name].concurrent]
+            if len(parallel) > 1:
+                pool = self._executor()
+                futures = [
+                    pool.submit(tracing.bind(self.stages[name].call), dict(state), self.stats[name]) for name in parallel
+                ]
+                for future in futures:
+                    state.update(future.result())
+            else:
+                serial = parallel + serial
+            for name in serial:
+                state.update(self.stages[name].call(state, self.stats[name]))
+            if halt and state.get(halt):
+                break
+        return state
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage")
+        return self._pool
+
+    def stats_summary(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": name,
+                "level": index,
+                "inputs": list(self.stages[name].inputs),
+                "outputs": list(self.stages[name].outputs),
+                "cache_size": self.stages[name].cache_size,
+            }
+            for index, level in enumerate(self.levels)
+            for name in level
+        ]
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+def load_callable(target: str) -> Callable[..., Any]:
+    module_name, _, attribute = target.partition(":")
+    if not module_name or not attribute:
+        raise StageError(f"Stage override '{target}' must look like 'module:callable'")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def parse_overrides(spec: str) -> Dict[str, str]:
+    """``AGENT_STAGE_OVERRIDES`` JSON; empty means no overrides."""
+    if not spec:
+        return {}
+    try:
+        overrides = json.loads(spec)
+    except json.JSONDecodeError as exc:
+        raise StageError(f"AGENT_STAGE_OVERRIDES is not valid JSON: {exc}") from exc
+    if not isinstance(overrides, dict):
+        raise StageError("AGENT_STAGE_OVERRIDES must be a JSON object of stage -> 'module:callable'")
+    return {str(name): str(target) for name, target in overrides.items()}
+
@@ -1,4 +0,0 @@
-def generate_actions(prompt, reasoning_output):
-    print("Running LangChain LLM agent...")
-    # TODO: integrate actual LangChain or GPT model
-    return {"action": "click 'Sign In'", "explanation": "User requested form submission."}
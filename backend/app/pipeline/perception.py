@@ -1,4 +0,0 @@
-def process_image(file_path: str | None):
-    print("Running YOLO/Omniparser perception step...")
-    # TODO: integrate actual model
-    return {"elements": [{"type": "button", "label": "Sign In"}]}
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+"""Named performance profiles and per-run overrides, so a run can trade accuracy for latency."""
+
+import json
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+# Overrides on top of the deployment settings; "balanced" is the settings as configured.
+PRESETS: Dict[str, Dict[str, Any]] = {
+    "fast": {
+        "max_iterations": 3,
+        "action_pause": 0.15,
+        "macro_pause": 0.02,
+        "click_settle": 0.05,
+        "image_max_side": 960,
+        "image_detail": "low",
+        "max_crops": 0,
+        "element_top_k": 40,
+        "bbox_threshold": 0.05,
+        "iou_threshold": 0.3,
+        "hedge_after": 3.0,
+        "local_ocr": False,
+        "debug_snapshots": False,
+        "eager_debug_overlays": False,
+    },
+    "balanced": {},
+    "accurate": {
+        "max_iterations": 6,
+        "action_pause": 0.6,
+        "click_settle": 0.2,
+        "image_max_side": 1920,
+        "image_detail": "high",
+        "max_crops": 4,
+        "element_top_k": 200,
+        "bbox_threshold": 0.001,
+        "iou_threshold": 0.5,
+        "hedge_after": 15.0,
+        "eager_debug_overlays": True,
+    },
+}
+
+
+# Options whose unset value (None) means "leave it to the driver default".
+OPTIONAL_OPTIONS = frozenset({"click_settle"})
+
+
+class ProfileError(ValueError):
+    pass
+
+
+@dataclass
+class RunProfile:
+    name: str
+    max_iterations: int
+    run_deadline: float
+    action_pause: float
+    macro_pause: float
+    click_settle: Optional[float]
+    image_max_side: int
+    image_detail: str
+    max_crops: int
+    element_top_k: int
+    form_structure: bool
+    bbox_threshold: float
+    iou_threshold: float
+    planner_model: str
+    planner_cascade: str
+    hedge_after: float
+    local_ocr: bool
+    debug_snapshots: bool
+    eager_debug_overlays: bool
+
+    @classmethod
+    def from_settings(cls) -> "RunProfile":
+        return cls(
+            name="balanced",
+            max_iterations=settings.AGENT_MAX_ITERATIONS,
+            run_deadline=settings.AGENT_RUN_DEADLINE,
+            action_pause=settings.AGENT_ACTION_PAUSE,
+            macro_pause=settings.AGENT_MACRO_PAUSE,
+            click_settle=None,
+            image_max_side=settings.PLANNER_IMAGE_MAX_SIDE,
+            image_detail=settings.PLANNER_IMAGE_DETAIL,
+            max_crops=settings.PLANNER_MAX_CROPS,
+            element_top_k=settings.PLANNER_ELEMENT_TOP_K,
+            form_structure=settings.PLANNER_FORM_STRUCTURE,
+            bbox_threshold=settings.OMNIPARSER_BBOX_THRESHOLD,
+            iou_threshold=settings.OMNIPARSER_IOU_THRESHOLD,
+            planner_model=settings.OPENAI_MODEL,
+            planner_cascade=settings.PLANNER_CASCADE,
+            hedge_after=settings.PERCEPTION_HEDGE_AFTER,
+            local_ocr=settings.PERCEPTION_LOCAL_OCR,
+            debug_snapshots=True,
+            eager_debug_overlays=settings.AGENT_EAGER_DEBUG_OVERLAYS,
+        )
+
+    def override(self, values: Dict[str, Any]) -> "RunProfile":
+        known = {item.name: item for item in fields(self) if item.name != "name"}
+        changes: Dict[str, Any] = {}
+        for key, value in values.items():
+            if key not in known:
+                raise ProfileError(f"Unknown run option '{key}' (known: {', '.join(sorted(known))})")
+            changes[key] = _coerce(key, value, getattr(self, key))
+        return replace(self, **changes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _coerce(key: str, value: Any, current: Any) -> Any:
+    if value is None:
+        if key in OPTIONAL_OPTIONS:
+            return None
+        raise ProfileError(f"Run option '{key}' cannot be null")
+    try:
+        if key in OPTIONAL_OPTIONS:
+            return float(value)
+        if isinstance(current, bool):
+            if isinstance(value, str):
+                return value.lower() in {"1", "true", "yes", "on"}
+            return bool(value)
+        return type(current)(value)
+    except (TypeError, ValueError) as exc:
+        raise ProfileError(f"Run option '{key}' expects {type(current).__name__}, got {value!r}") from exc
+
+
+def presets() -> Dict[str, Dict[str, Any]]:
+    """Built-in presets merged with the ``AGENT_RUN_PROFILES`` JSON from the environment."""
+    merged = {name: dict(values) for name, values in PRESETS.items()}
+    if settings.AGENT_RUN_PROFILES:
+        try:
+            extra = json.loads(settings.AGENT_RUN_PROFILES)
+        except json.JSONDecodeError as exc:
+            raise ProfileError(f"AGENT_RUN_PROFILES is not valid JSON: {exc}") from exc
+        for name, values in extra.items():
+            merged.setdefault(name, {}).update(values)
+    return merged
+
+
+def resolve_profile(options: Optional[Dict[str, Any]] = None) -> RunProfile:
+    """Settings, then the named preset (``options["profile"]``), then any other keys in ``options``."""
+    options = dict(options or {})
+    name = options.pop("profile", None) or settings.AGENT_RUN_PROFILE
+    available = presets()
+    if name not in available:
+        raise ProfileError(f"Unknown profile '{name}' (known: {', '.join(sorted(available))})")
+    profile = RunProfile.from_settings().override(available[name]).override(options)
+    profile.name = name
+    return profile
@@ -1,4 +1,238 @@
-def analyze_elements(perception_output):
-    print("Running BLIP reasoning step...")
-    # TODO: integrate actual semantic reasoning
-    return {"semantics": [{"element": e, "meaning": "submit action"} for e in perception_output["elements"]]}
+from __future__ import annotations
+
+"""Local form-structure analysis: pairs labels with their input fields, groups fields into
+forms, and picks out buttons and section headings, so the planner gets a compact view of the
+screen instead of inferring it from raw boxes."""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.agent.elements import ElementTable
+
+INPUT_TYPES = {"input", "textbox", "textfield", "field", "combobox", "select", "searchbox"}
+BUTTON_TYPES = {"button", "submit", "checkbox", "radio", "link"}
+BUTTON_WORDS = frozenset(
+    "ok cancel submit save send search next back continue login log sign close apply confirm done yes no "
+    "add create delete remove edit upload download register update finish".split()
+)
+PLACEHOLDER = re.compile(r"^(enter|type|search|your|e\.g\.|select|choose)\b|\.\.\.$|…$", re.IGNORECASE)
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class FormField:
+    field_id: int
+    label_id: Optional[int] = None
+    label: str = ""
+    relation: str = "none"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"field_id": self.field_id, "label_id": self.label_id, "label": self.label, "relation": self.relation}
+
+
+@dataclass
+class Form:
+    bbox: List[int]
+    fields: List[FormField] = field(default_factory=list)
+    buttons: List[int] = field(default_factory=list)
+    title: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "bbox": self.bbox,
+            "title": self.title,
+            "fields": [item.to_dict() for item in self.fields],
+            "buttons": self.buttons,
+        }
+
+
+@dataclass
+class ScreenStructure:
+    forms: List[Form] = field(default_factory=list)
+    buttons: List[int] = field(default_factory=list)
+    sections: List[int] = field(default_factory=list)
+    labels: Dict[int, str] = field(default_factory=dict)
+
+    @property
+    def label_targets(self) -> Dict[int, int]:
+        """label element id -> the input field it names."""
+        return {item.label_id: item.field_id for form in self.forms for item in form.fields if item.label_id is not None}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "forms": [form.to_dict() for form in self.forms],
+            "buttons": self.buttons,
+            "sections": [{"element_id": element_id, "text": self.labels.get(element_id, "")} for element_id in self.sections],
+        }
+
+    def describe(self, max_text: int = 32) -> Optional[str]:
+        """One line per form plus stray buttons and headings; None when nothing was found."""
+        def name(element_id: int) -> str:
+            text = self.labels.get(element_id, "").strip().replace("\n", " ")
+            return f'{element_id} "{text[:max_text]}"' if text else str(element_id)
+
+        lines: List[str] = []
+        for index, form in enumerate(self.forms, start=1):
+            fields = ", ".join(
+                f'input {item.field_id} for "{item.label[:max_text]}"' if item.label else f"input {item.field_id} (unlabelled)"
+                for item in form.fields
+            )
+            title = f' "{form.title[:max_text]}"' if form.title else ""
+            buttons = f"; buttons {', '.join(name(element_id) for element_id in form.buttons)}" if form.buttons else ""
+            lines.append(f"Form {index}{title}: {fields}{buttons}")
+        if self.buttons:
+            lines.append("Other buttons: " + ", ".join(name(element_id) for element_id in self.buttons))
+        if self.sections:
+            lines.append("Sections: " + ", ".join(name(element_id) for element_id in self.sections))
+        return "\n".join(lines) or None
+
+
+def _classify(elements: ElementTable) -> Dict[str, np.ndarray]:
+    texts = [text.strip() for text in elements.texts()]
+    types = [kind.lower() for kind in elements.types()]
+    boxes = elements.boxes.astype(np.float32)
+    width = boxes[:, 2] - boxes[:, 0]
+    height = np.maximum(boxes[:, 3] - boxes[:, 1], 1)
+    words = [_WORD.findall(text.lower()) for text in texts]
+
+    declared_input = np.array([kind in INPUT_TYPES for kind in types], dtype=bool)
+    declared_button = np.array([kind in BUTTON_TYPES for kind in types], dtype=bool)
+    # OmniParser reports text fields as wide boxes that are empty or show placeholder text.
+    wide = (width >= 3 * height) & (width >= 80) & (height <= 80)
+    blank_or_placeholder = np.array([not text or bool(PLACEHOLDER.search(text)) for text in texts], dtype=bool)
+    is_input = declared_input | (~declared_button & wide & blank_or_placeholder & np.array([kind != "text" or not texts[i] for i, kind in enumerate(types)]))
+    textual = ~is_input & ~declared_button & np.array([0 < len(tokens) <= 6 for tokens in words], dtype=bool)
+    heading = np.zeros(len(elements), dtype=bool)
+    if textual.any():
+        # Headings are set noticeably larger than the surrounding label text.
+        heading = textual & (height >= 1.4 * float(np.median(height[textual])))
+    short = np.array([0 < len(tokens) <= 3 for tokens in words], dtype=bool)
+    button_words = np.array([bool(BUTTON_WORDS.intersection(tokens)) for tokens in words], dtype=bool)
+    is_button = ~is_input & ~heading & (declared_button | (short & button_words))
+    return {"input": is_input, "button": is_button, "label": textual & ~heading & ~is_button, "heading": heading}
+
+
+def _pair_labels(boxes: np.ndarray, fields: np.ndarray, labels: np.ndarray, max_gap: float) -> Dict[int, tuple]:
+    """Greedy one-to-one label assignment: label left of the field on the same row, or just above it."""
+    if not len(fields) or not len(labels):
+        return {}
+    f = boxes[fields][:, None, :]
+    l = boxes[labels][None, :, :]
+    row_overlap = np.minimum(f[..., 3], l[..., 3]) - np.maximum(f[..., 1], l[..., 1])
+    col_overlap = np.minimum(f[..., 2], l[..., 2]) - np.maximum(f[..., 0], l[..., 0])
+    min_height = np.minimum(f[..., 3] - f[..., 1], l[..., 3] - l[..., 1])
+
+    left_gap = f[..., 0] - l[..., 2]
+    left = (row_overlap >= 0.5 * min_height) & (left_gap >= -8) & (left_gap <= max_gap)
+    above_gap = f[..., 1] - l[..., 3]
+    above = (col_overlap > 0) & (above_gap >= -4) & (above_gap <= max_gap / 4) & (np.abs(f[..., 0] - l[..., 0]) <= max_gap / 2)
+    inside = (l[..., 0] >= f[..., 0]) & (l[..., 2] <= f[..., 2]) & (l[..., 1] >= f[..., 1]) & (l[..., 3] <= f[..., 3])
+
+    cost = np.full(left.shape, np.inf, dtype=np.float32)
+    cost = np.where(above, np.maximum(above_gap, 0) * 1.5, cost)
+    cost = np.where(left, np.minimum(cost, np.maximum(left_gap, 0)), cost)
+    cost = np.where(inside, np.minimum(cost, 0.5), cost)
+
+    pairs: Dict[int, tuple] = {}
+    used_labels = set()
+    for flat in np.argsort(cost, axis=None):
+        fi, li = np.unravel_index(flat, cost.shape)
+        if not np.isfinite(cost[fi, li]):
+            break
+        if fi in pairs or li in used_labels:
+            continue
+        relation = "inside" if inside[fi, li] else "left" if left[fi, li] and cost[fi, li] == max(left_gap[fi, li], 0) else "above"
+        pairs[int(fi)] = (int(labels[li]), relation)
+        used_labels.add(li)
+    return pairs
+
+
+def _group(boxes: np.ndarray, members: List[int], reach: float) -> List[List[int]]:
+    """Connected components of fields whose boxes come within ``reach`` pixels of each other."""
+    parent = list(range(len(members)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    b = boxes[members]
+    gap_x = np.maximum(0, np.maximum(b[:, None, 0], b[None, :, 0]) - np.minimum(b[:, None, 2], b[None, :, 2]))
+    gap_y = np.maximum(0, np.maximum(b[:, None, 1], b[None, :, 1]) - np.minimum(b[:, None, 3], b[None, :, 3]))
+    near = (gap_x <= reach / 2) & (gap_y <= reach)
+    for i, j in zip(*np.nonzero(np.triu(near, 1))):
+        parent[find(int(i))] = find(int(j))
+    groups: Dict[int, List[int]] = {}
+    for index, member in enumerate(members):
+        groups.setdefault(find(index), []).append(member)
+    return sorted(groups.values(), key=lambda group: (boxes[group, 1].min(), boxes[group, 0].min()))
+
+
+def analyze_elements(perception_output: Dict[str, Any], *, max_gap: float = 240.0, form_reach: float = 90.0) -> ScreenStructure:
+    """Build the form structure for a perception result (``{"elements": ElementTable | list}``)."""
+    elements = ElementTable.from_dicts(perception_output.get("elements") or [])
+    if not len(elements):
+        return ScreenStructure()
+    kinds = _classify(elements)
+    boxes = elements.boxes.astype(np.float32)
+    ids = elements.ids.tolist()
+    texts = elements.texts()
+    labels = {ids[i]: texts[i].strip() for i in range(len(ids)) if texts[i].strip()}
+
+    field_rows = np.flatnonzero(kinds["input"])
+    label_rows = np.flatnonzero(kinds["label"])
+    pairs = _pair_labels(boxes, field_rows, label_rows, max_gap)
+
+    structure = ScreenStructure(labels=labels)
+    claimed_buttons = set()
+    for group in _group(boxes, field_rows.tolist(), form_reach) if len(field_rows) else []:
+        members = [int(np.flatnonzero(field_rows == row)[0]) for row in group]
+        form_fields: List[FormField] = []
+        rows = list(group)
+        for member, row in zip(members, group):
+            label_row, relation = pairs.get(member, (None, "none"))
+            if label_row is None and texts[row].strip():
+                # Placeholder text is the best label an unlabelled field has.
+                form_fields.append(FormField(field_id=ids[row], label=texts[row].strip().rstrip(":"), relation="placeholder"))
+                continue
+            form_fields.append(
+                FormField(
+                    field_id=ids[row],
+                    label_id=None if label_row is None else ids[label_row],
+                    label="" if label_row is None else texts[label_row].strip().rstrip(":"),
+                    relation=relation,
+                )
+            )
+            if label_row is not None:
+                rows.append(label_row)
+        x1, y1 = boxes[rows, 0].min(), boxes[rows, 1].min()
+        x2, y2 = boxes[rows, 2].max(), boxes[rows, 3].max()
+        form = Form(bbox=[int(x1), int(y1), int(x2), int(y2)], fields=form_fields)
+        for row in np.flatnonzero(kinds["heading"]).tolist():
+            bx1, by1, bx2, by2 = boxes[row]
+            if by2 <= y1 and y1 - by2 <= form_reach and bx2 >= x1 and bx1 <= x2:
+                form.title = texts[row].strip()
+        structure.forms.append(form)
+
+    # Each button within reach of a form goes to the nearest one only.
+    for row in np.flatnonzero(kinds["button"]).tolist():
+        bx1, by1, bx2, by2 = boxes[row]
+        nearest, best = None, None
+        for form in structure.forms:
+            x1, y1, x2, y2 = form.bbox
+            if not (bx1 <= x2 + form_reach and bx2 >= x1 - form_reach and by1 <= y2 + form_reach and by2 >= y1 - form_reach / 2):
+                continue
+            gap = max(x1 - bx2, bx1 - x2, 0.0) + max(y1 - by2, by1 - y2, 0.0)
+            if best is None or gap < best:
+                nearest, best = form, gap
+        if nearest is not None:
+            nearest.buttons.append(ids[row])
+            claimed_buttons.add(row)
+
+    structure.buttons = [ids[row] for row in np.flatnonzero(kinds["button"]).tolist() if row not in claimed_buttons]
+    structure.sections = [ids[row] for row in np.flatnonzero(kinds["heading"]).tolist()]
+    return structure
@@ -1,13 +1,23 @@
 from __future__ import annotations
 
+import cProfile
 import json
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
-from app.agent.engine import VisualAgentEngine
+from app.agent import tracing
+from app.agent.deadline import Deadline
 from app.config import settings
+from app.pipeline import desktop_sessions
+from app.pipeline.graph import parse_overrides
+from app.pipeline.profiles import resolve_profile
 from app.schemas import LogEntry
+from app.storage import blob_store, run_index
+
+if TYPE_CHECKING:
+    from app.agent.workflow import Workflow
 
 
 def run_full_pipeline(
@@ -16,8 +26,19 @@ def run_full_pipeline(
     file_path: Optional[str] = None,
     clarifications: Optional[List[str]] = None,
     run_dir: Optional[Path] = None,
+    workflow: Optional[Workflow] = None,
+    variables: Optional[Dict[str, str]] = None,
+    options: Optional[Dict[str, Any]] = None,
 ):
+    # Imported per run: the engine pulls in the planner, perception and toolbox stacks,
+    # which API workers serving only status requests never need.
+    from app.agent.engine import VisualAgentEngine
+    from app.agent.simulator import Scenario, SimulatedDesktop
+
     logs: list[LogEntry] = []
+    started_at = datetime.utcnow()
+    profile = resolve_profile(options)
+    deadline = Deadline(profile.run_deadline)
 
     def log(stage: str, message: str) -> None:
         entry = LogEntry(stage=stage, message=message, timestamp=datetime.utcnow())
@@ -25,6 +46,7 @@ def run_full_pipeline(
         print(f"[{stage}] {message}")
 
     log("init", f"Pipeline started for prompt: {prompt}")
+    log("init", f"Using '{profile.name}' profile: {profile.max_iterations} iterations, model {profile.planner_model}")
 
     run_root = Path(run_dir) if run_dir else settings.AGENT_RUNS_DIR / run_id
     screenshots_dir = run_root / "screenshots"
@@ -33,47 +55,145 @@ def run_full_pipeline(
     for path in [run_root, screenshots_dir, actions_log_dir, pipeline_log_dir]:
         path.mkdir(parents=True, exist_ok=True)
 
-    try:
-        engine = VisualAgentEngine(
-            run_id,
-            screenshot_dir=screenshots_dir,
-            log_dir=actions_log_dir,
-            max_iterations=settings.AGENT_MAX_ITERATIONS,
-            enable_overlay=settings.AGENT_ENABLE_OVERLAY,
-            dry_run=settings.AGENT_DRY_RUN,
-            omniparser_url=settings.HF_OMNIPARSER_URL,
-            omniparser_token=settings.HF_API_TOKEN,
-            openai_api_key=settings.OPENAI_API_KEY,
-            openai_api_base=settings.OPENAI_BASE_URL,
-            openai_model=settings.OPENAI_MODEL,
-            openai_temperature=settings.OPENAI_TEMPERATURE,
-            action_pause=settings.AGENT_ACTION_PAUSE,
-        )
-        agent_result = engine.run(prompt, file_path=file_path, clarifications=clarifications)
-        result_payload = {
-            "final_message": agent_result.final_message,
-            "actions": agent_result.actions,
-            "screenshots": agent_result.screenshots,
-            "elements": agent_result.elements,
-            "plan": agent_result.plan,
-            "log_path": agent_result.log_path,
-        }
-        status = agent_result.status
-        pending_question = agent_result.pending_question
-        if status == "needs_input":
-            log("planner", "LLM requested additional user input")
-        else:
-            log("complete", "Agent finished successfully")
-    except Exception as exc:
-        log("error", str(exc))
-        status = "error"
-        result_payload = None
-        pending_question = None
+    session = None
+    tracer = tracing.Tracer(run_id) if settings.AGENT_TRACE else None
+    profiler = cProfile.Profile() if settings.AGENT_PROFILE else None
+    with tracing.activate(tracer):
+        try:
+            simulator = None
+            if settings.AGENT_SIMULATOR_SCENARIO:
+                simulator = SimulatedDesktop(Scenario.load(settings.AGENT_SIMULATOR_SCENARIO))
+                log("session", f"Running against simulated scenario '{simulator.scenario.name}'")
+            elif desktop_sessions.enabled:
+                with tracing.span("session.acquire"):
+                    session = desktop_sessions.acquire(timeout=deadline.timeout("session", settings.AGENT_SESSION_WAIT))
+                log("session", f"Running on virtual display {session.display}")
+            engine = VisualAgentEngine(
+                run_id,
+                screenshot_dir=screenshots_dir,
+                log_dir=actions_log_dir,
+                max_iterations=profile.max_iterations,
+                enable_overlay=settings.AGENT_ENABLE_OVERLAY,
+                dry_run=settings.AGENT_DRY_RUN,
+                omniparser_url=settings.HF_OMNIPARSER_URL,
+                omniparser_token=settings.HF_API_TOKEN,
+                openai_api_key=settings.OPENAI_API_KEY,
+                openai_api_base=settings.OPENAI_BASE_URL,
+                openai_model=profile.planner_model,
+                openai_temperature=settings.OPENAI_TEMPERATURE,
+                action_pause=profile.action_pause,
+                typing_mode=settings.AGENT_TYPING_MODE,
+                macro_pause=profile.macro_pause,
+                image_max_side=profile.image_max_side,
+                image_detail=profile.image_detail,
+                max_crops=profile.max_crops,
+                element_top_k=profile.element_top_k,
+                form_structure=profile.form_structure,
+                stage_overrides=parse_overrides(settings.AGENT_STAGE_OVERRIDES),
+                element_deltas=settings.PLANNER_ELEMENT_DELTAS,
+                history_window=settings.PLANNER_HISTORY_WINDOW,
+                planner_cascade=profile.planner_cascade,
+                hedge_after=profile.hedge_after,
+                local_ocr=profile.local_ocr,
+                eager_debug_overlays=profile.eager_debug_overlays,
+                debug_snapshots=profile.debug_snapshots,
+                click_settle=profile.click_settle,
+                bbox_threshold=profile.bbox_threshold,
+                iou_threshold=profile.iou_threshold,
+                dedup=settings.OMNIPARSER_DEDUP,
+                min_confidence=settings.OMNIPARSER_MIN_CONFIDENCE,
+                blob_store=blob_store,
+                perception_cache=settings.PERCEPTION_CACHE_SIZE,
+                display=session.display if session else None,
+                toolbox_backend=settings.AGENT_TOOLBOX_BACKEND or None,
+                remote_input_url=settings.AGENT_REMOTE_INPUT_URL,
+                remote_input_token=settings.AGENT_REMOTE_INPUT_TOKEN,
+                simulator=simulator,
+            )
+            if workflow is not None:
+                log("replay", f"Replaying workflow '{workflow.name}' ({len(workflow.steps)} steps)")
+                execute = partial(engine.replay, workflow, variables=variables, deadline=deadline)
+            else:
+                execute = partial(engine.run, prompt, file_path=file_path, clarifications=clarifications, deadline=deadline)
+            with tracing.span("run", mode="replay" if workflow is not None else "plan") as traced_run:
+                agent_result = profiler.runcall(execute) if profiler is not None else execute()
+                traced_run.set(status=agent_result.status)
+            if workflow is not None and agent_result.plan.get("fallback"):
+                log("replay", f"Workflow anchor missing after {agent_result.plan.get('steps_replayed')} steps; planner took over")
+            result_payload = {
+                "final_message": agent_result.final_message,
+                "actions": agent_result.actions,
+                "screenshots": agent_result.screenshots,
+                "elements": agent_result.elements.to_dicts(),
+                "plan": agent_result.plan,
+                "log_path": agent_result.log_path,
+            }
+            status = agent_result.status
+            pending_question = agent_result.pending_question
+            usage = agent_result.plan.get("usage_totals") or {}
+            if usage.get("calls"):
+                log(
+                    "planner",
+                    f"{usage['calls']} planner calls, {usage['cached_tokens']}/{usage['prompt_tokens']} prompt tokens cached "
+                    f"({usage['cached_ratio']:.0%})",
+                )
+            checks = agent_result.plan.get("validation_totals") or {}
+            if checks.get("plans"):
+                log(
+                    "planner",
+                    f"Plan validation: {checks.get('repairs', 0)} local repairs, {checks.get('reprompts', 0)} corrective re-prompts, "
+                    f"{checks.get('dropped', 0)} actions dropped over {checks['plans']} plans",
+                )
+            for tier in agent_result.plan.get("planner_tiers") or []:
+                if tier["calls"]:
+                    log(
+                        "planner",
+                        f"Tier {tier['model']}: {tier['calls']} calls, {tier['escalation_rate']:.0%} escalated, "
+                        f"p50 {tier['latency_p50']}s",
+                    )
+            if status == "needs_input":
+                log("planner", "LLM requested additional user input")
+            elif status == "timeout":
+                log("timeout", agent_result.final_message)
+            else:
+                log("complete", "Agent finished successfully")
+        except Exception as exc:
+            log("error", str(exc))
+            status = "error"
+            result_payload = None
+            pending_question = None
+        finally:
+            if session is not None:
+                desktop_sessions.release(session)
+
+    if tracer is not None:
+        tracer.save(run_root / "trace.json")
+        log("trace", f"Trace timeline written to {run_root / 'trace.json'}")
+    if profiler is not None:
+        profiler.dump_stats(str(run_root / "profile.pstats"))
+        log("trace", f"cProfile stats written to {run_root / 'profile.pstats'}")
 
     pipeline_log_path = pipeline_log_dir / "pipeline.json"
     with pipeline_log_path.open("w", encoding="utf-8") as handle:
         json.dump([entry.model_dump() for entry in logs], handle, indent=2, default=str)
 
+    summary = {
+        "run_id": run_id,
+        "prompt": prompt,
+        "clarifications": clarifications or [],
+        "status": status,
+        "mode": "replay" if workflow is not None else "plan",
+        "profile": profile.to_dict(),
+        "started_at": started_at.isoformat(),
+        "finished_at": datetime.utcnow().isoformat(),
+    }
+    with (run_root / "run.json").open("w", encoding="utf-8") as handle:
+        json.dump(summary, handle, indent=2)
+    try:
+        run_index.record_run(run_root)
+    except Exception as exc:
+        print(f"[index] Failed to index run {run_id}: {exc}")
+
     return {
         "run_id": run_id,
         "status": status,
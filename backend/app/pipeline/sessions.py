@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+"""Isolated virtual desktops (Xvfb + window manager + browser) for running agent tasks in parallel."""
+
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SessionError(RuntimeError):
+    pass
+
+
+def _stop(process: Optional[subprocess.Popen], timeout: float = 5.0) -> None:
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait(timeout=timeout)
+
+
+@dataclass
+class DesktopSession:
+    number: int
+    width: int
+    height: int
+    xvfb: subprocess.Popen
+    window_manager: Optional[subprocess.Popen] = None
+    browser: Optional[subprocess.Popen] = None
+    profile_dir: Optional[Path] = None
+    runs: int = 0
+    started_at: float = field(default_factory=time.time)
+
+    @property
+    def display(self) -> str:
+        return f":{self.number}"
+
+    def env(self) -> Dict[str, str]:
+        return {**os.environ, "DISPLAY": self.display}
+
+    def healthy(self) -> bool:
+        return self.xvfb.poll() is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "display": self.display,
+            "size": [self.width, self.height],
+            "runs": self.runs,
+            "browser": self.browser is not None and self.browser.poll() is None,
+            "healthy": self.healthy(),
+        }
+
+
+class SessionManager:
+    """Pool of up to ``max_sessions`` Xvfb displays, each with its own window manager.
+
+    ``acquire`` hands out an idle session (or launches one while under the limit) and
+    starts a fresh browser with a throwaway profile on it; ``release`` closes that
+    browser and returns the display to the pool, so the next run skips the X server and
+    window manager start-up. ``start`` pre-launches ``warm`` sessions in the background.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int,
+        *,
+        warm: int = 0,
+        screen: str = "1920x1080x24",
+        window_manager: str = "",
+        browser: str = "",
+        display_base: int = 100,
+        startup_timeout: float = 10.0,
+    ) -> None:
+        self.max_sessions = max(0, max_sessions)
+        self.warm = min(max(0, warm), self.max_sessions)
+        self.screen = screen
+        width, height, *_ = screen.split("x")
+        self.width, self.height = int(width), int(height)
+        self.window_manager = window_manager
+        self.browser = browser
+        self.display_base = display_base
+        self.startup_timeout = startup_timeout
+        self._idle: List[DesktopSession] = []
+        self._busy: Dict[int, DesktopSession] = {}
+        self._launching = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_sessions > 0
+
+    def start(self) -> None:
+        if not self.enabled or not self.warm:
+            return
+        threading.Thread(target=self._prewarm, name="desktop-sessions", daemon=True).start()
+
+    def _prewarm(self) -> None:
+        for _ in range(self.warm):
+            with self._cond:
+                if self._closed or len(self._idle) + len(self._busy) + self._launching >= self.max_sessions:
+                    return
+                self._launching += 1
+            try:
+                session = self._launch()
+            except SessionError as exc:
+                logger.warning("Could not pre-warm desktop session: %s", exc)
+                with self._cond:
+                    self._launching -= 1
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._launching -= 1
+                self._idle.append(session)
+                self._cond.notify_all()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._closed = True
+            sessions = self._idle + list(self._busy.values())
+            self._idle.clear()
+            self._busy.clear()
+            self._cond.notify_all()
+        for session in sessions:
+            self._terminate(session)
+
+    def acquire(self, timeout: Optional[float] = None) -> DesktopSession:
+        if not self.enabled:
+            raise SessionError("Desktop sessions are disabled (AGENT_SESSIONS=0)")
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise SessionError("Session manager is shut down")
+                while self._idle:
+                    session = self._idle.pop()
+                    if session.healthy():
+                        self._busy[session.number] = session
+                        break
+                    self._terminate(session)
+                else:
+                    session = None
+                if session is not None:
+                    break
+                if len(self._busy) + self._launching < self.max_sessions:
+                    self._launching += 1
+                    break
+                remaining = None if expires is None else expires - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise SessionError(f"No desktop session became free within {timeout:.1f}s")
+                self._cond.wait(remaining)
+
+        if session is None:
+            try:
+                session = self._launch()
+            finally:
+                with self._cond:
+                    self._launching -= 1
+                    if session is not None:
+                        self._busy[session.number] = session
+                    self._cond.notify_all()
+        try:
+            self._start_browser(session)
+        except SessionError:
+            self.release(session)
+            raise
+        session.runs += 1
+        return session
+
+    def release(self, session: DesktopSession) -> None:
+        self._stop_browser(session)
+        with self._cond:
+            self._busy.pop(session.number, None)
+            if session.healthy() and not self._closed:
+                self._idle.append(session)
+                session = None
+            self._cond.notify_all()
+        if session is not None:
+            self._terminate(session)
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None) -> Iterator[DesktopSession]:
+        session = self.acquire(timeout)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_sessions": self.max_sessions,
+                "idle": [session.to_dict() for session in self._idle],
+                "busy": [session.to_dict() for session in self._busy.values()],
+                "launching": self._launching,
+            }
+
+    # ------------------------------------------------------------------
+    # Process management
+    # ------------------------------------------------------------------
+    def _taken(self) -> set:
+        with self._cond:
+            return {session.number for session in self._idle} | set(self._busy)
+
+    def _free_display(self, skip: set) -> int:
+        taken = self._taken() | skip
+        for number in range(self.display_base, self.display_base + 1000):
+            if number in taken:
+                continue
+            if Path(f"/tmp/.X{number}-lock").exists() or Path(f"/tmp/.X11-unix/X{number}").exists():
+                continue
+            return number
+        raise SessionError("No free X display number")
+
+    def _launch(self) -> DesktopSession:
+        if not shutil.which("Xvfb"):
+            raise SessionError("Xvfb is not installed")
+        tried: set = set()
+        for _ in range(5):
+            number = self._free_display(tried)
+            tried.add(number)
+            xvfb = subprocess.Popen(
+                ["Xvfb", f":{number}", "-screen", "0", self.screen, "-nolisten", "tcp", "-noreset"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            socket = Path(f"/tmp/.X11-unix/X{number}")
+            deadline = time.monotonic() + self.startup_timeout
+            while time.monotonic() < deadline and xvfb.poll() is None and not socket.exists():
+                time.sleep(0.05)
+            if xvfb.poll() is not None or not socket.exists():
+                # Another process grabbed the display first; try the next number.
+                _stop(xvfb)
+                continue
+            session = DesktopSession(number=number, width=self.width, height=self.height, xvfb=xvfb)
+            if self.window_manager:
+                try:
+                    session.window_manager = self._spawn(self.window_manager, session)
+                except SessionError:
+                    # Don't leave a display nothing will ever use (or release) running.
+                    _stop(xvfb)
+                    raise
+            logger.info("Started desktop session %s", session.display)
+            return session
+        raise SessionError("Xvfb failed to start")
+
+    def _spawn(self, command: str, session: DesktopSession) -> subprocess.Popen:
+        args = shlex.split(
+            command.format(
+                display=session.display,
+                width=session.width,
+                height=session.height,
+                profile=session.profile_dir or "",
+            )
+        )
+        try:
+            return subprocess.Popen(args, env=session.env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as exc:
+            raise SessionError(f"Could not start '{args[0]}' on {session.display}: {exc}") from exc
+
+    def _start_browser(self, session: DesktopSession) -> None:
+        if not self.browser:
+            return
+        session.profile_dir = Path(tempfile.mkdtemp(prefix=f"agent-session-{session.number}-"))
+        session.browser = self._spawn(self.browser, session)
+
+    def _stop_browser(self, session: DesktopSession) -> None:
+        _stop(session.browser)
+        session.browser = None
+        if session.profile_dir is not None:
+            shutil.rmtree(session.profile_dir, ignore_errors=True)
+            session.profile_dir = None
+
+    def _terminate(self, session: DesktopSession) -> None:
+        self._stop_browser(session)
+        _stop(session.window_manager)
+        _stop(session.xvfb)
+        logger.info("Stopped desktop session %s", session.display)
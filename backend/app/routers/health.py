@@ -1,7 +1,14 @@
 from fastapi import APIRouter
 
+from app.pipeline import desktop_sessions
+
 router = APIRouter()
 
 @router.get("/", tags=["health"])
 def root():
     return {"status": "ok", "service": "visual-agent-backend"}
+
+
+@router.get("/api/sessions", tags=["health"])
+def sessions():
+    return desktop_sessions.status()
@@ -1,15 +1,35 @@
 from __future__ import annotations
 
 from datetime import datetime
+import hashlib
+import json
 import re
 from pathlib import Path
+from typing import TYPE_CHECKING, Literal, Optional, Union
 from uuid import uuid4
 
-from fastapi import APIRouter, BackgroundTasks, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, BackgroundTasks, File, Form, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import FileResponse
 
 from app.config import settings
+from app.pipeline.profiles import ProfileError, presets, resolve_profile
 from app.pipeline.runner import run_full_pipeline
-from app.schemas import LogEntry, RepromptRequest, RepromptResponse, RunResponse, StatusResponse
+from app.schemas import (
+    LogEntry,
+    ReplayRequest,
+    RepromptRequest,
+    RepromptResponse,
+    RunCounters,
+    RunRequest,
+    RunResponse,
+    SlimStatusResponse,
+    StatusResponse,
+)
+from app.storage import blob_store, resolve_artifact, run_index
+from app.storage.retention import IMAGE_SUFFIXES
+
+if TYPE_CHECKING:
+    from app.agent.workflow import Workflow
 
 router = APIRouter(prefix="/api", tags=["pipeline"])
 
@@ -35,12 +55,41 @@ def _build_run_directory(prompt: str) -> Path:
     return run_dir
 
 
+def _run_options(profile: str | None, options: str | None) -> dict | None:
+    """Merge the ``profile`` form field into the JSON ``options`` object and check it resolves."""
+    try:
+        merged = json.loads(options) if options else {}
+    except json.JSONDecodeError as exc:
+        raise HTTPException(status_code=400, detail=f"options must be a JSON object: {exc}") from exc
+    if not isinstance(merged, dict):
+        raise HTTPException(status_code=400, detail="options must be a JSON object")
+    if profile:
+        merged["profile"] = profile
+    try:
+        resolve_profile(merged)
+    except ProfileError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return merged or None
+
+
+@router.get("/profiles")
+def list_profiles():
+    """Every named profile with the values a run using it would get."""
+    try:
+        return {name: resolve_profile({"profile": name}).to_dict() for name in presets()}
+    except ProfileError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+
 @router.post("/run", response_model=RunResponse)
 async def run_pipeline(
     background_tasks: BackgroundTasks,
     prompt: str = Form(...),
     file: UploadFile | None = File(None),
+    profile: str | None = Form(None),
+    options: str | None = Form(None, description="JSON object of per-run overrides, e.g. {\"max_iterations\": 5}"),
 ):
+    request = RunRequest(prompt=prompt, options=_run_options(profile, options))
     run_id = str(uuid4())
     run_dir = _build_run_directory(prompt)
     screenshots_dir = run_dir / "screenshots"
@@ -54,8 +103,13 @@ async def run_pipeline(
 
     if file:
         destination = uploads_dir / file.filename
-        with destination.open("wb") as f:
-            f.write(await file.read())
+        data = await file.read()
+        if blob_store is not None:
+            # The same attachment uploaded to many runs is stored once.
+            blob_store.put_bytes(data, destination, Path(file.filename).suffix.lower())
+        else:
+            with destination.open("wb") as f:
+                f.write(data)
         file_path = str(destination)
 
     RUNS[run_id] = {
@@ -67,7 +121,11 @@ async def run_pipeline(
         "clarifications": [],
         "pending_question": None,
         "run_dir": str(run_dir),
+        # Bumped on every change to the run; the status ETags are derived from it.
+        "version": 0,
+        "options": request.options,
     }
+    run_index.upsert(run_id, run_dir=str(run_dir), prompt=prompt, status="running", mode="plan", started_at=datetime.utcnow().isoformat())
 
     background_tasks.add_task(
         real_pipeline,
@@ -76,6 +134,7 @@ async def run_pipeline(
         file_path,
         str(run_dir),
         RUNS[run_id]["clarifications"].copy(),
+        options=request.options,
     )
     return RunResponse(
         run_id=run_id,
@@ -92,8 +151,20 @@ def real_pipeline(
     file_path: str | None = None,
     run_dir: str | Path | None = None,
     clarifications: list[str] | None = None,
+    workflow: Workflow | None = None,
+    variables: dict[str, str] | None = None,
+    options: dict | None = None,
 ):
-    result = run_full_pipeline(run_id, prompt, file_path, clarifications=clarifications, run_dir=run_dir)
+    result = run_full_pipeline(
+        run_id,
+        prompt,
+        file_path,
+        clarifications=clarifications,
+        run_dir=run_dir,
+        workflow=workflow,
+        variables=variables,
+        options=options,
+    )
     run = RUNS.get(run_id)
     if not run:
         return
@@ -101,22 +172,138 @@ def real_pipeline(
     run["logs"].extend(result["logs"])
     run["result"] = result["result"]
     run["pending_question"] = result.get("pending_question")
+    run["version"] = run.get("version", 0) + 1
 
 
-@router.get("/status/{run_id}", response_model=StatusResponse)
-async def get_status(run_id: str):
+def _get_run(run_id: str) -> dict:
     run = RUNS.get(run_id)
     if not run:
         raise HTTPException(status_code=404, detail="Run ID not found")
-    return StatusResponse(
+    return run
+
+
+def _screenshot_paths(run: dict) -> list[str]:
+    result = run.get("result") or {}
+    if result.get("screenshots"):
+        # Retention may have recompressed the recorded PNGs to another format since.
+        return [(resolve_artifact(path) or Path(path)).as_posix() for path in result["screenshots"]]
+    # Still running: whatever has been captured so far, oldest first.
+    shots = Path(run["run_dir"]) / "screenshots"
+    if not shots.exists():
+        return []
+    found = [path for suffix in IMAGE_SUFFIXES for path in shots.glob(f"*{suffix}")]
+    return [path.as_posix() for path in sorted(found, key=lambda path: path.stat().st_mtime)]
+
+
+def _etag(run_id: str, run: dict, *parts: object) -> str:
+    """Weak validator from the run's version, so unchanged polls cost a 304."""
+    # Screenshots land on disk while a run is in progress, without a version bump.
+    captured = len(_screenshot_paths(run)) if run["status"] == "running" else None
+    stamp = (run_id, run.get("version", 0), run["status"], len(run["logs"]), captured, parts)
+    return f'W/"{hashlib.blake2b(repr(stamp).encode(), digest_size=8).hexdigest()}"'
+
+
+def _not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+
+@router.get("/status/{run_id}", response_model=Union[StatusResponse, SlimStatusResponse])
+async def get_status(
+    run_id: str,
+    request: Request,
+    response: Response,
+    view: Literal["full", "slim"] = "full",
+    since: Optional[int] = Query(None, ge=0, description="Slim view: only logs after this cursor"),
+    tail: int = Query(20, ge=0, le=500, description="Slim view: at most this many logs (the latest, or the next after ``since``)"),
+):
+    run = _get_run(run_id)
+    cached = _not_modified(request, response, _etag(run_id, run, view, since, tail))
+    if cached is not None:
+        return cached
+    if view == "full":
+        return StatusResponse(
+            run_id=run_id,
+            status=run["status"],
+            logs=run["logs"],
+            result=run.get("result"),
+            pending_question=run.get("pending_question"),
+        )
+    logs = run["logs"]
+    if since is None:
+        recent = logs[-tail:] if tail else []
+        cursor = len(logs)
+    else:
+        # Oldest first, so a poller that falls more than ``tail`` behind catches up over several calls.
+        start = min(since, len(logs))
+        recent = logs[start : start + tail]
+        cursor = start + len(recent)
+    result = run.get("result") or {}
+    return SlimStatusResponse(
         run_id=run_id,
         status=run["status"],
-        logs=run["logs"],
-        result=run.get("result"),
+        counters=RunCounters(
+            logs=len(logs),
+            actions=len(result.get("actions") or ()),
+            screenshots=len(_screenshot_paths(run)),
+            elements=len(result.get("elements") or ()),
+        ),
+        logs=recent,
+        cursor=cursor,
+        final_message=result.get("final_message"),
         pending_question=run.get("pending_question"),
     )
 
 
+def _page(run_id: str, field: str, request: Request, response: Response, offset: int, limit: int):
+    run = _get_run(run_id)
+    cached = _not_modified(request, response, _etag(run_id, run, field, offset, limit))
+    if cached is not None:
+        return cached
+    items = (run.get("result") or {}).get(field) or []
+    return {"total": len(items), "offset": offset, "limit": limit, "items": items[offset : offset + limit]}
+
+
+@router.get("/status/{run_id}/actions")
+async def get_status_actions(
+    run_id: str,
+    request: Request,
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    return _page(run_id, "actions", request, response, offset, limit)
+
+
+@router.get("/status/{run_id}/elements")
+async def get_status_elements(
+    run_id: str,
+    request: Request,
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    return _page(run_id, "elements", request, response, offset, limit)
+
+
+@router.get("/status/{run_id}/screenshots/{index}")
+async def get_status_screenshot(run_id: str, index: int):
+    """The ``index``-th screenshot of the run (negative counts from the latest)."""
+    paths = _screenshot_paths(_get_run(run_id))
+    try:
+        path = Path(paths[index])
+    except IndexError as exc:
+        raise HTTPException(status_code=404, detail=f"Run has {len(paths)} screenshots") from exc
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Screenshot no longer on disk")
+    # A fixed index always names the same file; "-1" moves as the run captures more.
+    cache = "private, max-age=3600" if index >= 0 else "no-cache"
+    return FileResponse(path, headers={"Cache-Control": cache})
+
+
 @router.post("/reprompt", response_model=RepromptResponse)
 async def handle_reprompt(payload: RepromptRequest, background_tasks: BackgroundTasks):
     run = RUNS.get(payload.run_id)
@@ -128,6 +315,8 @@ async def handle_reprompt(payload: RepromptRequest, background_tasks: Background
     run["clarifications"].append(payload.message)
     run["pending_question"] = None
     run["status"] = "running"
+    run["version"] = run.get("version", 0) + 1
+    run_index.update(payload.run_id, status="running")
 
     background_tasks.add_task(
         real_pipeline,
@@ -136,6 +325,80 @@ async def handle_reprompt(payload: RepromptRequest, background_tasks: Background
         run.get("file_path"),
         run.get("run_dir"),
         run["clarifications"].copy(),
+        options=run.get("options"),
     )
 
     return RepromptResponse(acknowledged=True, message="User input received")
+
+
+def _load_workflow(run: dict) -> Workflow:
+    from app.agent.workflow import Workflow, compile_run
+
+    workflow_path = Path(run["run_dir"]) / "workflow.json"
+    if workflow_path.exists():
+        return Workflow.load(workflow_path)
+    workflow = compile_run(run["run_dir"])
+    workflow.save(workflow_path)
+    return workflow
+
+
+@router.post("/runs/{run_id}/workflow")
+async def export_workflow(run_id: str):
+    run = RUNS.get(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run ID not found")
+    from app.agent.workflow import WorkflowError, compile_run
+
+    try:
+        workflow = compile_run(run["run_dir"])
+    except WorkflowError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    workflow.save(Path(run["run_dir"]) / "workflow.json")
+    return workflow.to_dict()
+
+
+@router.post("/replay", response_model=RunResponse)
+async def replay_workflow(payload: ReplayRequest, background_tasks: BackgroundTasks):
+    source = RUNS.get(payload.source_run_id)
+    if not source:
+        raise HTTPException(status_code=404, detail="Run ID not found")
+    from app.agent.workflow import WorkflowError
+
+    try:
+        workflow = _load_workflow(source)
+    except WorkflowError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    try:
+        resolve_profile(payload.options)
+    except ProfileError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    run_id = str(uuid4())
+    run_dir = _build_run_directory(workflow.prompt or workflow.name)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    RUNS[run_id] = {
+        "status": "running",
+        "logs": [LogEntry(stage="queued", message=f"Replay of {payload.source_run_id} submitted", timestamp=datetime.utcnow())],
+        "result": None,
+        "prompt": workflow.prompt,
+        "file_path": None,
+        "clarifications": list(workflow.clarifications),
+        "pending_question": None,
+        "run_dir": str(run_dir),
+        # Bumped on every change to the run; the status ETags are derived from it.
+        "version": 0,
+        "options": payload.options,
+    }
+    run_index.upsert(run_id, run_dir=str(run_dir), prompt=workflow.prompt, status="running", mode="replay", started_at=datetime.utcnow().isoformat())
+    background_tasks.add_task(
+        real_pipeline,
+        run_id,
+        workflow.prompt,
+        None,
+        str(run_dir),
+        RUNS[run_id]["clarifications"].copy(),
+        workflow,
+        payload.variables,
+        payload.options,
+    )
+    return RunResponse(run_id=run_id, status="running", logs=RUNS[run_id]["logs"], result=None, pending_question=None)
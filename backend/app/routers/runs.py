@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse, Response
+
+from app.storage import list_overlays, overlay_renderer, retention, run_index
+
+router = APIRouter(prefix="/api", tags=["runs"])
+
+
+@router.get("/runs")
+def list_runs(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    status: Optional[str] = None,
+):
+    items, total = run_index.list(offset=offset, limit=limit, status=status)
+    return {"total": total, "offset": offset, "limit": limit, "items": items}
+
+
+@router.get("/runs/{run_id}")
+def get_run(run_id: str):
+    run = run_index.get(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run ID not found")
+    return run
+
+
+def _run_dir(run_id: str) -> Path:
+    run = run_index.get(run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run ID not found")
+    return Path(run["run_dir"])
+
+
+@router.get("/runs/{run_id}/overlays")
+def get_overlays(run_id: str):
+    return {"overlays": list_overlays(_run_dir(run_id))}
+
+
+@router.get("/runs/{run_id}/overlays/{name}")
+def render_overlay(
+    run_id: str,
+    name: str,
+    ids: Optional[str] = Query(None, description="Comma-separated element ids to draw"),
+    types: Optional[str] = Query(None, description="Comma-separated element types to draw"),
+    scale: float = Query(1.0, gt=0, le=1),
+):
+    try:
+        element_ids = [int(part) for part in ids.split(",") if part.strip()] if ids else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="ids must be integers") from exc
+    try:
+        data = overlay_renderer.render(
+            _run_dir(run_id),
+            name,
+            element_ids=element_ids,
+            types=[part.strip() for part in types.split(",") if part.strip()] if types else None,
+            scale=scale,
+        )
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return Response(content=data, media_type="image/png", headers={"Cache-Control": "private, max-age=3600"})
+
+
+@router.get("/runs/{run_id}/trace")
+def get_trace(run_id: str):
+    """Chrome trace JSON for the run; load it in chrome://tracing or ui.perfetto.dev."""
+    path = _run_dir(run_id) / "trace.json"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="No trace recorded for this run (AGENT_TRACE=false)")
+    return FileResponse(path, media_type="application/json", filename=f"{run_id}-trace.json")
+
+
+@router.get("/runs/{run_id}/profile")
+def get_profile(run_id: str):
+    path = _run_dir(run_id) / "profile.pstats"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="No profile recorded for this run (AGENT_PROFILE=false)")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{run_id}.pstats")
+
+
+@router.post("/runs/maintenance")
+def run_maintenance(rebuild: bool = False):
+    """Re-index (optionally) and apply retention/recompression immediately."""
+    indexed = run_index.rebuild(retention.runs_dir) if rebuild else None
+    stats = retention.sweep()
+    return {"indexed": indexed, **stats}
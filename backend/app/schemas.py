@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any, List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -21,7 +21,7 @@ class RunRequest(BaseModel):
 
 class RunResponse(BaseModel):
     run_id: str
-    status: Literal["queued", "running", "success", "error", "needs_input"]
+    status: Literal["queued", "running", "success", "error", "needs_input", "timeout"]
     logs: List[LogEntry] = []
     result: Optional[Any] = None
     pending_question: Optional[str] = None
@@ -30,12 +30,31 @@ class RunResponse(BaseModel):
 
 class StatusResponse(BaseModel):
     run_id: str
-    status: Literal["queued", "running", "success", "error", "needs_input"]
+    status: Literal["queued", "running", "success", "error", "needs_input", "timeout"]
     logs: List[LogEntry]
     result: Optional[Any] = None
     pending_question: Optional[str] = None
 
 
+class RunCounters(BaseModel):
+    logs: int = 0
+    actions: int = 0
+    screenshots: int = 0
+    elements: int = 0
+
+
+class SlimStatusResponse(BaseModel):
+    """Poll-friendly status: counters and recent logs; heavy fields have their own endpoints."""
+
+    run_id: str
+    status: Literal["queued", "running", "success", "error", "needs_input", "timeout"]
+    counters: RunCounters
+    logs: List[LogEntry]
+    cursor: int
+    final_message: Optional[str] = None
+    pending_question: Optional[str] = None
+
+
 class RepromptRequest(BaseModel):
     run_id: str
     message: str
@@ -44,3 +63,9 @@ class RepromptRequest(BaseModel):
 class RepromptResponse(BaseModel):
     acknowledged: bool
     message: Optional[str] = None
+
+
+class ReplayRequest(BaseModel):
+    source_run_id: str
+    variables: Dict[str, str] = {}
+    options: Optional[dict] = None
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+"""Run artifact storage: the run index, the content-addressed blob store and retention policy."""
+
+from app.config import settings
+
+from .blobs import BlobStore
+from .index import RunIndex
+from .overlays import OverlayRenderer, list_overlays
+from .retention import RetentionManager, resolve_artifact
+
+run_index = RunIndex(settings.AGENT_RUNS_INDEX)
+blob_store = BlobStore(settings.AGENT_BLOB_DIR) if settings.AGENT_BLOB_STORE else None
+retention = RetentionManager(
+    settings.AGENT_RUNS_DIR,
+    run_index,
+    max_age_days=settings.AGENT_RETENTION_MAX_AGE_DAYS,
+    max_total_bytes=settings.AGENT_RETENTION_MAX_BYTES,
+    image_format=settings.AGENT_RECOMPRESS_FORMAT,
+    quality=settings.AGENT_RECOMPRESS_QUALITY,
+    interval=settings.AGENT_RETENTION_INTERVAL,
+    blobs=blob_store,
+)
+overlay_renderer = OverlayRenderer(max_entries=settings.AGENT_OVERLAY_CACHE_SIZE)
+
+__all__ = [
+    "BlobStore",
+    "OverlayRenderer",
+    "RunIndex",
+    "RetentionManager",
+    "blob_store",
+    "list_overlays",
+    "overlay_renderer",
+    "resolve_artifact",
+    "retention",
+    "run_index",
+]
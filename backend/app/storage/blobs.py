@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+"""Content-addressed blob store for run artifacts.
+
+Every distinct image or file is stored once as ``<root>/<ab>/<digest><suffix>``; run directories
+hold hard links to it, so a frame that does not change between iterations (or between runs) costs
+one inode, not one PNG per save. The link count is the reference count: a blob whose only link is
+the store's own has no run left pointing at it and is removed by :meth:`BlobStore.gc`.
+
+Images are keyed by their decoded pixels, so an identical frame is recognized before it is encoded.
+Where hard links are not possible (another filesystem) the blob is copied instead.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def image_digest(image: Image.Image) -> str:
+    """Digest of an image's mode, size and raw pixels (independent of how it would be encoded)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.width}x{image.height}:".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Hash-named blobs under ``root`` with run files as hard links into it."""
+
+    def __init__(self, root: str | Path, *, gc_grace: float = 300.0) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Blobs younger than this are never collected: a writer may not have linked them yet.
+        self.gc_grace = gc_grace
+        self._lock = threading.Lock()
+
+    def path(self, digest: str, suffix: str = ".png") -> Path:
+        return self.root / digest[:2] / f"{digest}{suffix}"
+
+    def put_image(self, image: Image.Image, dst: str | Path, **save_options) -> str:
+        """Store ``image`` as PNG (encoding it only if no identical frame is stored) and link it at ``dst``."""
+        digest = image_digest(image)
+        blob = self.path(digest)
+        self._store(blob, dst, lambda: self._write(blob, lambda handle: image.save(handle, format="PNG", **save_options)))
+        return digest
+
+    def put_bytes(self, data: bytes, dst: str | Path, suffix: str = "") -> str:
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        blob = self.path(digest, suffix)
+        self._store(blob, dst, lambda: self._write(blob, lambda handle: handle.write(data)))
+        return digest
+
+    def put_file(self, src: str | Path, dst: Optional[str | Path] = None) -> str:
+        """Move ``src`` into the store (or reuse the identical blob) and link it back at ``dst`` (default ``src``)."""
+        src = Path(src)
+        digest = hashlib.blake2b(digest_size=16)
+        with src.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(1 << 20), b""):
+                digest.update(chunk)
+        blob = self.path(digest.hexdigest(), src.suffix.lower())
+
+        def create() -> None:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(src, blob)
+            except FileExistsError:
+                pass
+            except OSError:
+                shutil.copyfile(src, blob)
+
+        self._store(blob, dst or src, create)
+        return digest.hexdigest()
+
+    def _store(self, blob: Path, dst: str | Path, create) -> None:
+        """Link ``dst`` to ``blob``, calling ``create`` first if the blob is missing.
+
+        The existence check and the link happen under the lock :meth:`gc` holds, so a blob cannot be
+        collected between the two; creating it (encoding, copying) stays outside the lock.
+        """
+        while True:
+            with self._lock:
+                if blob.exists():
+                    self.link(blob, dst)
+                    return
+            create()
+
+    def _write(self, blob: Path, writer) -> None:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=blob.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                writer(handle)
+            # Concurrent writers of the same digest produce the same bytes; the last rename wins.
+            os.replace(tmp, blob)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def link(self, blob: Path, dst: str | Path) -> None:
+        """Point ``dst`` at ``blob``, replacing whatever ``dst`` was (callers hold the lock, see :meth:`_store`)."""
+        dst = Path(dst)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if dst.exists() and os.path.samefile(blob, dst):
+            return
+        tmp = dst.with_name(f".{dst.name}.link")
+        tmp.unlink(missing_ok=True)
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            shutil.copyfile(blob, tmp)
+        os.replace(tmp, dst)
+
+    @staticmethod
+    def references(path: str | Path) -> int:
+        """How many run files point at the blob behind ``path`` (0 for a copy or a plain file)."""
+        return max(0, os.stat(path).st_nlink - 1)
+
+    def gc(self) -> Dict[str, int]:
+        """Remove blobs no run links to any more."""
+        stats = {"blobs": 0, "removed": 0, "bytes_freed": 0}
+        cutoff = time.time() - self.gc_grace
+        with self._lock:
+            for blob in self.root.glob("??/*"):
+                if blob.name.startswith("."):
+                    continue  # a writer's temp file, renamed into place by _write
+                try:
+                    info = blob.stat()
+                except FileNotFoundError:
+                    continue
+                stats["blobs"] += 1
+                if info.st_nlink > 1 or info.st_mtime > cutoff:
+                    continue
+                blob.unlink(missing_ok=True)
+                stats["removed"] += 1
+                stats["bytes_freed"] += info.st_size
+        return stats
+
+    def usage(self) -> Dict[str, int]:
+        blobs = size = links = 0
+        for blob in self.root.glob("??/*"):
+            try:
+                info = blob.stat()
+            except FileNotFoundError:
+                continue
+            blobs += 1
+            size += info.st_size
+            links += info.st_nlink - 1
+        return {"blobs": blobs, "bytes": size, "references": links}
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+"""SQLite index of runs so listings never walk the runs directory."""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    run_dir TEXT NOT NULL,
+    prompt TEXT,
+    status TEXT NOT NULL,
+    mode TEXT,
+    started_at TEXT,
+    finished_at TEXT,
+    duration REAL,
+    artifact_bytes INTEGER DEFAULT 0,
+    compressed INTEGER DEFAULT 0,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at DESC);
+CREATE INDEX IF NOT EXISTS runs_status ON runs (status, started_at DESC);
+"""
+
+COLUMNS = (
+    "run_id",
+    "run_dir",
+    "prompt",
+    "status",
+    "mode",
+    "started_at",
+    "finished_at",
+    "duration",
+    "artifact_bytes",
+    "compressed",
+    "updated_at",
+)
+
+FINISHED_STATUSES = ("success", "error", "timeout")
+
+
+def directory_size(path: str | Path) -> int:
+    total = 0
+    stack = [str(path)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            continue
+    return total
+
+
+class RunIndex:
+    def __init__(self, db_path: str | Path) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def upsert(self, run_id: str, **fields: Any) -> None:
+        fields = {key: value for key, value in fields.items() if key in COLUMNS and key != "run_id"}
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        names = ["run_id", *fields]
+        placeholders = ", ".join("?" for _ in names)
+        updates = ", ".join(f"{name} = excluded.{name}" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO runs ({', '.join(names)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(run_id) DO UPDATE SET {updates}",
+                [run_id, *fields.values()],
+            )
+
+    def update(self, run_id: str, **fields: Any) -> None:
+        """Update columns of an already indexed run; unknown runs are ignored."""
+        fields = {key: value for key, value in fields.items() if key in COLUMNS and key != "run_id"}
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE runs SET {assignments} WHERE run_id = ?", [*fields.values(), run_id])
+
+    def record_run(self, run_dir: str | Path) -> Optional[Dict[str, Any]]:
+        """Index (or refresh) a run from its ``run.json`` summary."""
+        run_dir = Path(run_dir)
+        summary_path = run_dir / "run.json"
+        if not summary_path.exists():
+            return None
+        summary = json.loads(summary_path.read_text(encoding="utf-8"))
+        duration = None
+        if summary.get("started_at") and summary.get("finished_at"):
+            started = datetime.fromisoformat(summary["started_at"])
+            finished = datetime.fromisoformat(summary["finished_at"])
+            duration = (finished - started).total_seconds()
+        self.upsert(
+            summary["run_id"],
+            run_dir=str(run_dir),
+            prompt=summary.get("prompt"),
+            status=summary.get("status", "unknown"),
+            mode=summary.get("mode"),
+            started_at=summary.get("started_at"),
+            finished_at=summary.get("finished_at"),
+            duration=duration,
+            artifact_bytes=directory_size(run_dir),
+        )
+        return self.get(summary["run_id"])
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, offset: int = 0, limit: int = 50, status: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        where, params = ("WHERE status = ?", [status]) if status else ("", [])
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM runs {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM runs {where} ORDER BY started_at DESC LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def finished(self, *, compressed: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Finished runs, oldest first."""
+        query = f"SELECT * FROM runs WHERE status IN ({', '.join('?' for _ in FINISHED_STATUSES)})"
+        params: List[Any] = list(FINISHED_STATUSES)
+        if compressed is not None:
+            query += " AND compressed = ?"
+            params.append(int(compressed))
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY started_at ASC", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return int(self._conn.execute("SELECT COALESCE(SUM(artifact_bytes), 0) FROM runs").fetchone()[0])
+
+    def delete(self, run_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+    def rebuild(self, runs_dir: str | Path) -> int:
+        """Re-index every run directory that has a ``run.json``."""
+        count = 0
+        for summary in Path(runs_dir).glob("*/run.json"):
+            if self.record_run(summary.parent):
+                count += 1
+        return count
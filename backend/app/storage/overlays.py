@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+"""On-demand rendering of OmniParser debug overlays from stored element snapshots."""
+
+import io
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from .retention import resolve_artifact
+
+OVERLAY_DIR = Path("logs") / "omniparser"
+
+
+def list_overlays(run_dir: str | Path) -> List[str]:
+    return sorted(path.stem for path in (Path(run_dir) / OVERLAY_DIR).glob("*.json"))
+
+
+class OverlayRenderer:
+    """Renders ``logs/omniparser/<name>.json`` snapshots to PNG, keeping an LRU of results."""
+
+    def __init__(self, max_entries: int = 64) -> None:
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(
+        self,
+        run_dir: str | Path,
+        name: str,
+        *,
+        element_ids: Optional[Iterable[int]] = None,
+        types: Optional[Iterable[str]] = None,
+        scale: float = 1.0,
+    ) -> bytes:
+        snapshot_path = Path(run_dir) / OVERLAY_DIR / f"{Path(name).name}.json"
+        if not snapshot_path.exists():
+            raise FileNotFoundError(f"No element snapshot named {name}")
+        ids = frozenset(int(i) for i in element_ids) if element_ids else None
+        kinds = frozenset(types) if types else None
+        key = (str(snapshot_path), snapshot_path.stat().st_mtime_ns, ids, kinds, round(scale, 3))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        snapshot = json.loads(snapshot_path.read_text(encoding="utf-8"))
+        frame = resolve_artifact(snapshot["frame"])
+        if frame is None:
+            raise FileNotFoundError(f"Frame for {name} is no longer available")
+        elements = [
+            elem
+            for elem in snapshot.get("elements", [])
+            if (ids is None or elem.get("element_id") in ids) and (kinds is None or elem.get("type") in kinds)
+        ]
+        # Imported on first render so serving run listings never loads the OmniParser client stack.
+        from omniparser_tool import render_omniparser_boxes
+
+        img = render_omniparser_boxes(frame, elements, scale=scale)
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        data = buffer.getvalue()
+
+        with self._lock:
+            self._cache[key] = data
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return data
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+"""Age/size quotas and background image recompression for finished runs."""
+
+import io
+import json
+import logging
+import shutil
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from .blobs import BlobStore
+from .index import RunIndex, directory_size
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIRS = ("screenshots", "logs/omniparser")
+IMAGE_SUFFIXES = (".png", ".webp", ".jpg", ".jpeg")
+
+
+def resolve_artifact(path: str | Path) -> Optional[Path]:
+    """Find an image artifact even if it was recompressed to another format since it was recorded."""
+    path = Path(path)
+    if path.exists():
+        return path
+    for suffix in IMAGE_SUFFIXES:
+        candidate = path.with_suffix(suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+class RetentionManager:
+    """Applies retention quotas and recompresses finished runs' images.
+
+    ``sweep`` is idempotent; ``start`` runs it on a background thread every
+    ``interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        runs_dir: str | Path,
+        index: RunIndex,
+        *,
+        max_age_days: float = 0,
+        max_total_bytes: int = 0,
+        image_format: str = "webp",
+        quality: int = 80,
+        interval: float = 600.0,
+        blobs: Optional[BlobStore] = None,
+    ) -> None:
+        self.runs_dir = Path(runs_dir)
+        self.index = index
+        self.max_age_days = max_age_days
+        self.max_total_bytes = max_total_bytes
+        self.image_format = image_format.lower().strip()
+        self.quality = quality
+        self.interval = interval
+        self.blobs = blobs
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sweep(self) -> Dict[str, int]:
+        stats = {"recompressed": 0, "deleted": 0, "bytes_freed": 0}
+        if self.image_format:
+            for run in self.index.finished(compressed=False):
+                before = run.get("artifact_bytes") or 0
+                try:
+                    self.recompress(run["run_dir"])
+                except Exception as exc:
+                    logger.warning("Recompression failed for %s: %s", run["run_dir"], exc)
+                    continue
+                after = directory_size(run["run_dir"])
+                self.index.update(run["run_id"], compressed=1, artifact_bytes=after)
+                stats["recompressed"] += 1
+                stats["bytes_freed"] += max(0, before - after)
+        for run in self._expired_runs():
+            stats["bytes_freed"] += run.get("artifact_bytes") or 0
+            self.delete_run(run)
+            stats["deleted"] += 1
+        if self.blobs is not None:
+            collected = self.blobs.gc()
+            stats["blobs_removed"] = collected["removed"]
+            stats["bytes_freed"] += collected["bytes_freed"]
+        return stats
+
+    def recompress(self, run_dir: str | Path) -> int:
+        """Convert PNG artifacts to the configured lossy format and rewrite references in ``logs/actions.json``."""
+        run_dir = Path(run_dir)
+        renamed: Dict[str, str] = {}
+        suffix = ".jpg" if self.image_format in {"jpeg", "jpg"} else f".{self.image_format}"
+        pil_format = "JPEG" if suffix == ".jpg" else self.image_format.upper()
+        encoded: Dict[Tuple[int, int], bytes] = {}
+        for folder in IMAGE_DIRS:
+            for src in sorted((run_dir / folder).glob("*.png")):
+                dst = src.with_suffix(suffix)
+                info = src.stat()
+                if self.blobs is not None and info.st_nlink > 1:
+                    # A blob-store link: encode each distinct frame once and keep the result shared.
+                    key = (info.st_dev, info.st_ino)
+                    if key not in encoded:
+                        buffer = io.BytesIO()
+                        with Image.open(src) as img:
+                            img.convert("RGB").save(buffer, format=pil_format, quality=self.quality)
+                        encoded[key] = buffer.getvalue()
+                    self.blobs.put_bytes(encoded[key], dst, suffix)
+                else:
+                    with Image.open(src) as img:
+                        img.convert("RGB").save(dst, format=pil_format, quality=self.quality)
+                src.unlink()
+                renamed[str(src)] = str(dst)
+        if renamed:
+            self._rewrite_references(run_dir / "logs" / "actions.json", renamed)
+            for snapshot in (run_dir / "logs" / "omniparser").glob("*.json"):
+                self._rewrite_references(snapshot, renamed)
+        return len(renamed)
+
+    @staticmethod
+    def _rewrite_references(path: Path, renamed: Dict[str, str]) -> None:
+        if not path.exists():
+            return
+        text = path.read_text(encoding="utf-8")
+        for old, new in renamed.items():
+            text = text.replace(json.dumps(old)[1:-1], json.dumps(new)[1:-1])
+        path.write_text(text, encoding="utf-8")
+
+    def _expired_runs(self) -> List[dict]:
+        finished = self.index.finished()
+        doomed: Dict[str, dict] = {}
+        if self.max_age_days > 0:
+            cutoff = (datetime.utcnow() - timedelta(days=self.max_age_days)).isoformat()
+            for run in finished:
+                if (run.get("finished_at") or run.get("started_at") or "") < cutoff:
+                    doomed[run["run_id"]] = run
+        if self.max_total_bytes > 0:
+            total = self.index.total_bytes() - sum(run.get("artifact_bytes") or 0 for run in doomed.values())
+            for run in finished:
+                if total <= self.max_total_bytes:
+                    break
+                if run["run_id"] in doomed:
+                    continue
+                doomed[run["run_id"]] = run
+                total -= run.get("artifact_bytes") or 0
+        return list(doomed.values())
+
+    def delete_run(self, run: dict) -> None:
+        run_dir = Path(run["run_dir"]).resolve()
+        # Never delete outside the runs root, whatever the index says.
+        if self.runs_dir.resolve() in run_dir.parents:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        self.index.delete(run["run_id"])
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="run-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                stats = self.sweep()
+                if any(stats.values()):
+                    logger.info("Run retention sweep: %s", stats)
+            except Exception:
+                logger.exception("Run retention sweep failed")
+            self._stop.wait(self.interval)
@@ -8,9 +8,14 @@ import os
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+import numpy as np
 import requests
 from PIL import Image, ImageDraw, ImageFont
 
+from app.agent import tracing
+from app.agent.dedup import deduplicate
+from app.agent.elements import ElementTable, StringTable
+
 
 class OmniParserError(RuntimeError):
     pass
@@ -24,6 +29,9 @@ class OmniParserClient:
         bbox_threshold: float = 0.001,
         iou_threshold: float = 0.4,
         session: Optional[requests.Session] = None,
+        timeout: float = 60.0,
+        dedup: bool = True,
+        min_confidence: float = 0.0,
     ) -> None:
         self.api_url = api_url or os.getenv("HF_OMNIPARSER_URL")
         self.api_token = api_token or os.getenv("HF_API_TOKEN")
@@ -31,9 +39,13 @@ class OmniParserClient:
             raise OmniParserError("OmniParser credentials are not configured")
         self.bbox_threshold = bbox_threshold
         self.iou_threshold = iou_threshold
+        self.dedup = dedup
+        self.min_confidence = min_confidence
         self.session = session or requests.Session()
+        self.timeout = timeout
+        self.strings = StringTable()
 
-    def analyze(self, image_path: str | Path) -> Dict[str, Any]:
+    def analyze(self, image_path: str | Path, timeout: Optional[float] = None) -> Dict[str, Any]:
         path = Path(image_path)
         if not path.exists():
             raise FileNotFoundError(f"Screenshot not found: {path}")
@@ -57,78 +69,107 @@ class OmniParserClient:
             "Content-Type": "application/json",
         }
 
-        response = self.session.post(self.api_url, headers=headers, json=payload, timeout=60)
+        with tracing.span("omniparser.request", category="network", request_bytes=len(encoded)) as request:
+            try:
+                response = self.session.post(self.api_url, headers=headers, json=payload, timeout=timeout or self.timeout)
+            except requests.RequestException as exc:
+                raise OmniParserError(f"OmniParser request failed: {exc}") from exc
+            request.set(status=response.status_code, response_bytes=len(response.content))
         if response.status_code >= 400:
             raise OmniParserError(f"OmniParser request failed: {response.status_code} {response.text}")
 
         data = response.json()
-        elements = self._normalize_elements(data.get("bboxes", []), width, height)
-        return {"elements": elements, "raw": data, "image_size": (width, height)}
+        elements = self._normalize_elements(data.get("bboxes", []), width, height, self.strings)
+        return self.clean({"elements": elements, "raw": data, "image_size": (width, height)})
+
+    def clean(self, result: Dict[str, Any], *, min_confidence: Optional[float] = None) -> Dict[str, Any]:
+        """Run the local dedup pass over a perception result (remote or from the local fallback)."""
+        if not self.dedup:
+            return result
+        elements = result["elements"]
+        # The server's own NMS leaves icon/label pairs and padded duplicates of one widget.
+        with tracing.span("dedup", elements=len(elements)) as traced:
+            result["elements"], stats = deduplicate(
+                elements,
+                iou_threshold=self.iou_threshold,
+                min_confidence=self.min_confidence if min_confidence is None else min_confidence,
+            )
+            result["dedup"] = stats.to_dict()
+            traced.set(removed=stats.removed)
+        return result
 
     @staticmethod
-    def _normalize_elements(raw_boxes: List[Dict[str, Any]], width: int, height: int) -> List[Dict[str, Any]]:
-        cleaned: List[Dict[str, Any]] = []
-        for idx, box in enumerate(raw_boxes):
-            bbox = box.get("bbox", [0, 0, 0, 0])
-            pixel_bbox = [
-                int(bbox[0] * width),
-                int(bbox[1] * height),
-                int(bbox[2] * width),
-                int(bbox[3] * height),
-            ]
-            cleaned.append(
-                {
-                    "element_id": idx + 1,
-                    "text": box.get("content", ""),
-                    "type": box.get("type", "unknown"),
-                    "bbox": pixel_bbox,
-                    "center": [
-                        int((pixel_bbox[0] + pixel_bbox[2]) / 2),
-                        int((pixel_bbox[1] + pixel_bbox[3]) / 2),
-                    ],
-                    "confidence": box.get("confidence", 0.0),
-                }
-            )
-        return cleaned
+    def _normalize_elements(
+        raw_boxes: List[Dict[str, Any]],
+        width: int,
+        height: int,
+        strings: Optional[StringTable] = None,
+    ) -> ElementTable:
+        if not raw_boxes:
+            return ElementTable.empty(strings)
+        ratios = np.asarray([(box.get("bbox") or [0, 0, 0, 0])[:4] for box in raw_boxes], dtype=np.float64)
+        pixel_boxes = (ratios * np.asarray([width, height, width, height], dtype=np.float64)).astype(np.int32)
+        return ElementTable.from_columns(
+            pixel_boxes,
+            [box.get("content", "") for box in raw_boxes],
+            [box.get("type", "unknown") for box in raw_boxes],
+            [box.get("confidence", 0.0) or 0.0 for box in raw_boxes],
+            strings=strings,
+        )
 
 
 def get_screen_elements(image_path: str | Path) -> List[Dict[str, Any]]:
     client = OmniParserClient()
-    return client.analyze(image_path)["elements"]
+    return client.analyze(image_path)["elements"].to_dicts()
 
 
-def draw_omniparser_boxes(
+def render_omniparser_boxes(
     image_path: str | Path,
-    elements: List[Dict[str, Any]],
-    output_path: str | Path,
-) -> None:
-    """Overlay OmniParser bounding boxes on a screenshot for debugging."""
+    elements: ElementTable | List[Dict[str, Any]],
+    scale: float = 1.0,
+) -> Image.Image:
+    """Return the screenshot with OmniParser boxes drawn on it, optionally downscaled."""
     src = Path(image_path)
-    dst = Path(output_path)
     if not src.exists():
         raise FileNotFoundError(f"Screenshot not found: {src}")
 
-    with Image.open(src).convert("RGB") as img:
-        draw = ImageDraw.Draw(img)
+    with Image.open(src) as opened:
+        img = opened.convert("RGB")
+    if 0 < scale < 1:
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.Resampling.BILINEAR)
+    else:
+        scale = 1.0
+
+    draw = ImageDraw.Draw(img)
+    font = None
+    try:
+        font = ImageFont.load_default()
+    except Exception:
         font = None
-        try:
-            font = ImageFont.load_default()
-        except Exception:
-            font = None
-
-        for elem in elements:
-            bbox = elem.get("bbox")
-            if not bbox or len(bbox) != 4:
-                continue
-            x1, y1, x2, y2 = bbox
-            draw.rectangle((x1, y1, x2, y2), outline="red", width=2)
-            label = f"{elem.get('element_id')}:{elem.get('type','')}"
-            if font:
-                draw.rectangle((x1, max(0, y1 - 14), x1 + len(label) * 6, y1), fill="red")
-                draw.text((x1 + 2, y1 - 12), label, fill="white", font=font)
-
-        dst.parent.mkdir(parents=True, exist_ok=True)
-        img.save(dst)
+
+    for elem in elements:
+        bbox = elem.get("bbox")
+        if not bbox or len(bbox) != 4:
+            continue
+        x1, y1, x2, y2 = (int(v * scale) for v in bbox)
+        draw.rectangle((x1, y1, x2, y2), outline="red", width=2)
+        label = f"{elem.get('element_id')}:{elem.get('type','')}"
+        if font:
+            draw.rectangle((x1, max(0, y1 - 14), x1 + len(label) * 6, y1), fill="red")
+            draw.text((x1 + 2, y1 - 12), label, fill="white", font=font)
+    return img
+
+
+def draw_omniparser_boxes(
+    image_path: str | Path,
+    elements: ElementTable | List[Dict[str, Any]],
+    output_path: str | Path,
+) -> None:
+    """Overlay OmniParser bounding boxes on a screenshot for debugging."""
+    dst = Path(output_path)
+    img = render_omniparser_boxes(image_path, elements)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    img.save(dst)
 
 
 if __name__ == "__main__":
@@ -140,4 +181,4 @@ if __name__ == "__main__":
 
     client = OmniParserClient()
     result = client.analyze(args.image)
-    print(json.dumps(result["elements"], indent=2))
+    print(json.dumps(result["elements"].to_dicts(), indent=2))
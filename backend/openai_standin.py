@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+"""Local OpenAI-compatible chat endpoint for exercising planner tiers without the real API.
+
+Each model name can be given a latency (plus random ``jitter``), told to return invalid plans,
+and made to fail: ``429`` / ``5xx`` reject that share of calls at random, and ``rpm`` enforces a
+requests-per-minute limit with the same ``x-ratelimit-*`` and ``retry-after`` headers as the real
+API. A cascade such as ``PLANNER_CASCADE=small@http://127.0.0.1:8010/v1,large@http://127.0.0.1:8010/v1``
+can be driven end to end, and bursts of runs can be pointed at a throttled model::
+
+    python openai_standin.py --model small:0.2:invalid --model large:1.5
+    python openai_standin.py --model gpt-4o-mini:0.5:jitter=1.0:429=0.2:rpm=30
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class ModelProfile:
+    latency: float = 0.0
+    invalid: bool = False
+    jitter: float = 0.0
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    rpm: int = 0
+    _calls: deque = field(default_factory=deque, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def admit(self) -> tuple[Optional[int], Dict[str, str]]:
+        """(error status or None, rate-limit headers) for one incoming call."""
+        headers: Dict[str, str] = {}
+        if self.rpm > 0:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= 60:
+                    self._calls.popleft()
+                reset = 60 - (now - self._calls[0]) if self._calls else 0.0
+                headers = {
+                    "x-ratelimit-limit-requests": str(self.rpm),
+                    "x-ratelimit-remaining-requests": str(max(0, self.rpm - len(self._calls) - 1)),
+                    "x-ratelimit-reset-requests": f"{reset:.3f}s",
+                }
+                if len(self._calls) >= self.rpm:
+                    headers["x-ratelimit-remaining-requests"] = "0"
+                    headers["retry-after-ms"] = str(int(reset * 1000))
+                    return 429, headers
+                self._calls.append(now)
+        if self.throttle_rate and random.random() < self.throttle_rate:
+            return 429, {**headers, "retry-after-ms": "500"}
+        if self.error_rate and random.random() < self.error_rate:
+            return 503, headers
+        return None, headers
+
+
+def parse_profile(spec: str) -> tuple[str, ModelProfile]:
+    """``name[:latency[:option...]]`` with options ``invalid``, ``jitter=s``, ``429=share``,
+    ``5xx=share`` and ``rpm=n``."""
+    name, *rest = spec.split(":")
+    profile = ModelProfile(latency=float(rest[0]) if rest and rest[0] else 0.0)
+    for option in rest[1:]:
+        key, _, value = option.partition("=")
+        if key == "invalid":
+            profile.invalid = True
+        elif key == "jitter":
+            profile.jitter = float(value)
+        elif key == "429":
+            profile.throttle_rate = float(value)
+        elif key == "5xx":
+            profile.error_rate = float(value)
+        elif key == "rpm":
+            profile.rpm = int(value)
+        else:
+            raise ValueError(f"Unknown stand-in option '{option}' in '{spec}'")
+    return name, profile
+
+
+def _error(status: int, headers: Dict[str, str]) -> JSONResponse:
+    kind, message = (
+        ("rate_limit_exceeded", "Rate limit reached (stand-in)") if status == 429 else ("server_error", "Injected server error (stand-in)")
+    )
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"message": message, "type": kind, "code": kind, "param": None}},
+        headers=headers,
+    )
+
+
+def _texts(messages: List[Dict[str, Any]]) -> List[str]:
+    texts: List[str] = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            texts.append(content)
+        elif isinstance(content, list):
+            texts.extend(part.get("text", "") for part in content if part.get("type") == "text")
+    return texts
+
+
+def _elements(texts: List[str]) -> List[Dict[str, Any]]:
+    """Reassemble the element JSON the planner splits into chunks, plus unchanged id:text refs."""
+    chunks = [text.split("\n", 1)[1] for text in texts if re.match(r"OmniParser element.* chunk \d+/\d+:", text)]
+    elements: List[Dict[str, Any]] = []
+    if chunks:
+        try:
+            data = json.loads("".join(chunks))
+        except json.JSONDecodeError:
+            data = []
+        if isinstance(data, dict):
+            data = (data.get("added") or []) + (data.get("changed") or [])
+        elements.extend(item for item in data if isinstance(item, dict))
+    for text in texts:
+        if text.startswith("Unchanged elements"):
+            for element_id, label in re.findall(r"(\d+):([^;\n]+)", text.split("\n", 1)[-1]):
+                elements.append({"element_id": int(element_id), "text": label.strip()})
+    return elements
+
+
+def _plan(elements: List[Dict[str, Any]], invalid: bool) -> Dict[str, Any]:
+    if invalid:
+        action = {"tool": "click", "element_id": 10**6, "explanation": "Click an element that does not exist"}
+    else:
+        target = next((elem for elem in elements if str(elem.get("text") or "").strip()), None)
+        if target is None:
+            action = {"tool": "wait", "wait_seconds": 0.1, "explanation": "Nothing to interact with yet"}
+        else:
+            action = {"tool": "click", "element_id": target["element_id"], "explanation": f"Click '{target['text']}'"}
+    return {"thinking": "Stand-in plan", "should_continue": False, "needs_user_input": False, "actions": [action]}
+
+
+def create_app(profiles: Optional[Dict[str, ModelProfile]] = None) -> FastAPI:
+    profiles = profiles or {}
+    seen_prefixes: set[str] = set()
+    app = FastAPI(title="openai-standin")
+
+    @app.get("/v1/models")
+    def list_models() -> Dict[str, Any]:
+        return {"object": "list", "data": [{"id": name, "object": "model"} for name in profiles]}
+
+    default = ModelProfile()
+
+    @app.post("/v1/chat/completions", response_model=None)
+    def chat_completions(body: Dict[str, Any], response: Response) -> Dict[str, Any] | JSONResponse:
+        model = body.get("model", "")
+        profile = profiles.get(model, default)
+        status, headers = profile.admit()
+        if status is not None:
+            return _error(status, headers)
+        response.headers.update(headers)
+        delay = profile.latency + (random.uniform(0, profile.jitter) if profile.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        messages = body.get("messages") or []
+        texts = _texts(messages)
+
+        # Approximate prompt caching: the system + first user message count as cached once seen.
+        prefix = json.dumps([body.get("tools"), messages[:2]], sort_keys=True)
+        digest = hashlib.sha256(f"{model}\n{prefix}".encode("utf-8")).hexdigest()
+        prompt_tokens = sum(len(text) for text in texts) // 4
+        cached_tokens = min(prompt_tokens, len(prefix) // 4) if digest in seen_prefixes else 0
+        seen_prefixes.add(digest)
+
+        arguments = _plan(_elements(texts), profile.invalid)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "tool_calls",
+                    "message": {
+                        "role": "assistant",
+                        "content": None,
+                        "tool_calls": [
+                            {
+                                "id": f"call_{uuid.uuid4().hex[:8]}",
+                                "type": "function",
+                                "function": {"name": "run_desktop_actions", "arguments": json.dumps(arguments)},
+                            }
+                        ],
+                    },
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": 40,
+                "total_tokens": prompt_tokens + 40,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stand-in for planner tiers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument(
+        "--model",
+        action="append",
+        default=[],
+        help="name[:latency[:option...]], repeatable (e.g. small:0.2:invalid, large:1.0:jitter=0.5:429=0.2:rpm=60)",
+    )
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(dict(parse_profile(spec) for spec in args.model)), host=args.host, port=args.port)
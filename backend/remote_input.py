@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+"""Toolbox input driver that acts on another machine over HTTP, plus the server it talks to.
+
+Run the server on the machine whose desktop should be driven::
+
+    python remote_input.py --port 8020            # pyautogui on the local desktop
+    python remote_input.py --display :101         # xdotool on an X display
+
+and point the API at it with ``AGENT_TOOLBOX_BACKEND=remote`` and
+``AGENT_REMOTE_INPUT_URL=http://host:8020``.
+
+Both sides share the secret in ``AGENT_REMOTE_INPUT_TOKEN``; the client sends it in the
+``X-Remote-Input-Token`` header. The server binds to loopback by default and refuses to
+listen on any other address without a token, since whoever reaches it controls the desktop.
+"""
+
+import hmac
+import io
+import ipaddress
+import os
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+TOKEN_HEADER = "X-Remote-Input-Token"
+
+
+class RemoteInput:
+    """Forwards click/type/hotkey/scroll/paste as ``POST /input`` and captures with ``GET /screenshot``."""
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        timeout: float = 30.0,
+        click_settle: float = 0.1,
+        token: Optional[str] = None,
+    ) -> None:
+        import requests
+
+        self.url = (url or os.getenv("AGENT_REMOTE_INPUT_URL", "")).rstrip("/")
+        if not self.url:
+            raise RuntimeError("Remote toolbox backend needs AGENT_REMOTE_INPUT_URL")
+        self.timeout = timeout
+        self.click_settle = click_settle
+        self.session = requests.Session()
+        token = token or os.getenv("AGENT_REMOTE_INPUT_TOKEN", "")
+        if token:
+            self.session.headers[TOKEN_HEADER] = token
+
+    def _send(self, op: str, **args: Any) -> Dict[str, Any]:
+        response = self.session.post(f"{self.url}/input", json={"op": op, **args}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def click(self, x: int, y: int) -> None:
+        self._send("click", x=int(x), y=int(y))
+
+    def write(self, text: str, interval: float = 0.0) -> None:
+        self._send("write", text=text, interval=interval)
+
+    def hotkey(self, *keys: str) -> None:
+        self._send("hotkey", keys=list(keys))
+
+    def scroll(self, amount: int) -> None:
+        self._send("scroll", amount=int(amount))
+
+    def screenshot(self) -> Image.Image:
+        response = self.session.get(f"{self.url}/screenshot", timeout=self.timeout)
+        response.raise_for_status()
+        with Image.open(io.BytesIO(response.content)) as image:
+            return image.convert("RGB")
+
+    def paste(self, text: str) -> bool:
+        return bool(self._send("paste", text=text).get("pasted"))
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def create_app(driver: Any, token: Optional[str] = None):
+    """Expose ``driver`` (any toolbox input driver) to :class:`RemoteInput` clients.
+
+    With a ``token`` (default ``AGENT_REMOTE_INPUT_TOKEN``) every request must carry it.
+    """
+    from fastapi import Depends, FastAPI, Header, HTTPException
+    from fastapi.responses import Response
+
+    token = token if token is not None else os.getenv("AGENT_REMOTE_INPUT_TOKEN", "")
+
+    def authorize(x_remote_input_token: Optional[str] = Header(default=None)) -> None:
+        if token and not hmac.compare_digest((x_remote_input_token or "").encode(), token.encode()):
+            raise HTTPException(status_code=401, detail="Missing or wrong remote input token")
+
+    app = FastAPI(title="remote-input", dependencies=[Depends(authorize)])
+
+    @app.post("/input")
+    def run_input(body: Dict[str, Any]) -> Dict[str, Any]:
+        op = body.get("op")
+        if op == "click":
+            driver.click(body["x"], body["y"])
+        elif op == "write":
+            driver.write(body.get("text", ""), interval=body.get("interval", 0.0))
+        elif op == "hotkey":
+            driver.hotkey(*body.get("keys", []))
+        elif op == "scroll":
+            driver.scroll(body.get("amount", 0))
+        elif op == "paste":
+            return {"pasted": driver.paste(body.get("text", ""))}
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown input op: {op}")
+        return {"ok": True}
+
+    @app.get("/screenshot", response_class=Response)
+    def screenshot():
+        buffer = io.BytesIO()
+        driver.screenshot().save(buffer, format="PNG", compress_level=1)
+        return Response(content=buffer.getvalue(), media_type="image/png")
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    from agent_tools import create_input
+
+    parser = argparse.ArgumentParser(description="Serve this machine's desktop to a remote toolbox backend")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (non-loopback needs a token)")
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--display", help="X display to drive with xdotool instead of pyautogui")
+    args = parser.parse_args()
+
+    token = os.getenv("AGENT_REMOTE_INPUT_TOKEN", "")
+    if not token and not is_loopback(args.host):
+        parser.error(f"Refusing to serve the desktop on {args.host} without AGENT_REMOTE_INPUT_TOKEN")
+    uvicorn.run(create_app(create_input("desktop", display=args.display), token=token), host=args.host, port=args.port)
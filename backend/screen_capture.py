@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+"""Screen capture through a persistent mss grabber (XShm on Linux, native APIs elsewhere).
+
+Opening a grabber costs a display connection and shared-memory setup, so one is kept per thread
+for the life of the driver instead of per screenshot. Captures come back as raw BGRA buffers;
+conversion to a PIL image happens only when a caller needs one.
+"""
+
+import sys
+import threading
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+BBox = Tuple[int, int, int, int]
+
+
+class CaptureError(RuntimeError):
+    pass
+
+
+class RawFrame:
+    """One BGRA capture; ``bbox`` is where it sits on the virtual screen."""
+
+    __slots__ = ("bgra", "size", "bbox")
+
+    def __init__(self, bgra: bytes, size: Tuple[int, int], bbox: BBox) -> None:
+        self.bgra = bgra
+        self.size = size
+        self.bbox = bbox
+
+    def array(self) -> np.ndarray:
+        width, height = self.size
+        return np.frombuffer(self.bgra, dtype=np.uint8).reshape(height, width, 4)
+
+    def image(self) -> Image.Image:
+        return Image.frombytes("RGB", self.size, self.bgra, "raw", "BGRX")
+
+
+class ScreenGrabber:
+    """Captures the full screen or a region of one display."""
+
+    def __init__(self, display: Optional[str] = None) -> None:
+        import mss
+
+        self._mss = mss
+        self.display = display
+        self._local = threading.local()
+        self._opened: List[Any] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, display: Optional[str] = None) -> Optional["ScreenGrabber"]:
+        """A grabber, or None when mss is not installed (callers fall back to slower capture)."""
+        try:
+            return cls(display)
+        except ImportError:
+            return None
+
+    def _grabber(self) -> Any:
+        # mss handles are bound to the thread that opened them.
+        grabber = getattr(self._local, "grabber", None)
+        if grabber is None:
+            kwargs = {"display": self.display} if self.display and sys.platform.startswith("linux") else {}
+            grabber = self._local.grabber = self._mss.mss(**kwargs)
+            with self._lock:
+                self._opened.append(grabber)
+        return grabber
+
+    @property
+    def screen(self) -> BBox:
+        monitor = self._grabber().monitors[1]
+        return (monitor["left"], monitor["top"], monitor["left"] + monitor["width"], monitor["top"] + monitor["height"])
+
+    def grab_raw(self, region: Optional[Sequence[int]] = None) -> RawFrame:
+        """Raw BGRA capture of ``region`` (x1, y1, x2, y2, clamped to the screen) or the primary screen."""
+        grabber = self._grabber()
+        screen = self.screen
+        if region is None:
+            bbox = screen
+        else:
+            x1, y1, x2, y2 = (int(value) for value in region)
+            bbox = (max(x1, screen[0]), max(y1, screen[1]), min(x2, screen[2]), min(y2, screen[3]))
+            if bbox[2] <= bbox[0] or bbox[3] <= bbox[1]:
+                raise CaptureError(f"Capture region {tuple(region)} is outside the screen {screen}")
+        monitor = {"left": bbox[0], "top": bbox[1], "width": bbox[2] - bbox[0], "height": bbox[3] - bbox[1]}
+        shot = grabber.grab(monitor)
+        return RawFrame(shot.bgra, shot.size, bbox)
+
+    def grab(self, region: Optional[Sequence[int]] = None) -> Image.Image:
+        return self.grab_raw(region).image()
+
+    def close(self) -> None:
+        with self._lock:
+            opened, self._opened = self._opened, []
+        for grabber in opened:
+            try:
+                grabber.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import os
+import stat
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from app.pipeline import sessions
+from app.pipeline.sessions import SessionError, SessionManager
+
+# Stands in for Xvfb: creates the display socket and removes it when terminated, as the real server does.
+FAKE_XVFB = """#!/bin/sh
+mkdir -p /tmp/.X11-unix
+sock="/tmp/.X11-unix/X${1#:}"
+touch "$sock"
+sleep 60 &
+child=$!
+trap 'kill "$child"; rm -f "$sock"; exit 0' TERM INT
+wait
+"""
+
+
+@pytest.fixture
+def fake_xvfb(tmp_path, monkeypatch):
+    binary = tmp_path / "Xvfb"
+    binary.write_text(FAKE_XVFB)
+    binary.chmod(binary.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ.get('PATH', '')}")
+
+    started = []
+    popen = subprocess.Popen
+
+    def recording_popen(args, *rest, **kwargs):
+        process = popen(args, *rest, **kwargs)
+        started.append(process)
+        return process
+
+    monkeypatch.setattr(sessions.subprocess, "Popen", recording_popen)
+    return started
+
+
+def test_launch_stops_xvfb_when_window_manager_fails(fake_xvfb):
+    manager = SessionManager(1, window_manager="no-such-window-manager-binary", display_base=870, startup_timeout=5)
+    with pytest.raises(SessionError):
+        manager._launch()
+
+    assert len(fake_xvfb) == 1
+    xvfb = fake_xvfb[0]
+    assert xvfb.poll() is not None
+    number = int(xvfb.args[1].lstrip(":"))
+    assert not Path(f"/tmp/.X11-unix/X{number}").exists()
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from app.agent.engine import VisualAgentEngine
+from app.agent.simulator import Scenario, ScriptedPlanner, SimulatedDesktop
+
+SCENARIOS = Path(__file__).resolve().parent.parent / "scenarios"
+
+
+def test_login_form_scenario_reaches_goal(tmp_path):
+    scenario = Scenario.load(SCENARIOS / "login_form.json")
+    desktop = SimulatedDesktop(scenario)
+    planner = ScriptedPlanner(scenario.script)
+    engine = VisualAgentEngine(
+        "sim_test",
+        screenshot_dir=tmp_path / "screenshots",
+        log_dir=tmp_path / "logs",
+        max_iterations=len(scenario.script) * 2 + 2,
+        enable_overlay=False,
+        dry_run=False,
+        omniparser_url="",
+        omniparser_token="",
+        openai_api_key="",
+        openai_api_base="",
+        openai_model="",
+        openai_temperature=0.0,
+        action_pause=0.0,
+        macro_pause=0.0,
+        hedge_after=0.0,
+        simulator=desktop,
+        planner=planner,
+    )
+
+    result = engine.run("Complete the scenario")
+
+    assert result.status == "success"
+    assert desktop.goal_reached
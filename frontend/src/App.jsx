@@ -1,4 +1,4 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import LeftColumn from "./components/LeftColumn";
 import PromptForm from "./components/PromptForm";
 import BrandHeader from "./components/BrandHeader";
@@ -13,35 +13,50 @@ function App() {
   const [modalOpen, setModalOpen] = useState(false);
   const [modalMessage, setModalMessage] = useState("");
   const [actionResult, setActionResult] = useState(null);
+  const logCursor = useRef(0);
 
   useEffect(() => {
     if (!runId) return;
 
     let cancelled = false;
     let intervalId;
+    let inFlight = false;
+    logCursor.current = 0;
 
     const pollStatus = async () => {
+      // Overlapping polls would append the same logs twice.
+      if (inFlight) return;
+      inFlight = true;
       try {
-        const data = await apiFetch(`/api/status/${runId}`);
+        // The slim view only carries logs past the cursor; the full result is fetched once the run ends.
+        const data = await apiFetch(`/api/status/${runId}?view=slim&since=${logCursor.current}&tail=200`);
         if (cancelled) return;
-        setLogs(data.logs || []);
-        setStatus(data.status);
-        if (data.result) {
-          setActionResult(data.result);
+        if (data.logs && data.logs.length > 0) {
+          setLogs((previous) => [...previous, ...data.logs]);
         }
+        logCursor.current = data.cursor;
+        setStatus(data.status);
 
         if (data.pending_question && data.status === "needs_input") {
           setModalMessage(data.pending_question);
           setModalOpen(true);
         }
 
-        if (data.status === "success" || data.status === "error") {
+        const finished = data.status === "success" || data.status === "error" || data.status === "timeout";
+        if (finished && data.cursor >= data.counters.logs) {
           clearInterval(intervalId);
+          const full = await apiFetch(`/api/status/${runId}`);
+          if (cancelled) return;
+          if (full.result) {
+            setActionResult(full.result);
+          }
         }
       } catch (err) {
         console.error(err);
         setStatus("error");
         clearInterval(intervalId);
+      } finally {
+        inFlight = false;
       }
     };
 